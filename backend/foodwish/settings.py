@@ -98,6 +98,18 @@ DATABASES = {
     }
 }
 
+# Version counters, the home feed, cached responses and the Spoonacular quota
+# live in the default cache; set REDIS_URL so all workers share it. Without it
+# each process has its own local-memory cache, which is fine for development
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    } if os.environ.get('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -164,6 +176,52 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Spoonacular API
+SPOONACULAR_API_KEY = os.environ.get('SPOONACULAR_API_KEY')
+# Seconds a list request waits for Spoonacular before returning local results with "partial": true
+SPOONACULAR_DEADLINE = float(os.environ.get('SPOONACULAR_DEADLINE', '1.5'))
+# Pooled HTTP client: per-call timeout, retries on connection errors/5xx, and a
+# circuit breaker that fails fast for COOLDOWN seconds after THRESHOLD failures
+SPOONACULAR_BASE_URL = os.environ.get('SPOONACULAR_BASE_URL', 'https://api.spoonacular.com')
+SPOONACULAR_TIMEOUT = 5
+SPOONACULAR_RETRIES = 2
+SPOONACULAR_WORKERS = 8
+SPOONACULAR_BREAKER_THRESHOLD = 5
+SPOONACULAR_BREAKER_COOLDOWN = 30
+# Points budget kept in the SPOONACULAR_QUOTA_CACHE cache, so shared by all
+# workers when that cache is (see CACHES); an empty or "none" value disables the budget
+SPOONACULAR_DAILY_POINTS = os.environ.get('SPOONACULAR_DAILY_POINTS', '150').strip()
+SPOONACULAR_DAILY_POINTS = (
+    None if SPOONACULAR_DAILY_POINTS.lower() in ('', 'none') else int(SPOONACULAR_DAILY_POINTS)
+)
+SPOONACULAR_QUOTA_CACHE = 'default'
+# In-process response cache: (fresh seconds, stale-while-revalidate seconds) per endpoint
+SPOONACULAR_CACHE_SIZE = 1024
+SPOONACULAR_CACHE_TTLS = {
+    'search': (600, 3600),
+    'random': (300, 900),
+    'information': (86400, 604800),
+}
+SPOONACULAR_NEGATIVE_TTL = 3600
+# Cache alias used to coalesce identical Spoonacular calls across worker
+# processes; None coalesces within each process only
+SPOONACULAR_SINGLEFLIGHT_CACHE = os.environ.get('SPOONACULAR_SINGLEFLIGHT_CACHE') or None
+
+# Precomputed first page of /api/merged-recipes/ (see recipes.feed); rebuild it
+# periodically with `manage.py rebuild_home_feed`, which needs a shared cache
+HOME_FEED_CACHE = 'default'
+HOME_FEED_TTL = 300
+
+# Serialize recipe list pages from values() rows and render with orjson when
+# installed (see recipes.fastlist); the output is the same as with the serializers
+FAST_LIST_SERIALIZATION = os.environ.get('FAST_LIST_SERIALIZATION', '') == '1'
+
+# Rendered recipe detail and list responses for anonymous visitors (see
+# recipes.response_cache); use a shared cache backend so invalidations reach
+# every worker at once
+RESPONSE_CACHE = 'default'
+RESPONSE_CACHE_TTL = 60
+
 # CORS settings for frontend access
 CORS_ALLOW_ALL_ORIGINS = False  # For production only
 CORS_ALLOW_CREDENTIALS = True
@@ -0,0 +1,116 @@
+"""
+Bounded in-process cache with per-call TTLs, negative caching and
+stale-while-revalidate, used for external API responses.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Cached in place of a value when the fetch function reports "not found" (None)
+_MISSING = object()
+
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-refresh')
+
+
+class TTLCache:
+    """
+    LRU cache whose entries expire after a TTL.
+
+    get_or_fetch() serves a fresh entry directly. An expired entry that is
+    still inside its stale window is served immediately while a single
+    background refresh replaces it. Anything older, or missing, is fetched
+    synchronously. A fetch result of None is cached for negative_ttl so
+    repeated lookups of missing items do not reach the upstream.
+
+    Concurrent misses for the same key are coalesced through a SingleFlight,
+    so only one of them calls fetch and the others share its result.
+    """
+
+    def __init__(self, maxsize=1024, name='cache', flight=None):
+        self.maxsize = maxsize
+        self.name = name
+        self.flight = flight or SingleFlight(name=name)
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+
+    def get_or_fetch(self, key, fetch, ttl, stale_ttl=0, negative_ttl=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, stale_until = entry
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    if value is _MISSING:
+                        self.negative_hits += 1
+                        return None
+                    self.hits += 1
+                    return value
+                if now < stale_until and value is not _MISSING:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        _refresh_pool.submit(self._refresh, key, fetch, ttl, stale_ttl, negative_ttl)
+                    return value
+            self.misses += 1
+
+        def fetch_and_store():
+            value = fetch()
+            self.set(key, value, ttl, stale_ttl, negative_ttl)
+            return value
+        return self.flight.do(key, fetch_and_store)
+
+    def set(self, key, value, ttl, stale_ttl=0, negative_ttl=None):
+        if value is None:
+            if not negative_ttl:
+                return
+            value, ttl, stale_ttl = _MISSING, negative_ttl, 0
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (value, now + ttl, now + ttl + stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, key, fetch, ttl, stale_ttl, negative_ttl):
+        try:
+            self.set(key, fetch(), ttl, stale_ttl, negative_ttl)
+        except Exception:
+            # Keep serving the stale value; the next expired read retries
+            self.refresh_errors += 1
+            logger.warning('%s: background refresh of %r failed', self.name, key, exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.negative_hits + self.misses
+        served = lookups - self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'refresh_errors': self.refresh_errors,
+            'coalesced': self.flight.coalesced,
+            'hit_ratio': served / lookups if lookups else 0.0,
+        }
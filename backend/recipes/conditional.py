@@ -0,0 +1,186 @@
+"""
+ETag / Last-Modified validators and conditional GETs.
+
+Validators are fingerprints of the rows a response is rendered from, never of
+the rendered body, so a request whose If-None-Match still matches is answered
+with 304 before anything is serialized:
+
+- recipe detail: the recipe's updated_at, rating stats and latest rating, the
+  names of its author, category and cuisine, and the visitor's favorite flag,
+  read with one primary key lookup;
+- recipe list pages: the same per-row fields for the rows of the requested
+  page (plus whether more follow), read with the page's own keyset query.
+  Pages have no Last-Modified: a row that leaves the page, or a page whose
+  rows are all older, moves no timestamp;
+- categories, cuisines and diets: every (id, name, description) row.
+
+Ratings, ingredients, instructions and diets are shown on recipe detail (and
+on lists that expand them) but their changes do not save the recipe:
+signals call touch_recipes() for them, which moves the recipe's updated_at.
+
+Responses that are served in full compute the same fingerprint from the
+objects they already loaded, so they cost no extra query. Validators include
+the visitor's favorite flags, so responses are marked private and vary on
+Authorization; If-None-Match takes precedence over If-Modified-Since, which
+cannot see favorite changes.
+"""
+import hashlib
+import threading
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import Rating, Recipe
+
+# Bump when the shape of the responses below changes, so old ETags stop matching
+FORMAT_VERSION = 1
+
+# Fields shown on a recipe card, in list and detail responses
+RECIPE_FIELDS = (
+    'id', 'updated_at', 'rating_count', 'rating_sum', 'favorited',
+    'category__name', 'category__description', 'cuisine__name', 'cuisine__description',
+    'author__username', 'author__first_name', 'author__last_name', 'author__email',
+)
+
+# Recipe columns and relations behind RECIPE_FIELDS
+RECIPE_SOURCES = tuple(sorted({field.split('__')[0] for field in RECIPE_FIELDS}))
+
+
+def is_conditional(request):
+    return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(repr((FORMAT_VERSION,) + parts).encode('utf-8')).hexdigest()
+    # Weak: the same data may be rendered as JSON or by the browsable API
+    return f'W/"{digest}"'
+
+
+def not_modified(request, etag, last_modified=None):
+    """A 304 response if the request's validators match, else None"""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Clients may store the response but must revalidate it before reuse
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+_touched = threading.local()
+
+
+def touch_recipes(recipe_ids, using='default'):
+    """
+    Move the recipes' updated_at once the current transaction commits, so
+    their validators change. The ids of a whole transaction (a recipe saved
+    with its ingredients and steps) are flushed with one UPDATE.
+    """
+    pending = getattr(_touched, 'ids', None)
+    if pending is None:
+        pending = _touched.ids = set()
+    pending.update(recipe_ids)
+    transaction.on_commit(lambda: _flush_touched(using), using=using)
+
+
+def _flush_touched(using):
+    ids = getattr(_touched, 'ids', None)
+    if not ids:
+        return
+    _touched.ids = set()
+    Recipe.objects.using(using).filter(pk__in=ids).update(updated_at=timezone.now())
+
+
+def _value(obj, path):
+    # Named values_list() rows have the path as an attribute; model instances
+    # are followed relation by relation
+    if hasattr(obj, path):
+        return getattr(obj, path)
+    for name in path.split('__'):
+        if obj is None:
+            return None
+        obj = getattr(obj, name)
+    return obj
+
+
+def _latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def recipe_validators(queryset, pk):
+    """
+    (etag, last_modified) of one recipe with one primary key query, or None
+    if it does not exist. queryset must come from with_list_data().
+    """
+    try:
+        row = (
+            queryset.filter(pk=pk).annotate(latest_rating=latest_rating())
+            .values_list(*RECIPE_FIELDS, 'latest_rating', named=True).first()
+        )
+    except (TypeError, ValueError):
+        return None
+    if row is None:
+        return None
+    return _recipe_validators(row, row.latest_rating)
+
+
+def latest_rating():
+    """Subquery of a recipe's newest rating time, for annotate(latest_rating=...)"""
+    ratings = Rating.objects.filter(recipe=OuterRef('pk')).order_by('-created_at').values('created_at')
+    return Subquery(ratings[:1])
+
+
+def recipe_validators_for(recipe):
+    """recipe_validators() of a loaded recipe with prefetched ratings or a latest_rating annotation"""
+    if hasattr(recipe, 'latest_rating'):
+        return _recipe_validators(recipe, recipe.latest_rating)
+    latest_rating = _latest(*[rating.created_at for rating in recipe.ratings.all()])
+    return _recipe_validators(recipe, latest_rating)
+
+
+def _recipe_validators(obj, latest_rating):
+    fields = tuple(_value(obj, field) for field in RECIPE_FIELDS)
+    return make_etag('recipe', fields, latest_rating), _latest(_value(obj, 'updated_at'), latest_rating)
+
+
+def page_validators(queryset, request, view):
+    """(etag, None) of the list page the request asks for, with one query"""
+    paginator = view.pagination_class()
+    ordering = [field.lstrip('-') for field in paginator.get_ordering(request, queryset, view)]
+    names = list(RECIPE_FIELDS) + [name for name in ordering if name not in RECIPE_FIELDS]
+    rows = paginator.paginate_queryset(queryset.values_list(*names, named=True), request, view)
+    return page_validators_for(rows, paginator.has_more_local)
+
+
+def page_validators_for(rows, has_more):
+    """page_validators() of a page that was already fetched (instances or named rows)"""
+    fields = [tuple(_value(row, field) for field in RECIPE_FIELDS) for row in rows]
+    return make_etag('page', fields, has_more), None
+
+
+class ConditionalListMixin:
+    """Conditional list() for small unpaginated lists of (id, name, description) rows"""
+
+    def list(self, request, *args, **kwargs):
+        if is_conditional(request):
+            rows = self.filter_queryset(self.get_queryset()).values_list('id', 'name', 'description')
+            etag = make_etag(self.basename, list(rows))
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+        response = super().list(request, *args, **kwargs)
+        rows = [(item['id'], item['name'], item['description']) for item in response.data]
+        return set_validators(response, make_etag(self.basename, rows))
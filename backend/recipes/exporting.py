@@ -0,0 +1,85 @@
+"""
+Streaming export of recipes with their ingredients, instructions and diets.
+
+Recipes are read as plain values with iterator(), which uses a server-side
+cursor on PostgreSQL. Children are fetched for each chunk of recipe ids
+with one query per table, so memory depends on the chunk size and not on
+the catalog size. Records use the import_recipes format with a "key" (the
+recipe's import key, or its id for recipes created on the site), so an export
+can be loaded elsewhere with `import_recipes --upsert` and reloaded there
+idempotently.
+"""
+from collections import defaultdict
+
+from .models import Ingredient, Instruction, Recipe
+
+RECIPE_FIELDS = {
+    'id': 'id',
+    'key': 'import_key',
+    'title': 'title',
+    'description': 'description',
+    'category': 'category__name',
+    'cuisine': 'cuisine__name',
+    'author': 'author__username',
+    'prep_time': 'prep_time',
+    'cook_time': 'cook_time',
+    'servings': 'servings',
+    'difficulty': 'difficulty',
+    'calories_per_serving': 'calories_per_serving',
+    'protein': 'protein',
+    'carbs': 'carbs',
+    'fat': 'fat',
+    'video_url': 'video_url',
+    'rating_count': 'rating_count',
+    'rating_avg': 'rating_avg',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_export_records(queryset=None, chunk_size=2000):
+    """Yield one dict per recipe, in id order"""
+    if queryset is None:
+        queryset = Recipe.objects.local()
+    rows = queryset.order_by('id').values_list(*RECIPE_FIELDS.values()).iterator(chunk_size=chunk_size)
+    names = list(RECIPE_FIELDS)
+    for chunk in _chunks(rows, chunk_size):
+        ids = [row[0] for row in chunk]
+        ingredients = defaultdict(list)
+        for recipe_id, name, quantity, unit in (
+            Ingredient.objects.filter(recipe_id__in=ids).order_by('recipe_id', 'id')
+            .values_list('recipe_id', 'name', 'quantity', 'unit')
+        ):
+            ingredients[recipe_id].append({'name': name, 'quantity': quantity, 'unit': unit})
+        instructions = defaultdict(list)
+        for recipe_id, text in (
+            Instruction.objects.filter(recipe_id__in=ids).order_by('recipe_id', 'step_number')
+            .values_list('recipe_id', 'text')
+        ):
+            instructions[recipe_id].append(text)
+        diets = defaultdict(list)
+        for recipe_id, name in (
+            Recipe.diets.through.objects.filter(recipe_id__in=ids).order_by('recipe_id', 'diet__name')
+            .values_list('recipe_id', 'diet__name')
+        ):
+            diets[recipe_id].append(name)
+
+        for row in chunk:
+            record = dict(zip(names, row))
+            recipe_id = record['id']
+            record['key'] = record['key'] or str(recipe_id)
+            record['diets'] = diets.get(recipe_id, [])
+            record['ingredients'] = ingredients.get(recipe_id, [])
+            record['instructions'] = instructions.get(recipe_id, [])
+            yield record
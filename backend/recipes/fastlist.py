@@ -0,0 +1,199 @@
+"""
+Fast path for recipe list responses.
+
+RecipeListSerializer builds every row through DRF field objects, which costs
+more CPU than the queries behind a list page. When FAST_LIST_SERIALIZATION is
+enabled, the recipe list, merged_recipes and favorites views instead fetch
+flat rows with values_list() and turn them into dicts with a RecipeRows
+builder whose column positions and per-field conversions are worked out once
+per request. The conversions that are not plain copies (datetimes, image
+URLs, average_rating, total_time) reuse the same code DRF runs, so the
+output is the same, key for key.
+
+FastJSONRenderer renders through orjson (pinned in requirements.txt) when
+it is installed and the fast path is enabled, and falls back to DRF's
+JSONRenderer otherwise or whenever orjson cannot produce the same bytes:
+indented output, values it does not handle, and floats it writes
+differently. orjson matches Python's repr() for floats from 1e-4 up to
+1e16, but writes exponent forms as "1e16" rather than "1e+16" and turns NaN
+and infinity, which DRF refuses to render, into null, so data holding such a
+float is rendered by DRF.
+"""
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Recipe
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def enabled():
+    return getattr(settings, 'FAST_LIST_SERIALIZATION', False)
+
+
+# Output keys of RecipeListSerializer, in order, and the columns behind them
+RECIPE_COLUMNS = [
+    'id', 'title', 'description',
+    'author_id', 'author__username', 'author__first_name', 'author__last_name', 'author__email',
+    'category_id', 'category__name', 'category__description',
+    'cuisine_id', 'cuisine__name', 'cuisine__description',
+    'prep_time', 'cook_time', 'servings', 'difficulty', 'image',
+    'calories_per_serving', 'protein', 'carbs', 'fat',
+    'rating_count', 'rating_sum', 'favorited', 'created_at',
+]
+
+
+class RecipeRows:
+    """
+    Build RecipeListSerializer dicts from values_list() rows.
+
+    prefix selects the recipe through a relation (e.g. 'recipe__' for
+    favorites); favorited=True/False replaces the favorited annotation for
+    querysets that do not have one.
+    """
+
+    def __init__(self, request=None, prefix='', favorited=None):
+        self.request = request
+        self.prefix = prefix
+        self.favorited = favorited
+        self.columns = [
+            prefix + column for column in RECIPE_COLUMNS if not (column == 'favorited' and favorited is not None)
+        ]
+        self._datetime = serializers.DateTimeField().to_representation
+        self._storage = Recipe._meta.get_field('image').storage
+
+    def values(self, queryset, *extra):
+        """values_list() of the recipe columns plus extra ones (e.g. ordering fields)"""
+        names = self.columns + [name for name in extra if name not in self.columns]
+        return queryset.values_list(*names, named=True)
+
+    def image_url(self, name):
+        # Same as DRF's ImageField: storage URL, made absolute when there is a request
+        if not name:
+            return None
+        url = self._storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+    def builder(self):
+        """Return a function from a row to the recipe dict"""
+        position = {column: index for index, column in enumerate(self.columns)}
+        p = self.prefix
+
+        (id_, title, description, author_id, username, first_name, last_name, email,
+         category_id, category_name, category_description, cuisine_id, cuisine_name, cuisine_description,
+         prep_time, cook_time, servings, difficulty, image, calories, protein, carbs, fat,
+         rating_count, rating_sum, created_at) = [
+            position[p + column] for column in RECIPE_COLUMNS if column != 'favorited'
+        ]
+        favorited = position.get(p + 'favorited')
+        constant_favorited = self.favorited
+        to_datetime = self._datetime
+        image_url = self.image_url
+
+        def build(row):
+            count = row[rating_count]
+            return {
+                'id': row[id_],
+                'title': row[title],
+                'description': row[description],
+                'author': {
+                    'id': row[author_id],
+                    'username': row[username],
+                    'first_name': row[first_name],
+                    'last_name': row[last_name],
+                    'email': row[email],
+                },
+                'category': {
+                    'id': row[category_id],
+                    'name': row[category_name],
+                    'description': row[category_description],
+                },
+                'cuisine': None if row[cuisine_id] is None else {
+                    'id': row[cuisine_id],
+                    'name': row[cuisine_name],
+                    'description': row[cuisine_description],
+                },
+                'prep_time': row[prep_time],
+                'cook_time': row[cook_time],
+                'total_time': row[prep_time] + row[cook_time],
+                'servings': row[servings],
+                'difficulty': row[difficulty],
+                'image': image_url(row[image]),
+                'calories_per_serving': row[calories],
+                'protein': row[protein],
+                'carbs': row[carbs],
+                'fat': row[fat],
+                'average_rating': row[rating_sum] / count if count else 0,
+                'is_favorited': constant_favorited if favorited is None else row[favorited],
+                'created_at': None if row[created_at] is None else to_datetime(row[created_at]),
+            }
+        return build
+
+    def build(self, rows):
+        build = self.builder()
+        return [build(row) for row in rows]
+
+
+def favorite_rows(queryset, request):
+    """FavoriteSerializer output for a Favorite queryset, in one query"""
+    recipes = RecipeRows(request, prefix='recipe__', favorited=True)
+    rows = recipes.values(queryset, 'id', 'created_at')
+    build_recipe = recipes.builder()
+    to_datetime = serializers.DateTimeField().to_representation
+    return [
+        {
+            'id': row.id,
+            'recipe': build_recipe(row),
+            'created_at': None if row.created_at is None else to_datetime(row.created_at),
+        }
+        for row in rows
+    ]
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that uses orjson when the fast path is enabled; same bytes either way"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or not enabled() or data is None
+            or self.ensure_ascii or not self.compact or self.encoder_class is not JSONEncoder
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+            or not _floats_match(data)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=_default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like JSONRenderer, keep the output a strict JavaScript subset
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+def _floats_match(data):
+    """True unless data holds a float that orjson writes differently (exponent form, NaN, infinity)"""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            # NaN fails the comparison too
+            if value and not 1e-4 <= abs(value) < 1e16:
+                return False
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return True
+
+
+# Datetimes, Decimals and anything else orjson does not handle go through DRF's encoder
+_default = JSONEncoder().default
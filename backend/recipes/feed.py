@@ -0,0 +1,111 @@
+"""
+Precomputed home feed served by merged_recipes.
+
+The first page of merged_recipes is the same for every visitor apart from the
+favorite flags, so it is rendered once for an anonymous visitor and stored
+in the Django cache under the current 'recipes' version. Signals bump that
+version when recipes, ratings or taxonomy change. The rebuild_home_feed
+command (or the first request after a change) renders it again, with
+concurrent rebuilds coalesced into one. Requests copy the stored document
+and overlay the visitor's favorites with a single query.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import QueryDict
+from django.utils import timezone
+
+from . import spoonacular, versions
+from .models import Favorite, Recipe
+from .pagination import RecipeCursorPagination
+from .serializers import RecipeListSerializer
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+FEED_PATH = '/api/merged-recipes/'
+VERSION_NAME = 'recipes'
+DEFAULT_TTL = 300
+# A feed built while Spoonacular was slow or down is retried sooner
+PARTIAL_TTL = 30
+
+_flight = SingleFlight(name='home-feed')
+
+
+def _store():
+    return caches[getattr(settings, 'HOME_FEED_CACHE', 'default')]
+
+
+def _key(version):
+    return f'home_feed:{version}'
+
+
+class _FeedRequest:
+    """Anonymous request for the first feed page; pagination links come out relative"""
+    query_params = QueryDict()
+
+    def build_absolute_uri(self, location=None):
+        return location or FEED_PATH
+
+
+def build_home_feed():
+    """Render the anonymous first page of merged_recipes as a plain dict"""
+    started_at = time.monotonic()
+    future = spoonacular.fetch_in_background(spoonacular.random_recipes, 5)
+    paginator = RecipeCursorPagination()
+    page = paginator.paginate_queryset(Recipe.objects.local().with_list_data(None), _FeedRequest())
+    # Serialized without the request so stored URLs do not carry a host
+    local = RecipeListSerializer(page, many=True).data
+    external, partial = spoonacular.wait_for(future, started_at)
+    return {
+        'recipes': paginator.merge_external(local, external),
+        'next': paginator.get_next_link(),
+        'partial': partial,
+        'built_at': timezone.now().isoformat(),
+    }
+
+
+def rebuild_home_feed():
+    """Build the feed for the current version and store it"""
+    version = versions.get_version(VERSION_NAME)
+    feed = build_home_feed()
+    ttl = PARTIAL_TTL if feed['partial'] else getattr(settings, 'HOME_FEED_TTL', DEFAULT_TTL)
+    _store().set(_key(version), feed, ttl)
+    logger.info('Rebuilt home feed %s (%d items, partial=%s)', version, len(feed['recipes']), feed['partial'])
+    return feed
+
+
+def get_home_feed():
+    version = versions.get_version(VERSION_NAME)
+    feed = _store().get(_key(version))
+    if feed is None:
+        feed = _flight.do(version, rebuild_home_feed)
+    return feed
+
+
+def render(request):
+    """Response data for merged_recipes without a cursor, with per-user favorites"""
+    feed = get_home_feed()
+    recipes = [dict(item) for item in feed['recipes']]
+    favorites = set()
+    if request.user.is_authenticated:
+        ids = [item['id'] for item in recipes if item.get('source') != 'spoonacular']
+        favorites = set(
+            Favorite.objects.filter(user=request.user, recipe_id__in=ids).values_list('recipe_id', flat=True)
+        )
+    for item in recipes:
+        if item.get('source') == 'spoonacular':
+            continue
+        item['is_favorited'] = item['id'] in favorites
+        if item.get('image') and item['image'].startswith('/'):
+            item['image'] = request.build_absolute_uri(item['image'])
+    data = {
+        'next': request.build_absolute_uri(feed['next']) if feed['next'] else None,
+        'previous': None,
+        'recipes': recipes,
+    }
+    if feed['partial']:
+        data['partial'] = True
+    return data
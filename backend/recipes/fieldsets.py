@@ -0,0 +1,191 @@
+"""
+Sparse fieldsets (?fields=) and opt-in expansion (?expand=) for recipe responses.
+
+fields= lists the output fields to keep, comma separated, with dots for the
+fields of a nested object or list: fields=title,image,category.name on
+recipes, fields=ingredients.name on recipe detail, or
+fields=id,recipe.title,recipe.image on favorites. expand= adds relations a
+serializer leaves out by default: recipe lists, and the recipes inside
+favorites and shopping list items, can include diets, ingredients,
+instructions and ratings (expand=ingredients, expand=recipe.ratings).
+Recipe detail always has them unless fields= leaves them out. Expanded
+fields are kept even when fields= does not list them.
+
+Serializers with SparseFieldsMixin apply a Selection to their fields, and
+recipe_queryset() trims the recipe query to match: unread columns are
+deferred, and author, category and cuisine are only joined and the nested
+relations only prefetched when they are shown. Unknown names are a 400.
+"""
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from .models import Recipe
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+# Recipe columns behind output fields that are not named after one
+COMPUTED_SOURCES = {
+    'total_time': ('prep_time', 'cook_time'),
+    'average_rating': ('rating_count', 'rating_sum'),
+    # The favorited annotation of with_list_data()
+    'is_favorited': (),
+}
+# Joined with select_related() when shown
+RELATED = ('author', 'category', 'cuisine')
+PREFETCHES = {
+    'diets': 'diets',
+    'ingredients': 'ingredients',
+    'instructions': 'instructions',
+    'ratings': 'ratings__user',
+}
+
+
+def _tree(value):
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+class Selection:
+    """
+    Parsed fields= and expand= trees of {name: subtree}. fields is None when
+    every field is kept; an empty subtree keeps the whole nested object.
+    """
+
+    def __init__(self, fields=None, expand=None, prefix=''):
+        self.fields = fields
+        self.expand = expand or {}
+        self.prefix = prefix
+
+    @classmethod
+    def from_request(cls, request):
+        """The request's selection, or None when it has neither parameter"""
+        params = request.query_params
+        if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+            return None
+        return cls(_tree(params.get(FIELDS_PARAM, '')) or None, _tree(params.get(EXPAND_PARAM, '')))
+
+    def nested(self, name):
+        fields = self.fields.get(name) if self.fields is not None else None
+        return Selection(fields or None, self.expand.get(name), f'{self.prefix}{name}.')
+
+    def error(self, param, names, reason='Unknown or unsupported field(s)'):
+        names = ', '.join(self.prefix + name for name in sorted(names))
+        return serializers.ValidationError({param: f'{reason}: {names}'})
+
+
+class SparseFieldsMixin:
+    """
+    Serializer whose fields follow a Selection, passed as selection= or set
+    by the parent serializer for nested ones. expandable_fields maps names
+    to functions returning the fields that only expand= adds.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, selection=None, **kwargs):
+        self.selection = selection
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.selection
+        if selection is None:
+            return fields
+
+        for name in selection.expand:
+            if name in self.expandable_fields and name not in fields:
+                fields[name] = self.expandable_fields[name]()
+        unknown = selection.expand.keys() - fields.keys()
+        if unknown:
+            raise selection.error(EXPAND_PARAM, unknown)
+        if selection.fields is not None:
+            wanted = selection.fields.keys() | selection.expand.keys()
+            unknown = wanted - fields.keys()
+            if unknown:
+                raise selection.error(FIELDS_PARAM, unknown)
+            fields = {name: field for name, field in fields.items() if name in wanted}
+
+        for name, field in fields.items():
+            nested = getattr(field, 'child', field)
+            if isinstance(nested, SparseFieldsMixin):
+                nested.selection = selection.nested(name)
+            elif (selection.fields or {}).get(name) or selection.expand.get(name):
+                raise selection.error(FIELDS_PARAM, [name], 'Field(s) without nested fields')
+        return fields
+
+
+def selected_fields(serializer):
+    """
+    The fields of a selection-bound serializer, checking the names of nested
+    selections too, so mistakes are reported before any query runs.
+    """
+    fields = serializer.fields
+    for field in fields.values():
+        nested = getattr(field, 'child', field)
+        if isinstance(nested, SparseFieldsMixin):
+            selected_fields(nested)
+    return fields
+
+
+def recipe_queryset(queryset, names, keep=()):
+    """
+    Restrict a with_list_data() queryset to what the recipe output fields
+    `names` read, plus the `keep` columns (e.g. the ordering): other columns
+    are deferred, and relations that are not shown are neither joined nor
+    prefetched. Names that are not Recipe columns (annotations) are ignored.
+    """
+    columns = {'id'}
+    prefetches = []
+    for name in names:
+        if name in PREFETCHES:
+            prefetches.append(PREFETCHES[name])
+        else:
+            columns.update(COMPUTED_SOURCES.get(name, (name,)))
+    concrete = {field.name for field in Recipe._meta.concrete_fields}
+    columns = [name for name in columns | set(keep) if name in concrete]
+    queryset = queryset.select_related(None).only(*columns).prefetch_related(*prefetches)
+    related = [name for name in RELATED if name in columns]
+    # select_related() without names would follow every foreign key
+    return queryset.select_related(*related) if related else queryset
+
+
+def with_recipe(queryset, fields, recipes):
+    """
+    Restrict a queryset of rows with a recipe (favorites, shopping list
+    items) to the selected fields; the recipe is prefetched from `recipes`,
+    trimmed with recipe_queryset(), only when it is shown.
+    """
+    concrete = {field.name for field in queryset.model._meta.concrete_fields}
+    queryset = queryset.only('id', *[name for name in fields if name in concrete])
+    if 'recipe' not in fields:
+        return queryset
+    return queryset.prefetch_related(Prefetch('recipe', queryset=recipe_queryset(recipes, fields['recipe'].fields)))
+
+
+class SparseFieldsetMixin:
+    """ViewSet mixin applying ?fields= and ?expand= to list and retrieve"""
+    sparse_actions = ('list', 'retrieve')
+
+    def get_selection(self):
+        if self.action not in self.sparse_actions:
+            return None
+        if not hasattr(self, '_selection'):
+            self._selection = Selection.from_request(self.request)
+        return self._selection
+
+    def get_serializer(self, *args, **kwargs):
+        selection = self.get_selection()
+        if selection is not None:
+            kwargs.setdefault('selection', selection)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_selected_fields(self):
+        """The serializer fields the request selected, or None for the defaults"""
+        if self.get_selection() is None:
+            return None
+        return selected_fields(self.get_serializer())
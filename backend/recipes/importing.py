@@ -0,0 +1,272 @@
+"""
+Helpers for bulk recipe imports.
+
+iter_json_records() parses a JSON array (or whitespace/newline separated
+objects) from a file one record at a time, so memory use does not depend on
+the file size. NameCache resolves category, cuisine and diet names from
+memory. RecipeBatchWriter writes a batch of recipes with their
+ingredients, instructions and diets using one bulk_create per table inside
+a single transaction.
+
+Upsert imports identify each record by a natural key and store a hash of
+its content, so rerunning an import skips unchanged records and updates
+changed ones in place. Checkpoint records how far an import got, so an
+interrupted run can resume.
+"""
+import hashlib
+import json
+import os
+import zlib
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Category, Cuisine, Diet, Ingredient, Instruction, Recipe
+from .response_cache import DETAIL_EPOCH
+from .search import update_search_vectors
+from .signals import index_ingredients
+from .versions import bump
+
+READ_SIZE = 1 << 16
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_json_records(stream, read_size=READ_SIZE):
+    """Yield the objects of a top-level JSON array, or of concatenated JSON objects"""
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(read_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    while True:
+        while pos < len(buffer) and (buffer[pos] in _WHITESPACE or buffer[pos] == ','):
+            pos += 1
+        if not started and pos < len(buffer) and buffer[pos] == '[':
+            pos += 1
+            started = True
+            continue
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        if pos >= len(buffer):
+            if eof:
+                return
+            fill()
+            continue
+        started = True
+        try:
+            record, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Most likely a record cut off at the end of the buffer
+            if eof:
+                raise
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            # A number at the very end may continue in the next chunk
+            fill()
+            continue
+        pos = end
+        yield record
+
+
+class NameCache:
+    """Case-insensitive name -> row lookup for a small taxonomy table, creating rows on demand"""
+
+    def __init__(self, model, title_case=False):
+        self.model = model
+        self.title_case = title_case
+        self.rows = {self._key(row.name): row for row in model.objects.all()}
+
+    @staticmethod
+    def _key(name):
+        return ' '.join(name.casefold().replace('-', ' ').split())
+
+    def get(self, name):
+        key = self._key(name)
+        if key not in self.rows:
+            name = name.strip().title() if self.title_case else name.strip()
+            self.rows[key] = self.model.objects.get_or_create(name=name[:100])[0]
+        return self.rows[key]
+
+
+def natural_key(record):
+    """The record's "key" or "id" if it has one, else a digest of its title and category"""
+    key = record.get('key') or record.get('id')
+    if key is not None:
+        return str(key)[:64]
+    title = ' '.join(str(record.get('title', '')).casefold().split())
+    category = ' '.join(str(record.get('category', '')).casefold().split())
+    return hashlib.sha1(f'{title}|{category}'.encode('utf-8')).hexdigest()
+
+
+def content_hash(record):
+    return hashlib.sha256(
+        json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    ).hexdigest()
+
+
+def partition(record, partitions):
+    """Stable partition of a record by natural key, so duplicates meet in the same worker"""
+    return zlib.crc32(natural_key(record).encode('utf-8')) % partitions
+
+
+class Checkpoint:
+    """
+    Number of input records an import has committed, kept in a small JSON
+    file next to the input. It only applies to the same input file (path and
+    size) and is replaced atomically after every batch.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = {'path': os.path.abspath(source), 'size': os.path.getsize(source)}
+        self.processed = 0
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if state.get('source') == self.source:
+            self.processed = int(state.get('processed', 0))
+        return self.processed
+
+    def save(self, processed):
+        self.processed = processed
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, 'processed': processed}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class RecipeBatchWriter:
+    """Create recipes from import records (the import_recipes JSON format) in bulk"""
+
+    # Fields an upsert rewrites on a changed record; author and created_at are kept
+    UPSERT_FIELDS = [
+        'title', 'description', 'category', 'cuisine', 'prep_time', 'cook_time', 'servings',
+        'difficulty', 'calories_per_serving', 'protein', 'carbs', 'fat', 'import_hash', 'updated_at',
+    ]
+
+    def __init__(self, author, using='default'):
+        if not connections[using].features.can_return_rows_from_bulk_insert:
+            raise RuntimeError('Bulk import needs a database that returns ids from bulk inserts')
+        self.author = author
+        self.using = using
+        self.categories = NameCache(Category)
+        self.cuisines = NameCache(Cuisine)
+        self.diets = NameCache(Diet)
+
+    def build_recipe(self, data):
+        return Recipe(
+            title=data['title'],
+            description=data['description'],
+            author=self.author,
+            category=self.categories.get(data['category']),
+            cuisine=self.cuisines.get(data['cuisine']) if data.get('cuisine') else None,
+            prep_time=data.get('prep_time', 0),
+            cook_time=data.get('cook_time', 0),
+            servings=data.get('servings', 1),
+            difficulty=data.get('difficulty', 'medium'),
+            calories_per_serving=data.get('calories_per_serving'),
+            protein=data.get('protein'),
+            carbs=data.get('carbs'),
+            fat=data.get('fat'),
+        )
+
+    def write_children(self, pairs):
+        """Bulk create ingredients, instructions and diet links for saved (recipe, data) pairs"""
+        DietLink = Recipe.diets.through
+        ingredients, instructions, diet_links = [], [], []
+        for recipe, data in pairs:
+            ingredients.extend(
+                Ingredient(recipe_id=recipe.pk, name=ing['name'], quantity=ing['quantity'], unit=ing.get('unit', ''))
+                for ing in data['ingredients']
+            )
+            instructions.extend(
+                Instruction(recipe_id=recipe.pk, step_number=number, text=text)
+                for number, text in enumerate(data['instructions'], 1)
+            )
+            diet_ids = {self.diets.get(name).pk for name in data.get('diets', [])}
+            diet_links.extend(DietLink(recipe_id=recipe.pk, diet_id=diet_id) for diet_id in diet_ids)
+        Ingredient.objects.using(self.using).bulk_create(ingredients)
+        Instruction.objects.using(self.using).bulk_create(instructions)
+        DietLink.objects.using(self.using).bulk_create(diet_links)
+        # bulk_create skips the signal that counts ingredients in the autocomplete index
+        names = [ingredient.name for ingredient in ingredients]
+        transaction.on_commit(lambda: index_ingredients(names), using=self.using)
+
+    def write(self, records):
+        """Create one batch of recipes in a transaction; returns the number created"""
+        with transaction.atomic(using=self.using):
+            recipes = Recipe.objects.using(self.using).bulk_create(
+                [self.build_recipe(data) for data in records]
+            )
+            self.write_children(zip(recipes, records))
+            # Bulk inserts skip the signals that keep these up to date
+            update_search_vectors(Recipe.objects.using(self.using).filter(pk__in=[r.pk for r in recipes]))
+        return len(recipes)
+
+    def upsert(self, records):
+        """
+        Create new records, rewrite changed ones in place and skip unchanged
+        ones, matched by natural_key(). Returns (created, updated, unchanged).
+        """
+        keyed = {natural_key(data): data for data in records}
+        with transaction.atomic(using=self.using):
+            existing = {
+                key: (pk, digest)
+                for key, pk, digest in Recipe.objects.using(self.using)
+                .filter(import_key__in=keyed).values_list('import_key', 'id', 'import_hash')
+            }
+            created, changed = [], []
+            now = timezone.now()
+            for key, data in keyed.items():
+                digest = content_hash(data)
+                if key in existing and existing[key][1] == digest:
+                    continue
+                recipe = self.build_recipe(data)
+                recipe.import_key = key
+                recipe.import_hash = digest
+                if key in existing:
+                    recipe.pk = existing[key][0]
+                    recipe.updated_at = now
+                    changed.append((recipe, data))
+                else:
+                    created.append((recipe, data))
+
+            Recipe.objects.using(self.using).bulk_create([recipe for recipe, _ in created])
+            Recipe.objects.using(self.using).bulk_update([recipe for recipe, _ in changed], self.UPSERT_FIELDS)
+            changed_ids = [recipe.pk for recipe, _ in changed]
+            if changed_ids:
+                Ingredient.objects.using(self.using).filter(recipe_id__in=changed_ids).delete()
+                Instruction.objects.using(self.using).filter(recipe_id__in=changed_ids).delete()
+                Recipe.diets.through.objects.using(self.using).filter(recipe_id__in=changed_ids).delete()
+            self.write_children(created + changed)
+            update_search_vectors(Recipe.objects.using(self.using).filter(
+                pk__in=[recipe.pk for recipe, _ in created + changed]
+            ))
+        return len(created), len(changed), len(keyed) - len(created) - len(changed)
+
+    def finish(self):
+        """Invalidate cached documents once the import is complete"""
+        bump('recipes')
+        # Rewritten recipes bypassed the signals that bump their own counters
+        bump(DETAIL_EPOCH)
@@ -0,0 +1,80 @@
+import os
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from recipes.testing import benchmarks
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmark_baseline.json')
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the recipe, favorite, shopping list and auth endpoints against the '
+        'configured database with Spoonacular stubbed, reporting p50/p95 latency, queries '
+        'and allocated memory. Fails when results regress from the stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30, help='Timed requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per endpoint first.')
+        parser.add_argument('--only', action='append', default=[],
+                            help='Run scenarios whose name contains this text (repeatable).')
+        parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE,
+                            help='Baseline JSON file (default: backend/benchmark_baseline.json).')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Write the results as the new baseline instead of comparing.')
+        parser.add_argument('--latency-tolerance', type=float, default=0.25,
+                            help='Allowed relative p95 increase over the baseline.')
+        parser.add_argument('--memory-tolerance', type=float, default=0.25,
+                            help='Allowed relative increase in allocated memory over the baseline.')
+
+    def handle(self, *args, **options):
+        try:
+            scenarios = benchmarks.default_scenarios()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        if options['only']:
+            scenarios = [s for s in scenarios if any(text in s.name for text in options['only'])]
+            if not scenarios:
+                raise CommandError('No scenario matches --only.')
+
+        self.stdout.write(f"{'endpoint':<22} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'alloc KB':>9}")
+
+        def log(name, result):
+            self.stdout.write(
+                f"{name:<22} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+                f"{result['queries']:>8} {result['peak_kb']:>9.1f}"
+            )
+
+        try:
+            results = benchmarks.run(scenarios, options['iterations'], options['warmup'], log=log)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        baseline_path = options['baseline']
+        if options['save_baseline']:
+            benchmarks.save_baseline(
+                baseline_path, results,
+                created=timezone.now().isoformat(), database=connection.vendor,
+                python=platform.python_version(), iterations=options['iterations'],
+            )
+            self.stdout.write(self.style.SUCCESS(f'Saved baseline to {baseline_path}.'))
+            return
+
+        try:
+            baseline = benchmarks.load_baseline(baseline_path)
+        except FileNotFoundError:
+            baseline = {}
+            self.stdout.write(self.style.WARNING(
+                f'No baseline at {baseline_path}; only query budgets are checked. '
+                'Run with --save-baseline to create one.'
+            ))
+        regressions = benchmarks.compare(
+            results, baseline, options['latency_tolerance'], options['memory_tolerance']
+        )
+        if regressions:
+            raise CommandError('Benchmark regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} endpoints within the baseline.'))
@@ -0,0 +1,144 @@
+import csv
+import gzip
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from recipes.exporting import RECIPE_FIELDS, iter_export_records
+from recipes.models import Recipe
+
+NESTED_FIELDS = ['diets', 'ingredients', 'instructions']
+
+
+class Command(BaseCommand):
+    help = (
+        'Export recipes with ingredients, instructions and diets as NDJSON (default), '
+        'CSV with JSON-encoded nested columns, or Parquet (needs pyarrow). '
+        'Outputs ending in .gz are gzip-compressed; "-" writes NDJSON to stdout.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', type=str, help='Output file, or - for stdout.')
+        parser.add_argument('--format', choices=['ndjson', 'csv', 'parquet'], default=None,
+                            help='Output format (default: from the file extension, else ndjson).')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Recipes fetched per database round trip.')
+        parser.add_argument('--include-mirrored', action='store_true',
+                            help='Also export recipes mirrored from Spoonacular.')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or self._format_for(output)
+        queryset = Recipe.objects.all() if options['include_mirrored'] else Recipe.objects.local()
+        records = self._progress(iter_export_records(queryset, options['chunk_size']), options['chunk_size'])
+
+        if fmt == 'parquet':
+            if output == '-':
+                raise CommandError('Parquet cannot be written to stdout.')
+            count = self._write_parquet(records, output, options['chunk_size'])
+        else:
+            stream = self._open(output)
+            try:
+                count = self._write_ndjson(records, stream) if fmt == 'ndjson' else self._write_csv(records, stream)
+            finally:
+                if stream is not sys.stdout:
+                    stream.close()
+        self.stderr.write(self.style.SUCCESS(f'Exported {count} recipes to {output} ({fmt}).'))
+
+    @staticmethod
+    def _format_for(output):
+        name = output[:-3] if output.endswith('.gz') else output
+        if name.endswith('.csv'):
+            return 'csv'
+        if name.endswith('.parquet'):
+            return 'parquet'
+        return 'ndjson'
+
+    @staticmethod
+    def _open(output):
+        if output == '-':
+            return sys.stdout
+        if output.endswith('.gz'):
+            return gzip.open(output, 'wt', encoding='utf-8', newline='')
+        return open(output, 'w', encoding='utf-8', newline='')
+
+    def _progress(self, records, every):
+        started = time.monotonic()
+        count = 0
+        for count, record in enumerate(records, 1):
+            yield record
+            if count % (every * 10) == 0:
+                elapsed = time.monotonic() - started
+                self.stderr.write(f'  {count} recipes in {elapsed:.1f}s ({count / elapsed:.0f} recipes/s)')
+
+    @staticmethod
+    def _write_ndjson(records, stream):
+        encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        count = 0
+        for count, record in enumerate(records, 1):
+            stream.write(encoder.encode(record))
+            stream.write('\n')
+        return count
+
+    @staticmethod
+    def _write_csv(records, stream):
+        encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        writer = csv.writer(stream)
+        writer.writerow(list(RECIPE_FIELDS) + NESTED_FIELDS)
+        count = 0
+        for count, record in enumerate(records, 1):
+            writer.writerow(
+                [record[field] for field in RECIPE_FIELDS]
+                + [encoder.encode(record[field]) for field in NESTED_FIELDS]
+            )
+        return count
+
+    @staticmethod
+    def _write_parquet(records, output, chunk_size):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise CommandError('Parquet export needs pyarrow: pip install pyarrow')
+
+        schema = pa.schema([
+            ('id', pa.int64()),
+            ('key', pa.string()),
+            ('title', pa.string()),
+            ('description', pa.string()),
+            ('category', pa.string()),
+            ('cuisine', pa.string()),
+            ('author', pa.string()),
+            ('prep_time', pa.int32()),
+            ('cook_time', pa.int32()),
+            ('servings', pa.int32()),
+            ('difficulty', pa.string()),
+            ('calories_per_serving', pa.int32()),
+            ('protein', pa.float64()),
+            ('carbs', pa.float64()),
+            ('fat', pa.float64()),
+            ('video_url', pa.string()),
+            ('rating_count', pa.int32()),
+            ('rating_avg', pa.float64()),
+            ('created_at', pa.timestamp('us', tz='UTC')),
+            ('updated_at', pa.timestamp('us', tz='UTC')),
+            ('diets', pa.list_(pa.string())),
+            ('ingredients', pa.list_(pa.struct([
+                ('name', pa.string()), ('quantity', pa.string()), ('unit', pa.string()),
+            ]))),
+            ('instructions', pa.list_(pa.string())),
+        ])
+        count = 0
+        with pq.ParquetWriter(output, schema, compression='zstd') as writer:
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= chunk_size:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    count += len(batch)
+                    batch = []
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+        return count
@@ -0,0 +1,255 @@
+import math
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+
+from recipes.importing import NameCache
+from recipes.models import (
+    Category, Cuisine, Diet, Favorite, Ingredient, Instruction, Rating, Recipe, ShoppingListItem
+)
+from recipes.search import update_search_vectors
+from recipes.versions import bump
+
+# (name, weight) pairs; weights follow rough shares of a recipe site's catalog
+CATEGORIES = [('Dinner', 40), ('Lunch', 20), ('Breakfast', 12), ('Dessert', 14), ('Snacks', 9), ('Beverages', 5)]
+CUISINES = [
+    ('Italian', 18), ('American', 16), ('Mexican', 11), ('Indian', 10), ('Chinese', 9), ('French', 6),
+    ('Japanese', 6), ('Thai', 5), ('Mediterranean', 5), ('Greek', 4), ('Korean', 3), ('Spanish', 3),
+    ('Middle Eastern', 2), ('Vietnamese', 2),
+]
+DIETS = [('Vegetarian', 25), ('Vegan', 10), ('Gluten-Free', 12), ('Dairy-Free', 9), ('Keto', 5), ('Low-Carb', 7)]
+DIFFICULTIES = [('easy', 50), ('medium', 35), ('hard', 15)]
+
+PROTEINS = ['Chicken', 'Beef', 'Pork', 'Salmon', 'Shrimp', 'Tofu', 'Lentil', 'Chickpea', 'Turkey', 'Egg',
+            'Lamb', 'Cod', 'Mushroom', 'Bean', 'Halloumi']
+DISHES = ['Curry', 'Tacos', 'Salad', 'Soup', 'Stir Fry', 'Pasta', 'Bowl', 'Casserole', 'Stew', 'Sandwich',
+          'Skewers', 'Risotto', 'Burger', 'Pie', 'Wraps', 'Noodles', 'Frittata', 'Chili', 'Bake', 'Roast']
+STYLES = ['Classic', 'Spicy', 'Creamy', 'Easy', 'Smoky', 'Lemon', 'Garlic', 'Herb', 'Crispy', 'Honey',
+          'Sheet Pan', 'One-Pot', 'Slow Cooker', 'Grilled', 'Weeknight', 'Coconut', 'Sesame', 'Rustic']
+# Ordered roughly by how often recipes use them; picks are skewed towards the front
+PANTRY = ['Salt', 'Olive oil', 'Garlic', 'Onion', 'Black pepper', 'Butter', 'Water', 'Sugar', 'Flour', 'Eggs',
+          'Tomatoes', 'Lemon juice', 'Milk', 'Parsley', 'Soy sauce', 'Ginger', 'Cumin', 'Paprika', 'Rice',
+          'Carrots', 'Bell pepper', 'Chicken stock', 'Honey', 'Cilantro', 'Basil', 'Parmesan cheese',
+          'Cheddar cheese', 'Heavy cream', 'Vinegar', 'Chili flakes', 'Potatoes', 'Spinach', 'Coconut milk',
+          'Oregano', 'Thyme', 'Cinnamon', 'Lime', 'Scallions', 'Celery', 'Mushrooms', 'Yogurt', 'Zucchini',
+          'Breadcrumbs', 'Sesame oil', 'Maple syrup', 'Vanilla extract', 'Baking powder', 'Cornstarch',
+          'Avocado', 'Feta cheese']
+UNITS = [('g', 30), ('tbsp', 20), ('tsp', 18), ('cup', 15), ('ml', 8), ('pieces', 6), ('', 3)]
+VERBS = ['Chop', 'Heat', 'Stir in', 'Whisk', 'Simmer', 'Season', 'Add', 'Bake', 'Toss', 'Fold in',
+         'Saute', 'Roast', 'Blend', 'Drain', 'Serve']
+
+
+def _weighted(rng, pairs):
+    return rng.choices([value for value, _ in pairs], weights=[weight for _, weight in pairs])[0]
+
+
+def _skewed(rng, n, skew=2.5):
+    """Index in range(n), heavily biased towards 0 (a few very popular items, a long tail)"""
+    return min(int(n * rng.random() ** skew), n - 1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a large synthetic dataset (users, recipes with ingredients and '
+        'instructions, ratings, favorites, shopping lists) with realistic skewed '
+        'distributions, using bulk inserts. The same --seed gives the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=None, help='Default: one per 10 recipes.')
+        parser.add_argument('--ratings', type=int, default=None, help='Approximate total; default 3 per recipe.')
+        parser.add_argument('--favorites', type=int, default=None, help='Approximate total; default 2 per recipe.')
+        parser.add_argument('--shopping-items', type=int, default=None, help='Default: 2 per user.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='gen', help='Username prefix of generated users.')
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete users with the prefix (and their recipes) first.')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('generate_dataset needs a database that returns ids from bulk inserts')
+        self.rng = random.Random(options['seed'])
+        self.faker = Faker()
+        self.faker.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        self.started = time.monotonic()
+        n_recipes = options['recipes']
+        n_users = options['users'] or max(n_recipes // 10, 10)
+        ratings = options['ratings'] if options['ratings'] is not None else n_recipes * 3
+        favorites = options['favorites'] if options['favorites'] is not None else n_recipes * 2
+        shopping_items = options['shopping_items'] if options['shopping_items'] is not None else n_users * 2
+
+        User = get_user_model()
+        prefix = options['prefix']
+        if options['clear']:
+            deleted, _ = User.objects.filter(username__startswith=f'{prefix}_').delete()
+            self.stdout.write(f'Deleted {deleted} rows from a previous dataset')
+        elif User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Users named {prefix}_* already exist; use --clear or another --prefix.')
+
+        self.categories = self._taxonomy(Category, CATEGORIES)
+        self.cuisines = self._taxonomy(Cuisine, CUISINES)
+        self.diets = self._taxonomy(Diet, DIETS)
+        self.descriptions = [self.faker.paragraph(nb_sentences=3) for _ in range(500)]
+
+        user_ids = self._create_users(User, prefix, n_users)
+        # Scale per-recipe draws so the totals land near the requested numbers;
+        # the popularity draw below has a mean of 3
+        self.rating_scale = ratings / max(n_recipes, 1) / 3
+        self.favorite_scale = favorites / max(n_recipes, 1) / 3
+        self.recipe_ids = []
+        totals = {'recipes': 0, 'ingredients': 0, 'instructions': 0, 'ratings': 0, 'favorites': 0}
+        for start in range(0, n_recipes, self.batch_size):
+            counts = self._create_recipes(user_ids, min(self.batch_size, n_recipes - start))
+            for key, value in counts.items():
+                totals[key] += value
+            self._progress('recipes', totals['recipes'], n_recipes)
+        totals['shopping items'] = self._create_shopping_items(user_ids, shopping_items)
+        bump('recipes')
+
+        summary = ', '.join(f'{value} {key}' for key, value in totals.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {n_users} users, {summary} in {time.monotonic() - self.started:.1f}s (seed {options["seed"]}).'
+        ))
+
+    def _progress(self, label, done, total):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f'  {done}/{total} {label} ({elapsed:.1f}s)')
+
+    def _taxonomy(self, model, pairs):
+        names = NameCache(model)
+        return [(names.get(name), weight) for name, weight in pairs]
+
+    def _create_users(self, User, prefix, count):
+        password = make_password(None)
+        ids = []
+        for start in range(0, count, self.batch_size):
+            users = []
+            for i in range(start, min(start + self.batch_size, count)):
+                first, last = self.faker.first_name(), self.faker.last_name()
+                users.append(User(
+                    username=f'{prefix}_{i}', first_name=first, last_name=last,
+                    email=f'{first}.{last}.{i}@example.com'.lower(), password=password,
+                ))
+            with transaction.atomic():
+                ids.extend(user.pk for user in User.objects.bulk_create(users))
+            self._progress('users', len(ids), count)
+        return ids
+
+    def _popularity(self, scale):
+        # Heavy-tailed (Pareto): many recipes get none or a few, a handful get hundreds
+        return int((self.rng.paretovariate(1.5) - 1) * 1.5 * scale + self.rng.random())
+
+    def _create_recipes(self, user_ids, count):
+        rng = self.rng
+        now = timezone.now()
+        recipes, children = [], []
+        for _ in range(count):
+            protein, dish = rng.choice(PROTEINS), rng.choice(DISHES)
+            prep = max(int(rng.lognormvariate(math.log(15), 0.6)), 1)
+            cook = max(int(rng.lognormvariate(math.log(25), 0.8)), 0)
+            # Newer recipes are more common: the catalog grows over ~3 years
+            age_days = 1095 * (1 - math.sqrt(rng.random()))
+            created = now - timedelta(days=age_days)
+            cuisine = _weighted(rng, self.cuisines) if rng.random() < 0.9 else None
+
+            scores = []
+            raters = {user_ids[_skewed(rng, len(user_ids))] for _ in range(self._popularity(self.rating_scale))}
+            # Ids differ between runs, so the set's order would too; their ranking does not
+            for user_id in sorted(raters):
+                scores.append((user_id, _weighted(rng, [(5, 45), (4, 30), (3, 13), (2, 6), (1, 6)])))
+            fans = {user_ids[_skewed(rng, len(user_ids))] for _ in range(self._popularity(self.favorite_scale))}
+
+            recipes.append(Recipe(
+                title=f'{rng.choice(STYLES)} {protein} {dish}',
+                description=rng.choice(self.descriptions),
+                author_id=user_ids[_skewed(rng, len(user_ids), skew=3)],
+                category=_weighted(rng, self.categories),
+                cuisine=cuisine,
+                prep_time=prep,
+                cook_time=cook,
+                servings=_weighted(rng, [(1, 5), (2, 25), (4, 45), (6, 15), (8, 10)]),
+                difficulty=_weighted(rng, DIFFICULTIES),
+                calories_per_serving=max(int(rng.gauss(450, 150)), 50),
+                protein=round(max(rng.gauss(25, 10), 0), 1),
+                carbs=round(max(rng.gauss(45, 20), 0), 1),
+                fat=round(max(rng.gauss(18, 8), 0), 1),
+                rating_count=len(scores),
+                rating_sum=sum(score for _, score in scores),
+                rating_avg=sum(score for _, score in scores) / len(scores) if scores else 0,
+                created_at=created,
+                updated_at=created,
+            ))
+            children.append((protein, scores, fans))
+
+        with transaction.atomic():
+            recipes = Recipe.objects.bulk_create(recipes)
+            # auto_now_add overrides the generated dates on insert
+            Recipe.objects.bulk_update(recipes, ['created_at', 'updated_at'], batch_size=1000)
+            # A sample of ids for shopping lists, bounded for multi-million row runs
+            self.recipe_ids.extend(rng.sample([recipe.pk for recipe in recipes], min(len(recipes), 200)))
+            ingredients, instructions, diet_links, ratings, favorites = [], [], [], [], []
+            DietLink = Recipe.diets.through
+            for recipe, (protein, scores, fans) in zip(recipes, children):
+                names = {protein} | {PANTRY[_skewed(rng, len(PANTRY), skew=1.8)]
+                                     for _ in range(max(int(rng.gauss(8, 3)), 3))}
+                # Sets iterate in hash order, which changes between runs
+                for name in sorted(names):
+                    unit = _weighted(rng, UNITS)
+                    quantity = str(rng.choice([1, 2, 3, 4, 100, 200, 250, 500])) if unit in ('g', 'ml') \
+                        else str(rng.choice([1, 1, 2, 3, 0.5, 0.25]))
+                    ingredients.append(Ingredient(recipe=recipe, name=name, quantity=quantity, unit=unit))
+                for step in range(1, rng.randint(3, 10) + 1):
+                    instructions.append(Instruction(
+                        recipe=recipe, step_number=step,
+                        text=f'{rng.choice(VERBS)} the {rng.choice(sorted(names)).lower()}. {self.faker.sentence()}',
+                    ))
+                for diet, weight in self.diets:
+                    if rng.random() * 100 < weight:
+                        diet_links.append(DietLink(recipe_id=recipe.pk, diet_id=diet.pk))
+                ratings.extend(Rating(recipe=recipe, user_id=user_id, score=score) for user_id, score in scores)
+                favorites.extend(Favorite(recipe=recipe, user_id=user_id) for user_id in fans)
+            Ingredient.objects.bulk_create(ingredients)
+            Instruction.objects.bulk_create(instructions)
+            DietLink.objects.bulk_create(diet_links)
+            # Bulk inserts skip the signals that maintain stats and search vectors;
+            # rating stats were computed above
+            Rating.objects.bulk_create(ratings)
+            Favorite.objects.bulk_create(favorites)
+            update_search_vectors(Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes]))
+        return {
+            'recipes': len(recipes), 'ingredients': len(ingredients), 'instructions': len(instructions),
+            'ratings': len(ratings), 'favorites': len(favorites),
+        }
+
+    def _create_shopping_items(self, user_ids, count):
+        rng = self.rng
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            items = []
+            for _ in range(size):
+                # Most items come from a generated recipe, the rest were added by hand
+                from_recipe = self.recipe_ids and rng.random() < 0.8
+                items.append(ShoppingListItem(
+                    user_id=user_ids[_skewed(rng, len(user_ids), skew=2)],
+                    recipe_id=rng.choice(self.recipe_ids) if from_recipe else None,
+                    ingredient_name=PANTRY[_skewed(rng, len(PANTRY), skew=1.8)],
+                    quantity=str(rng.randint(1, 4)),
+                    unit=_weighted(rng, UNITS),
+                    is_purchased=rng.random() < 0.3,
+                ))
+            with transaction.atomic():
+                ShoppingListItem.objects.bulk_create(items)
+            created += size
+            self._progress('shopping items', created, count)
+        return created
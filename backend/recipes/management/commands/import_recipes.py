@@ -1,55 +1,137 @@
-import json
-from django.core.management.base import BaseCommand
+import time
+
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
-from recipes.models import Recipe, Category, Cuisine, Diet, Ingredient, Instruction
+from recipes import workers as worker_pool
+from recipes.importing import Checkpoint, RecipeBatchWriter, iter_json_records, partition
+
+
+def run_import(json_path, author_id, batch_size, upsert=False, checkpoint_path=None, restart=False,
+               worker=0, workers=1, log=None):
+    """
+    Import one partition of json_path and return its counts, passing progress
+    lines to log. In upsert mode progress is checkpointed after every batch
+    and resumed from on the next run.
+    """
+    log = log or (lambda line: None)
+    writer = RecipeBatchWriter(get_user_model().objects.get(pk=author_id))
+    checkpoint = Checkpoint(checkpoint_path, json_path) if upsert else None
+    resume_after = 0
+    if checkpoint is not None and not restart:
+        resume_after = checkpoint.load()
+        if resume_after:
+            log(f"Resuming after record {resume_after}")
+
+    totals = {'created': 0, 'updated': 0, 'unchanged': 0}
+    started = time.monotonic()
+    batch = []
+    flushed = [resume_after]
+
+    def flush(position):
+        if not batch and position == flushed[0]:
+            return
+        flushed[0] = position
+        if batch:
+            if upsert:
+                created, updated, unchanged = writer.upsert(batch)
+            else:
+                created, updated, unchanged = writer.write(batch), 0, 0
+            totals['created'] += created
+            totals['updated'] += updated
+            totals['unchanged'] += unchanged
+            batch.clear()
+        if checkpoint is not None:
+            checkpoint.save(position)
+        elapsed = time.monotonic() - started
+        done = sum(totals.values())
+        rate = done / elapsed if elapsed else 0
+        log(f"  {position} records read: {totals['created']} created, {totals['updated']} updated, "
+            f"{totals['unchanged']} unchanged in {elapsed:.1f}s ({rate:.0f} recipes/s)")
+
+    position = resume_after
+    with open(json_path, 'r', encoding='utf-8') as f:
+        for position, data in enumerate(iter_json_records(f), 1):
+            if position <= resume_after:
+                continue
+            if workers > 1 and partition(data, workers) != worker:
+                continue
+            batch.append(data)
+            if len(batch) >= batch_size:
+                flush(position)
+    flush(position)
+    if checkpoint is not None:
+        checkpoint.clear()
+    return totals
+
+
+def _run_worker(kwargs):
+    worker = kwargs['worker']
+    return run_import(**kwargs, log=lambda line: worker_pool.log(f'[worker {worker}] {line}'))
+
 
 class Command(BaseCommand):
-    help = 'Bulk import recipes from a JSON file.'
+    help = (
+        'Bulk import recipes from a JSON file (an array of recipes, or one recipe per line). '
+        'With --upsert, records are matched by their "key"/"id" (or title and category), '
+        'unchanged ones are skipped, changed ones updated in place, and an interrupted '
+        'import resumes from its checkpoint.'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('json_path', type=str, help='Path to the JSON file containing recipes.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Recipes written per transaction.')
+        parser.add_argument('--author', type=str, default=None,
+                            help='Username to import the recipes as (default: the first user).')
+        parser.add_argument('--upsert', action='store_true',
+                            help='Insert new records, update changed ones, skip unchanged ones.')
+        parser.add_argument('--checkpoint', type=str, default=None,
+                            help='Checkpoint file for --upsert (default: <json_path>.checkpoint).')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore an existing checkpoint and read the file from the start.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes to split an --upsert import across.')
 
     def handle(self, *args, **options):
-        json_path = options['json_path']
-        with open(json_path, 'r', encoding='utf-8') as f:
-            recipes = json.load(f)
         User = get_user_model()
-        default_user = User.objects.first()
-        for data in recipes:
-            category = Category.objects.get_or_create(name=data['category'])[0]
-            cuisine = Cuisine.objects.get_or_create(name=data.get('cuisine', ''))[0] if data.get('cuisine') else None
-            recipe = Recipe.objects.create(
-                title=data['title'],
-                description=data['description'],
-                author=default_user,
-                category=category,
-                cuisine=cuisine,
-                prep_time=data.get('prep_time', 0),
-                cook_time=data.get('cook_time', 0),
-                servings=data.get('servings', 1),
-                difficulty=data.get('difficulty', 'medium'),
-                calories_per_serving=data.get('calories_per_serving'),
-                protein=data.get('protein'),
-                carbs=data.get('carbs'),
-                fat=data.get('fat'),
-            )
-            # Diets
-            for diet_name in data.get('diets', []):
-                diet = Diet.objects.get_or_create(name=diet_name)[0]
-                recipe.diets.add(diet)
-            # Ingredients
-            for ing in data['ingredients']:
-                Ingredient.objects.create(
-                    recipe=recipe,
-                    name=ing['name'],
-                    quantity=ing['quantity'],
-                    unit=ing.get('unit', '')
-                )
-            # Instructions
-            for idx, ins in enumerate(data['instructions'], 1):
-                Instruction.objects.create(
-                    recipe=recipe,
-                    step_number=idx,
-                    text=ins
-                )
-        self.stdout.write(self.style.SUCCESS(f"Imported {len(recipes)} recipes."))
+        if options['author']:
+            try:
+                author = User.objects.get(username=options['author'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['author']!r} does not exist.")
+        else:
+            author = User.objects.first()
+        workers = max(options['workers'], 1)
+        if workers > 1 and not options['upsert']:
+            raise CommandError('--workers needs --upsert, which keeps parallel and repeated runs idempotent.')
+        try:
+            writer = RecipeBatchWriter(author)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        checkpoint = options['checkpoint'] or f"{options['json_path']}.checkpoint"
+        jobs = [
+            {
+                'json_path': options['json_path'],
+                'author_id': author.pk,
+                'batch_size': options['batch_size'],
+                'upsert': options['upsert'],
+                'checkpoint_path': checkpoint if workers == 1 else f'{checkpoint}.{worker}of{workers}',
+                'restart': options['restart'],
+                'worker': worker,
+                'workers': workers,
+            }
+            for worker in range(workers)
+        ]
+        started = time.monotonic()
+        if workers == 1:
+            results = [run_import(**jobs[0], log=self.stdout.write)]
+        else:
+            results = worker_pool.run_pool(_run_worker, jobs, self.stdout.write)
+        writer.finish()
+
+        totals = {key: sum(result[key] for result in results) for key in results[0]}
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['created']} recipes, updated {totals['updated']}, "
+            f"skipped {totals['unchanged']} unchanged in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from recipes.feed import rebuild_home_feed
+
+
+class Command(BaseCommand):
+    help = 'Render the home feed served by /api/merged-recipes/ and store it in the cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=None,
+                            help='Keep running and rebuild every N seconds.')
+
+    def handle(self, *args, **options):
+        alias = getattr(settings, 'HOME_FEED_CACHE', 'default')
+        if isinstance(caches[alias], LocMemCache):
+            raise CommandError(
+                f"HOME_FEED_CACHE '{alias}' is a local-memory cache, so web workers would never "
+                "see the rebuilt feed. Configure a shared cache (set REDIS_URL)."
+            )
+        while True:
+            started = time.monotonic()
+            feed = rebuild_home_feed()
+            note = ' (Spoonacular missed the deadline)' if feed['partial'] else ''
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt home feed with {len(feed['recipes'])} recipes in "
+                f"{time.monotonic() - started:.2f}s{note}."
+            ))
+            if options['every'] is None:
+                return
+            time.sleep(max(options['every'] - (time.monotonic() - started), 0))
+            close_old_connections()
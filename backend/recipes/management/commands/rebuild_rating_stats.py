@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import Recipe
+from recipes.response_cache import DETAIL_EPOCH
+from recipes.versions import bump
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or with --check, verify) the stored rating_count/rating_sum/rating_avg of every recipe.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report recipes whose stored aggregates have drifted; exit with an error if any.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of recipes updated per UPDATE statement.')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drifted = Recipe.objects.with_rating_drift()
+            count = 0
+            for recipe in drifted.only('id', 'title', 'rating_count', 'rating_sum').iterator():
+                count += 1
+                self.stdout.write(
+                    f"{recipe.id} {recipe.title}: stored {recipe.rating_count}/{recipe.rating_sum}, "
+                    f"actual {recipe.true_count}/{recipe.true_sum}"
+                )
+            if count:
+                raise CommandError(f"{count} recipes have stale rating aggregates.")
+            self.stdout.write(self.style.SUCCESS('All rating aggregates are up to date.'))
+            return
+
+        batch_size = options['batch_size']
+        ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+        updated = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            updated += Recipe.objects.filter(id__gte=batch[0], id__lte=batch[-1]).refresh_rating_stats()
+        # Cached list pages and recipe details show the aggregates
+        bump('recipes')
+        bump(DETAIL_EPOCH)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {updated} recipes."))
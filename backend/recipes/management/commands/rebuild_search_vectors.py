@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+from recipes.search import update_search_vectors, uses_full_text
+
+
+class Command(BaseCommand):
+    help = 'Recompute the full-text search vector of every recipe (PostgreSQL only).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of recipes updated per UPDATE statement.')
+
+    def handle(self, *args, **options):
+        if not uses_full_text(Recipe.objects.db):
+            self.stdout.write('Full-text search vectors are only used on PostgreSQL; nothing to do.')
+            return
+        batch_size = options['batch_size']
+        ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+        updated = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            updated += update_search_vectors(Recipe.objects.filter(id__gte=batch[0], id__lte=batch[-1]))
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search vectors for {updated} recipes."))
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recipes import mirror, spoonacular
+
+
+class Command(BaseCommand):
+    help = (
+        'Mirror Spoonacular recipes into the local database. New recipes are '
+        'fetched, mirrored recipes older than --max-age are refreshed, and fresh '
+        'ones are left alone.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', default=[],
+                            help='Mirror the results of this search (repeatable).')
+        parser.add_argument('--number', type=int, default=100,
+                            help='Results to mirror per --query.')
+        parser.add_argument('--random', type=int, default=0,
+                            help='Also mirror this many random recipes.')
+        parser.add_argument('--ids', type=int, nargs='*', default=[],
+                            help='Spoonacular recipe ids to mirror.')
+        parser.add_argument('--max-age', type=float, default=24,
+                            help='Hours after which a mirrored recipe is refreshed.')
+        parser.add_argument('--no-refresh', action='store_true',
+                            help='Only add new recipes; do not refresh stale ones.')
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Recipes fetched per informationBulk call.')
+
+    def handle(self, *args, **options):
+        synced_at = mirror.synced_at_by_id()
+        cutoff = timezone.now() - timedelta(hours=options['max_age'])
+        created = updated = 0
+
+        try:
+            wanted = set(options['ids'])
+            for query in options['query']:
+                wanted.update(spoonacular.search_ids(query, options['number']))
+            if not options['no_refresh']:
+                wanted.update(i for i, at in synced_at.items() if at is None or at < cutoff)
+            if options['random']:
+                # The random endpoint already returns full information
+                payloads = spoonacular.random_information(options['random'])
+                c, u = mirror.upsert(payloads)
+                created, updated = created + c, updated + u
+                wanted.difference_update(data['id'] for data in payloads)
+
+            to_fetch = sorted(
+                i for i in wanted
+                if i not in synced_at or synced_at[i] is None or synced_at[i] < cutoff
+            )
+            batch_size = options['batch_size']
+            for start in range(0, len(to_fetch), batch_size):
+                batch = to_fetch[start:start + batch_size]
+                c, u = mirror.upsert(spoonacular.information_bulk(batch))
+                created, updated = created + c, updated + u
+                self.stdout.write(f'  {min(start + batch_size, len(to_fetch))}/{len(to_fetch)} fetched')
+        except spoonacular.SpoonacularError as e:
+            raise CommandError(f'Spoonacular sync stopped: {e} '
+                               f'({created} added, {updated} refreshed before the error)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Mirrored {created} new and refreshed {updated} Spoonacular recipes.'
+        ))
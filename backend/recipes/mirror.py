@@ -0,0 +1,226 @@
+"""
+Local mirror of Spoonacular recipes.
+
+The sync_spoonacular command stores Spoonacular recipes as Recipe, Ingredient
+and Instruction rows tagged with external_source='spoonacular' and the
+Spoonacular id. Mirrored rows are kept out of the local catalog
+(Recipe.objects.local()); the Spoonacular detail view and list search read
+them first and only call the API on a miss, returning the same shapes as
+recipes.spoonacular.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .importing import NameCache
+from .models import Category, Cuisine, Diet, Ingredient, Instruction, Recipe
+from .search import search_queryset, update_search_vectors
+from .signals import ingredient_index_paused
+
+SOURCE = 'spoonacular'
+MIRROR_USERNAME = 'spoonacular'
+
+# Spoonacular dishTypes mapped onto the categories created by populate_data
+DISH_TYPE_CATEGORIES = {
+    'breakfast': 'Breakfast',
+    'morning meal': 'Breakfast',
+    'brunch': 'Breakfast',
+    'lunch': 'Lunch',
+    'salad': 'Lunch',
+    'soup': 'Lunch',
+    'main course': 'Dinner',
+    'main dish': 'Dinner',
+    'dinner': 'Dinner',
+    'dessert': 'Dessert',
+    'snack': 'Snacks',
+    'appetizer': 'Snacks',
+    'starter': 'Snacks',
+    'fingerfood': 'Snacks',
+    'side dish': 'Snacks',
+    'beverage': 'Beverages',
+    'drink': 'Beverages',
+}
+DEFAULT_CATEGORY = 'Dinner'
+
+UPDATE_FIELDS = [
+    'title', 'description', 'category', 'cuisine', 'prep_time', 'cook_time', 'servings',
+    'difficulty', 'external_url', 'external_image', 'synced_at',
+]
+
+
+def summarize(recipe):
+    """Same shape as spoonacular.summarize() for a mirrored recipe"""
+    return {
+        'id': f'spoonacular_{recipe.external_id}',
+        'title': recipe.title,
+        'image': recipe.external_image or None,
+        'ingredients': [
+            ' '.join(part for part in (i.quantity, i.unit, i.name) if part)
+            for i in recipe.ingredients.all()
+        ],
+        'instructions': '\n'.join(step.text for step in recipe.instructions.all()) or None,
+        'source': SOURCE,
+    }
+
+
+def detail(recipe):
+    """Same shape as spoonacular.detail() for a mirrored recipe"""
+    return {
+        **summarize(recipe),
+        'summary': recipe.description,
+        'readyInMinutes': recipe.total_time,
+        'servings': recipe.servings,
+        'sourceUrl': recipe.external_url or None,
+        'nutrition': {},
+    }
+
+
+def _mirrored():
+    return Recipe.objects.mirrored(SOURCE).defer('search_vector').prefetch_related(
+        'ingredients', 'instructions'
+    )
+
+
+def lookup(spoonacular_id):
+    """Detail dict for a mirrored recipe, or None if it has not been synced"""
+    recipe = _mirrored().filter(external_id=str(spoonacular_id)).first()
+    return detail(recipe) if recipe is not None else None
+
+
+def search(query, number=5):
+    """Best mirrored matches for query, as spoonacular.search_recipes() would return them"""
+    terms = query.replace(',', ' ').split()
+    if not terms:
+        return []
+    recipes = search_queryset(_mirrored(), terms).order_by('-search_rank', 'id')[:number]
+    return [summarize(recipe) for recipe in recipes]
+
+
+def synced_at_by_id():
+    """{spoonacular id: last sync time} for every mirrored recipe"""
+    return {
+        int(external_id): synced_at
+        for external_id, synced_at in Recipe.objects.mirrored(SOURCE).values_list('external_id', 'synced_at')
+    }
+
+
+def _mirror_user():
+    user, created = get_user_model().objects.get_or_create(
+        username=MIRROR_USERNAME, defaults={'is_active': False}
+    )
+    if created:
+        user.set_unusable_password()
+        user.save(update_fields=['password'])
+    return user
+
+
+def _difficulty(minutes):
+    if minutes <= 30:
+        return 'easy'
+    if minutes <= 60:
+        return 'medium'
+    return 'hard'
+
+
+def _apply(recipe, data, categories, cuisines, now):
+    prep = max(data.get('preparationMinutes') or 0, 0)
+    cook = max(data.get('cookingMinutes') or 0, 0)
+    if not prep and not cook:
+        cook = max(data.get('readyInMinutes') or 0, 0)
+    dish_types = [DISH_TYPE_CATEGORIES.get(t.casefold()) for t in data.get('dishTypes') or []]
+    category = next((name for name in dish_types if name), DEFAULT_CATEGORY)
+    cuisine = (data.get('cuisines') or [None])[0]
+
+    recipe.title = (data.get('title') or '')[:200]
+    recipe.description = data.get('summary') or ''
+    recipe.category = categories.get(category)
+    recipe.cuisine = cuisines.get(cuisine) if cuisine else None
+    recipe.prep_time = prep
+    recipe.cook_time = cook
+    recipe.servings = data.get('servings') or 1
+    recipe.difficulty = _difficulty(prep + cook)
+    recipe.external_url = (data.get('sourceUrl') or '')[:500]
+    recipe.external_image = (data.get('image') or '')[:500]
+    recipe.synced_at = now
+
+
+def _ingredients(recipe_id, data):
+    rows = []
+    for item in data.get('extendedIngredients') or []:
+        amount = item.get('amount')
+        rows.append(Ingredient(
+            recipe_id=recipe_id,
+            name=(item.get('name') or item.get('original') or '')[:200],
+            quantity=f'{amount:g}' if isinstance(amount, (int, float)) else '',
+            unit=(item.get('unit') or '')[:50],
+        ))
+    return rows
+
+
+def _instructions(recipe_id, data):
+    steps = [
+        step['step']
+        for block in data.get('analyzedInstructions') or []
+        for step in block.get('steps') or []
+        if step.get('step')
+    ]
+    if not steps:
+        steps = [line.strip() for line in strip_tags(data.get('instructions') or '').splitlines() if line.strip()]
+    return [Instruction(recipe_id=recipe_id, step_number=n, text=text) for n, text in enumerate(steps, 1)]
+
+
+def upsert(payloads):
+    """
+    Insert or refresh mirrored recipes from Spoonacular recipe information
+    payloads in one transaction. Returns (created, updated).
+
+    Rows are written with bulk operations, so search vectors are refreshed
+    explicitly instead of through signals.
+    """
+    payloads = {str(data['id']): data for data in payloads if data.get('id')}
+    if not payloads:
+        return 0, 0
+    now = timezone.now()
+    author = _mirror_user()
+    categories, cuisines, diets = (NameCache(model, title_case=True) for model in (Category, Cuisine, Diet))
+
+    with transaction.atomic():
+        existing = {
+            recipe.external_id: recipe
+            for recipe in Recipe.objects.mirrored(SOURCE).filter(external_id__in=payloads).defer('search_vector')
+        }
+        created, updated = [], []
+        for external_id, data in payloads.items():
+            recipe = existing.get(external_id)
+            if recipe is None:
+                recipe = Recipe(author=author, external_source=SOURCE, external_id=external_id)
+                created.append(recipe)
+            else:
+                updated.append(recipe)
+            _apply(recipe, data, categories, cuisines, now)
+        Recipe.objects.bulk_create(created)
+        Recipe.objects.bulk_update(updated, UPDATE_FIELDS)
+
+        ids = dict(
+            Recipe.objects.mirrored(SOURCE).filter(external_id__in=payloads).values_list('external_id', 'id')
+        )
+        # Like their recipes, mirrored ingredients are not in the autocomplete index
+        with ingredient_index_paused():
+            Ingredient.objects.filter(recipe_id__in=ids.values()).delete()
+        Instruction.objects.filter(recipe_id__in=ids.values()).delete()
+        DietLink = Recipe.diets.through
+        DietLink.objects.filter(recipe_id__in=ids.values()).delete()
+
+        ingredients, instructions, diet_links = [], [], []
+        for external_id, data in payloads.items():
+            recipe_id = ids[external_id]
+            ingredients.extend(_ingredients(recipe_id, data))
+            instructions.extend(_instructions(recipe_id, data))
+            diet_ids = {diets.get(name).id for name in data.get('diets') or []}
+            diet_links.extend(DietLink(recipe_id=recipe_id, diet_id=diet_id) for diet_id in diet_ids)
+        Ingredient.objects.bulk_create(ingredients)
+        Instruction.objects.bulk_create(instructions)
+        DietLink.objects.bulk_create(diet_links)
+        update_search_vectors(Recipe.objects.filter(pk__in=ids.values()))
+    return len(created), len(updated)
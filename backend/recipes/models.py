@@ -1,6 +1,12 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import (
+    Avg, Case, Count, Exists, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Cast, Coalesce
 
 
 class Category(models.Model):
@@ -30,6 +36,69 @@ class Diet(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    def local(self):
+        """Recipes created on this site, without rows mirrored from external APIs"""
+        return self.filter(external_source='')
+
+    def mirrored(self, source):
+        return self.filter(external_source=source)
+
+    def with_list_data(self, user=None):
+        """Join related rows and compute the favorite flag in the same query"""
+        queryset = self.select_related('author', 'category', 'cuisine').defer('search_vector')
+        if user is not None and user.is_authenticated:
+            favorites = Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            return queryset.annotate(favorited=Exists(favorites))
+        return queryset.annotate(favorited=Value(False))
+
+    def apply_rating_delta(self, recipe_id, count_delta, sum_delta):
+        """Atomically adjust the stored rating aggregates of one recipe"""
+        count = F('rating_count') + count_delta
+        total = F('rating_sum') + sum_delta
+        return self.filter(pk=recipe_id).update(
+            rating_count=count,
+            rating_sum=total,
+            rating_avg=Case(
+                When(rating_count__lte=-count_delta, then=Value(0.0)),
+                default=Cast(total, FloatField()) / Cast(count, FloatField()),
+                output_field=FloatField(),
+            ),
+        )
+
+    def _true_rating_stats(self):
+        ratings = Rating.objects.filter(recipe=OuterRef('pk')).order_by().values('recipe')
+        return {
+            'true_count': Coalesce(Subquery(ratings.annotate(n=Count('id')).values('n')), 0),
+            'true_sum': Coalesce(Subquery(ratings.annotate(s=Sum('score')).values('s')), 0),
+            'true_avg': Coalesce(Subquery(ratings.annotate(a=Avg('score')).values('a')), 0.0),
+        }
+
+    def refresh_rating_stats(self):
+        """Recompute the stored rating aggregates from the Rating table"""
+        stats = self._true_rating_stats()
+        return self.update(
+            rating_count=stats['true_count'],
+            rating_sum=stats['true_sum'],
+            rating_avg=stats['true_avg'],
+        )
+
+    def with_rating_drift(self):
+        """Recipes whose stored rating aggregates disagree with the Rating table"""
+        return self.annotate(**self._true_rating_stats()).exclude(
+            rating_count=F('true_count'), rating_sum=F('true_sum')
+        )
+
+
+class SearchVectorIndex(GinIndex):
+    """GIN index on PostgreSQL; other databases (SQLite in development and tests) get a plain index"""
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return models.Index.create_sql(self, model, schema_editor, using=using, **kwargs)
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+
 class Recipe(models.Model):
     DIFFICULTY_CHOICES = [
         ('easy', 'Easy'),
@@ -55,12 +124,48 @@ class Recipe(models.Model):
     protein = models.FloatField(null=True, blank=True, help_text="Protein per serving (g)")
     carbs = models.FloatField(null=True, blank=True, help_text="Carbohydrates per serving (g)")
     fat = models.FloatField(null=True, blank=True, help_text="Fat per serving (g)")
+
+    # Maintained by recipes.signals whenever a Rating is saved or deleted
+    rating_count = models.IntegerField(default=0, editable=False)
+    rating_sum = models.IntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, db_index=True, editable=False)
+
+    # Weighted full-text document (PostgreSQL only), maintained by recipes.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Set on rows mirrored from an external API by recipes.mirror; empty for local recipes
+    external_source = models.CharField(max_length=30, blank=True, default='', editable=False)
+    external_id = models.CharField(max_length=50, blank=True, default='', editable=False)
+    external_url = models.URLField(max_length=500, blank=True, default='', editable=False)
+    external_image = models.URLField(max_length=500, blank=True, default='', editable=False)
+    synced_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Natural key and content hash of the record an upsert import created this row from
+    import_key = models.CharField(max_length=64, blank=True, default='', editable=False)
+    import_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['external_source', 'external_id'],
+                condition=~Q(external_source=''),
+                name='recipes_recipe_external_unique',
+            ),
+            models.UniqueConstraint(
+                fields=['import_key'],
+                condition=~Q(import_key=''),
+                name='recipes_recipe_import_key_unique',
+            ),
+        ]
+        indexes = [
+            SearchVectorIndex(fields=['search_vector'], name='recipe_search_vector_gin'),
+        ]
     
     def __str__(self):
         return self.title
@@ -71,9 +176,8 @@ class Recipe(models.Model):
     
     @property
     def average_rating(self):
-        ratings = self.ratings.all()
-        if ratings:
-            return sum(rating.score for rating in ratings) / len(ratings)
+        if self.rating_count:
+            return self.rating_sum / self.rating_count
         return 0
 
 
@@ -109,6 +213,15 @@ class Rating(models.Model):
     
     class Meta:
         unique_together = ('recipe', 'user')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so signals can apply the difference on save
+        loaded = dict(zip(field_names, values))
+        if 'recipe_id' in loaded and 'score' in loaded:
+            instance._loaded_values = (loaded['recipe_id'], loaded['score'])
+        return instance
     
     def __str__(self):
         return f"{self.user.username} rated {self.recipe.title}: {self.score}/5"
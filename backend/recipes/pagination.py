@@ -0,0 +1,276 @@
+import base64
+import json
+from collections import namedtuple
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# position: ordering values of the boundary row (None before the first page)
+# reverse: walk backwards from the boundary (used by "previous" links)
+# inclusive: the boundary row itself belongs to the requested page
+# external: number of external (Spoonacular) items shown before the boundary
+# page: index of the requested page, which fixes its share of external items
+Cursor = namedtuple('Cursor', ['position', 'reverse', 'inclusive', 'external', 'page'])
+
+
+class RecipeCursorPagination(BasePagination):
+    """
+    Keyset pagination over the active ordering plus the primary key.
+
+    Each page is fetched with a WHERE clause on the ordering values of the
+    previous page's boundary row instead of an OFFSET, so every page costs
+    the same as the first one. External results can be interleaved with
+    merge_external(); they take up to external_per_page slots of a page so
+    the page size stays constant.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at',)
+    external_per_page = 5
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        if reverse:
+            queryset = queryset.order_by(*[self._flip(field) for field in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if self.cursor is not None and self.cursor.position is not None:
+            queryset = queryset.filter(self._keyset_filter(self.cursor.position, reverse, self.cursor.inclusive))
+
+        # One row of lookahead tells whether local rows continue past this page
+        rows = list(queryset[:self.page_size + 1])
+        self.has_more_local = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        self.page = rows
+        self.page_index = self.cursor.page if self.cursor else 0
+        self.external_offset = self.cursor.external if self.cursor else 0
+        self.external_taken = 0
+        self.external_total = 0
+        return rows
+
+    def merge_external(self, local_items, external_items):
+        """
+        Trim the serialized page to make room for this page's share of
+        external_items and interleave them. Must be called with the data
+        serialized from the rows returned by paginate_queryset().
+        """
+        reverse = self.cursor is not None and self.cursor.reverse
+        offset = min(self.cursor.external if self.cursor else 0, len(external_items))
+        slots = min(self.external_per_page, self.page_size // 2)
+
+        if reverse:
+            # Page n starts at external item n * slots; local rows ran out on
+            # the page before an all-external page, so this also covers that one
+            taken = offset - min(self.cursor.page * slots, offset)
+            external = external_items[offset - taken:offset]
+            keep = min(len(local_items), self.page_size - taken)
+            # Rows farthest from the boundary are the first ones in page order
+            if keep < len(local_items):
+                self.has_more_local = True
+            local_items = local_items[len(local_items) - keep:]
+            self.page = self.page[len(self.page) - keep:]
+        else:
+            remaining = external_items[offset:]
+            taken = min(slots, len(remaining))
+            keep = min(len(local_items), self.page_size - taken)
+            if keep < len(local_items):
+                self.has_more_local = True
+            elif not self.has_more_local:
+                # Local rows are exhausted, so external items fill the rest of the page
+                taken = min(len(remaining), self.page_size - keep)
+            external = remaining[:taken]
+            local_items = local_items[:keep]
+            self.page = self.page[:keep]
+
+        self.external_offset = offset
+        self.external_taken = len(external)
+        self.external_total = len(external_items)
+        return self._interleave(list(local_items), list(external))
+
+    def get_paginated_response(self, data, results_key='results'):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            results_key: data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        reverse = self.cursor is not None and self.cursor.reverse
+        offset = self.external_offset
+        taken = self.external_taken
+        total = self.external_total
+        if reverse:
+            # Everything after the page we walked back to is known to exist
+            external_after = offset
+            has_next = True
+        else:
+            external_after = offset + taken
+            has_next = self.has_more_local or external_after < total
+        if not has_next:
+            return None
+        if self.page:
+            cursor = Cursor(self._position(self.page[-1]), False, False, external_after, self.page_index + 1)
+        elif self.cursor is None:
+            cursor = Cursor(None, False, False, external_after, self.page_index + 1)
+        else:
+            # No local rows on this page: keep the boundary, flipping which side owns it
+            inclusive = self.cursor.inclusive != reverse
+            cursor = Cursor(self.cursor.position, False, inclusive, external_after, self.page_index + 1)
+        return self.encode_cursor(cursor)
+
+    def get_previous_link(self):
+        reverse = self.cursor is not None and self.cursor.reverse
+        offset = self.external_offset
+        if reverse:
+            external_before = offset - self.external_taken
+            has_previous = self.has_more_local or self.page_index > 0
+        else:
+            external_before = offset
+            has_previous = self.cursor is not None
+        if not has_previous:
+            return None
+        if self.page:
+            cursor = Cursor(self._position(self.page[0]), True, False, external_before, max(self.page_index - 1, 0))
+        elif self.cursor is not None and self.cursor.position is not None:
+            inclusive = self.cursor.inclusive == reverse
+            cursor = Cursor(self.cursor.position, True, inclusive, external_before, max(self.page_index - 1, 0))
+        else:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(cursor)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        ordering = [field for field in (ordering or self.ordering) if field.lstrip('-') != '?']
+        if not ordering:
+            ordering = list(self.ordering)
+        # The primary key makes every position unique
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return ordering
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = payload.get('p')
+            if position is not None:
+                if len(position) != len(self.ordering):
+                    raise ValueError('cursor does not match the ordering')
+                position = [self._to_python(field, value) for field, value in zip(self.ordering, position)]
+            return Cursor(
+                position, bool(payload.get('r')), bool(payload.get('i')),
+                max(int(payload.get('x', 0)), 0), max(int(payload.get('n', 0)), 0),
+            )
+        except (TypeError, ValueError, ValidationError, UnicodeError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        payload = {'n': cursor.page, 'x': cursor.external}
+        if cursor.position is not None:
+            payload['p'] = [self._to_json(value) for value in cursor.position]
+        if cursor.reverse:
+            payload['r'] = 1
+        if cursor.inclusive:
+            payload['i'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def _keyset_filter(self, position, reverse, inclusive):
+        # (a, b, id) after (x, y, z) expands to a > x OR (a = x AND b > y) OR ...
+        clauses = []
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            clauses.append(equal & Q(**{f'{name}__{lookup}': value}))
+            equal &= Q(**{name: value})
+        if inclusive:
+            clauses.append(equal)
+        # The redundant bound on the leading column lets the database use its index
+        first = self.ordering[0]
+        bound = 'lte' if first.startswith('-') != reverse else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': position[0]}) & reduce(or_, clauses)
+
+    def _position(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def _to_python(self, field, value):
+        name = field.lstrip('-')
+        try:
+            model_field = self.model._meta.get_field(name) if name != 'pk' else self.model._meta.pk
+        except FieldDoesNotExist:
+            return value
+        return model_field.to_python(value)
+
+    @staticmethod
+    def _to_json(value):
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _interleave(local_items, external_items):
+        # Spread external items evenly through the page, never in the first slot
+        total = len(local_items) + len(external_items)
+        count = len(external_items)
+        merged = []
+        local_index = external_index = 0
+        for slot in range(total):
+            wants_external = count and (slot + 1) * count >= (external_index + 1) * total
+            if external_index < count and (wants_external or local_index >= len(local_items)):
+                merged.append(external_items[external_index])
+                external_index += 1
+            else:
+                merged.append(local_items[local_index])
+                local_index += 1
+        return merged
@@ -0,0 +1,200 @@
+"""
+Spoonacular points budget shared by every worker.
+
+Each call costs points, as priced by Spoonacular (estimate_cost). They are
+taken from a token bucket that holds SPOONACULAR_DAILY_POINTS and refills
+evenly over a day. The bucket lives in the Django cache named by
+SPOONACULAR_QUOTA_CACHE, so it is shared across processes when that cache
+is (Redis, Memcached, database). With a local-memory cache every process
+gets a whole budget of its own, and a warning says so.
+
+Priorities keep the last part of the budget for the calls that matter: a
+'high' call (recipe detail) may spend the bucket down to zero, 'normal'
+calls (search and random enrichment of lists) stop when less than 20% is
+left, and 'low' calls (mirror sync) stop at 50%. A refused call raises
+QuotaExceeded, which list views treat like any other Spoonacular failure.
+
+Quota headers on Spoonacular responses clamp the bucket to what the API
+reports as left, and stats() exposes the remaining points.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from .spoonacular_client import SpoonacularError
+
+logger = logging.getLogger(__name__)
+
+# Fraction of the bucket each priority must leave untouched
+PRIORITY_RESERVES = {'high': 0.0, 'normal': 0.2, 'low': 0.5}
+
+DEFAULT_DAILY_POINTS = 150
+
+
+class QuotaExceeded(SpoonacularError):
+    def __init__(self, path, cost, remaining):
+        super().__init__(
+            429, f'Spoonacular quota too low for {path} ({cost:g} points, {remaining:.1f} left)'
+        )
+
+
+def estimate_cost(path, params):
+    """Points Spoonacular charges for a call, following its published pricing"""
+    number = int(params.get('number', 1) or 1)
+    if path == '/recipes/complexSearch':
+        cost = 1 + 0.01 * number
+        if params.get('addRecipeInformation'):
+            cost += 0.025 * number
+        return cost
+    if path == '/recipes/random':
+        return 1 + 0.01 * number
+    if path == '/recipes/informationBulk':
+        ids = [i for i in str(params.get('ids', '')).split(',') if i]
+        return 1 + 0.5 * max(len(ids) - 1, 0)
+    return 1
+
+
+def default_priority(path):
+    if path == '/recipes/informationBulk':
+        return 'low'
+    if path.endswith('/information'):
+        return 'high'
+    return 'normal'
+
+
+class TokenBucket:
+    """Token bucket stored in a Django cache, updated under a cache.add() lock"""
+
+    def __init__(self, capacity, refill_per_second, cache_alias='default', key='spoonacular:quota'):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.cache_alias = cache_alias
+        self.key = key
+        self.upstream_left = None
+        self.taken = 0
+        self.refused = {priority: 0 for priority in PRIORITY_RESERVES}
+
+    @property
+    def store(self):
+        return caches[self.cache_alias]
+
+    @contextmanager
+    def _locked(self):
+        lock_key = f'{self.key}:lock'
+        deadline = time.monotonic() + 0.2
+        locked = self.store.add(lock_key, 1, 2)
+        while not locked and time.monotonic() < deadline:
+            time.sleep(0.005)
+            locked = self.store.add(lock_key, 1, 2)
+        # If the lock cannot be had quickly, go ahead unlocked: an occasional
+        # lost update is better than stalling requests on the quota
+        try:
+            yield
+        finally:
+            if locked:
+                self.store.delete(lock_key)
+
+    def _load(self, now):
+        tokens, updated_at = self.store.get(self.key) or (self.capacity, now)
+        return min(self.capacity, tokens + (now - updated_at) * self.refill_per_second)
+
+    def _save(self, tokens, now):
+        self.store.set(self.key, (tokens, now), None)
+
+    def remaining(self):
+        return self._load(time.time())
+
+    def try_take(self, cost, priority='normal'):
+        """Take cost tokens unless that would dip into the priority's reserve"""
+        reserve = PRIORITY_RESERVES[priority] * self.capacity
+        with self._locked():
+            now = time.time()
+            tokens = self._load(now)
+            if tokens - cost < reserve:
+                self.refused[priority] += 1
+                return False, tokens
+            self._save(tokens - cost, now)
+        self.taken += cost
+        return True, tokens - cost
+
+    def clamp(self, upstream_left):
+        """Never believe we have more points than Spoonacular says are left"""
+        self.upstream_left = upstream_left
+        with self._locked():
+            now = time.time()
+            tokens = self._load(now)
+            if upstream_left < tokens:
+                self._save(upstream_left, now)
+
+    def stats(self):
+        return {
+            'capacity': self.capacity,
+            'remaining': round(self.remaining(), 2),
+            'upstream_left': self.upstream_left,
+            'taken': round(self.taken, 2),
+            'refused': dict(self.refused),
+        }
+
+
+_bucket = None
+_bucket_lock = threading.Lock()
+
+
+def get_bucket():
+    """The shared bucket, or None when SPOONACULAR_DAILY_POINTS is None"""
+    global _bucket
+    if _bucket is None:
+        points = getattr(settings, 'SPOONACULAR_DAILY_POINTS', DEFAULT_DAILY_POINTS)
+        if points is None:
+            return None
+        with _bucket_lock:
+            if _bucket is None:
+                alias = getattr(settings, 'SPOONACULAR_QUOTA_CACHE', 'default')
+                if isinstance(caches[alias], LocMemCache):
+                    logger.warning(
+                        "Spoonacular quota cache %r is local memory: each process has its own "
+                        "budget of %s points", alias, points,
+                    )
+                _bucket = TokenBucket(capacity=points, refill_per_second=points / 86400, cache_alias=alias)
+    return _bucket
+
+
+def acquire(path, params, priority=None):
+    """Spend the points for a call, or raise QuotaExceeded"""
+    bucket = get_bucket()
+    if bucket is None:
+        return
+    priority = priority or default_priority(path)
+    cost = estimate_cost(path, params)
+    allowed, remaining = bucket.try_take(cost, priority)
+    if not allowed:
+        logger.info('Dropping %s Spoonacular call to %s: %.1f points left', priority, path, remaining)
+        raise QuotaExceeded(path, cost, remaining)
+
+
+def observe(response):
+    """Sync the bucket with the quota headers of a Spoonacular response"""
+    bucket = get_bucket()
+    if bucket is None:
+        return
+    if response.status_code == 402:
+        # Spoonacular answers 402 once the daily quota is used up
+        bucket.clamp(0)
+        return
+    left = response.headers.get('X-API-Quota-Left')
+    if left is None:
+        return
+    try:
+        bucket.clamp(float(left))
+    except ValueError:
+        pass
+
+
+def stats():
+    bucket = get_bucket()
+    return bucket.stats() if bucket is not None else None
@@ -0,0 +1,129 @@
+"""
+Cache of rendered recipe responses for anonymous visitors.
+
+Anonymous recipe detail and list pages are the same for every visitor, so the
+rendered JSON is stored in the Django cache and served as is on the next
+request. Keys combine the URL (image and page links are absolute), the
+normalized query parameters and the versions (recipes.versions) of the data
+the response was built from:
+
+- detail: the recipe's own counter ('recipe:<id>'), bumped by signals when
+  the recipe, its ingredients, instructions, diets or ratings change, plus
+  'taxonomy' for category, cuisine and diet names and DETAIL_EPOCH for bulk
+  writers that bypass signals;
+- list pages: the 'recipes' counter that also keys the home feed, which
+  ingredient and instruction edits leave alone, plus 'taxonomy' since the
+  category, cuisine and diet filters are validated against those tables.
+
+So a change only orphans the keys of what it affects; orphaned entries
+expire after RESPONSE_CACHE_TTL seconds. Version counters live in the default
+cache: with a shared backend (Redis, Memcached) every worker sees a bump at
+once, while with the local-memory backend used in development and tests a
+worker may serve an entry from before another worker's change until the TTL.
+
+Only complete 200 JSON responses are stored. Hit and miss counters are kept
+per process and reported by stats().
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import versions
+
+DEFAULT_TTL = 60
+DETAIL_EPOCH = 'recipe-details'
+# Headers set by the view and DRF that belong to the stored response
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Vary', 'Allow')
+
+_lock = threading.Lock()
+_counters = {'hits': 0, 'misses': 0, 'stores': 0}
+
+
+def _store():
+    return caches[getattr(settings, 'RESPONSE_CACHE', 'default')]
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def recipe_version(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def detail_versions(recipe_id):
+    return [recipe_version(recipe_id), 'taxonomy', DETAIL_EPOCH]
+
+
+def list_versions():
+    return ['recipes', 'taxonomy']
+
+
+def cacheable(request):
+    """Anonymous GETs negotiated to JSON; the browsable API is rendered per request"""
+    renderer = getattr(request, 'accepted_renderer', None)
+    return (
+        request.method == 'GET' and not request.user.is_authenticated
+        and renderer is not None and renderer.format == 'json'
+    )
+
+
+def make_key(request, version_names):
+    params = sorted((name, sorted(values)) for name, values in request.query_params.lists())
+    current = versions.get_versions(version_names)
+    digest = hashlib.sha1(repr((request.build_absolute_uri(request.path), params, current)).encode('utf-8')).hexdigest()
+    return f'response:{digest}'
+
+
+def lookup(request, version_names):
+    """
+    Return (key, response): the stored response for this request (or a 304
+    when the client already has it), or None with the key to store() under.
+    """
+    key = make_key(request, version_names)
+    entry = _store().get(key)
+    if entry is None:
+        _count('misses')
+        return key, None
+    _count('hits')
+    content, headers = entry
+    response = None
+    if 'ETag' in headers or 'Last-Modified' in headers:
+        last_modified = parse_http_date_safe(headers.get('Last-Modified', ''))
+        response = get_conditional_response(request, etag=headers.get('ETag'), last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(content)
+    for name, value in headers.items():
+        if name != 'Content-Type' or response.status_code == 200:
+            response[name] = value
+    return key, response
+
+
+def store(response, key):
+    """Store response under key once it is rendered, if it is complete"""
+    if key is None or response.status_code != 200:
+        return response
+    if isinstance(getattr(response, 'data', None), dict) and response.data.get('partial'):
+        return response
+
+    def save(rendered):
+        headers = {name: rendered[name] for name in STORED_HEADERS if rendered.has_header(name)}
+        _store().set(key, (rendered.content, headers), getattr(settings, 'RESPONSE_CACHE_TTL', DEFAULT_TTL))
+        _count('stores')
+
+    response.add_post_render_callback(save)
+    return response
+
+
+def stats():
+    with _lock:
+        counters = dict(_counters)
+    lookups = counters['hits'] + counters['misses']
+    counters['hit_ratio'] = round(counters['hits'] / lookups, 3) if lookups else None
+    return counters
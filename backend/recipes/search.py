@@ -0,0 +1,130 @@
+"""
+Ranked recipe search.
+
+On PostgreSQL every recipe keeps a weighted tsvector (title A, ingredients B,
+description C) in Recipe.search_vector, backed by a GIN index, and results
+are ordered by ts_rank. Other databases (SQLite in development and tests) use
+icontains matching with the same weights, so the API behaves the same way.
+"""
+import threading
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, transaction
+from django.db.models import Case, Exists, F, FloatField, OuterRef, Q, Subquery, TextField, Value, When
+from django.db.models.functions import Cast, Coalesce
+from rest_framework import filters
+
+from .models import Ingredient, Recipe
+
+SEARCH_CONFIG = 'english'
+
+# Same defaults as PostgreSQL's ts_rank for the A, B and C weights
+TITLE_WEIGHT = 1.0
+INGREDIENT_WEIGHT = 0.4
+DESCRIPTION_WEIGHT = 0.2
+
+_pending = threading.local()
+
+
+def uses_full_text(using):
+    return connections[using].vendor == 'postgresql'
+
+
+def search_vector_expression():
+    ingredients = (
+        Ingredient.objects.filter(recipe=OuterRef('pk'))
+        .order_by()
+        .values('recipe')
+        .annotate(names=StringAgg('name', delimiter=' '))
+        .values('names')
+    )
+    ingredient_names = Coalesce(Subquery(ingredients), Value(''), output_field=TextField())
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(ingredient_names, weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset):
+    """Recompute search_vector for the given recipes in a single UPDATE"""
+    if not uses_full_text(queryset.db):
+        return 0
+    return queryset.update(search_vector=search_vector_expression())
+
+
+def schedule_search_vector_update(recipe_id, using='default'):
+    """
+    Refresh a recipe's search vector once the current transaction commits.
+
+    Saving a recipe with its ingredients (admin inlines, nested serializers)
+    touches many rows; collecting the ids and flushing them on commit turns
+    that into one UPDATE that also sees the final ingredient list.
+    """
+    if not uses_full_text(using):
+        return
+    pending = getattr(_pending, 'ids', None)
+    if pending is None:
+        pending = _pending.ids = set()
+    pending.add(recipe_id)
+    transaction.on_commit(lambda: _flush_pending(using), using=using)
+
+
+def _flush_pending(using):
+    ids = getattr(_pending, 'ids', None)
+    if not ids:
+        return
+    _pending.ids = set()
+    update_search_vectors(Recipe.objects.using(using).filter(pk__in=ids))
+
+
+def search_queryset(queryset, terms):
+    """Filter recipes matching all terms and annotate them with search_rank"""
+    if uses_full_text(queryset.db):
+        query = SearchQuery(' '.join(terms), search_type='websearch', config=SEARCH_CONFIG)
+        # ts_rank returns real; as double precision the value stored in a
+        # cursor compares equal to the row again at the page boundary
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+        )
+    rank = Value(0.0)
+    for term in terms:
+        ingredient_match = Exists(
+            Ingredient.objects.filter(recipe=OuterRef('pk'), name__icontains=term)
+        )
+        queryset = queryset.filter(
+            Q(title__icontains=term) | ingredient_match | Q(description__icontains=term)
+        )
+        rank = (
+            rank
+            + _score(Q(title__icontains=term), TITLE_WEIGHT)
+            + _score(ingredient_match, INGREDIENT_WEIGHT)
+            + _score(Q(description__icontains=term), DESCRIPTION_WEIGHT)
+        )
+    return queryset.annotate(search_rank=rank)
+
+
+class RecipeSearchFilter(filters.SearchFilter):
+    """SearchFilter that annotates every match with a search_rank relevance score"""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return search_queryset(queryset, terms)
+
+
+class RelevanceOrderingFilter(filters.OrderingFilter):
+    """Order search results by relevance unless the client asked for another ordering"""
+
+    def get_ordering(self, request, queryset, view):
+        explicit = request.query_params.get(self.ordering_param)
+        search = RecipeSearchFilter().get_search_terms(request)
+        if search and not explicit:
+            return ['-search_rank'] + list(self.get_default_ordering(view) or [])
+        return super().get_ordering(request, queryset, view)
+
+
+def _score(condition, weight):
+    return Case(When(condition, then=Value(weight)), default=Value(0.0), output_field=FloatField())
@@ -1,45 +1,55 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import transaction
 from .models import Recipe, Ingredient, Instruction, Category, Cuisine, Diet, Rating, Favorite, ShoppingListItem
+from .conditional import touch_recipes
+from .fieldsets import SparseFieldsMixin
+from .response_cache import recipe_version
+from .search import schedule_search_vector_update
+from .signals import index_ingredients, unindex_ingredients
+from .versions import bump_on_commit
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'first_name', 'last_name', 'email']
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'description']
 
 
-class CuisineSerializer(serializers.ModelSerializer):
+class CuisineSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Cuisine
         fields = ['id', 'name', 'description']
 
 
-class DietSerializer(serializers.ModelSerializer):
+class DietSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Diet
         fields = ['id', 'name', 'description']
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # Writable so recipe updates can refer to existing rows
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = Ingredient
         fields = ['id', 'name', 'quantity', 'unit']
 
 
-class InstructionSerializer(serializers.ModelSerializer):
+class InstructionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Instruction
         fields = ['id', 'step_number', 'text']
 
 
-class RatingSerializer(serializers.ModelSerializer):
+class RatingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     
     class Meta:
@@ -47,8 +57,27 @@ class RatingSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'score', 'comment', 'created_at']
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeAnnotationsMixin:
+    """Read the favorite flag from Recipe.objects.with_list_data() annotations when present"""
+
+    def get_is_favorited(self, obj):
+        if hasattr(obj, 'favorited'):
+            return obj.favorited
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            return Favorite.objects.filter(user=request.user, recipe=obj).exists()
+        return False
+
+
+class RecipeListSerializer(SparseFieldsMixin, RecipeAnnotationsMixin, serializers.ModelSerializer):
     """Simplified serializer for recipe lists"""
+    # Detail-only relations that lists include on ?expand=
+    expandable_fields = {
+        'diets': lambda: DietSerializer(many=True, read_only=True),
+        'ingredients': lambda: IngredientSerializer(many=True, read_only=True),
+        'instructions': lambda: InstructionSerializer(many=True, read_only=True),
+        'ratings': lambda: RatingSerializer(many=True, read_only=True),
+    }
     author = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
     cuisine = CuisineSerializer(read_only=True)
@@ -64,15 +93,9 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'image', 'calories_per_serving', 'protein', 'carbs', 'fat',
             'average_rating', 'is_favorited', 'created_at'
         ]
-    
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Favorite.objects.filter(user=request.user, recipe=obj).exists()
-        return False
 
 
-class RecipeDetailSerializer(serializers.ModelSerializer):
+class RecipeDetailSerializer(SparseFieldsMixin, RecipeAnnotationsMixin, serializers.ModelSerializer):
     """Detailed serializer for recipe detail view"""
     author = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
@@ -95,11 +118,6 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
             'ratings', 'average_rating', 'is_favorited', 'created_at', 'updated_at',
             'video_url',
         ]
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Favorite.objects.filter(user=request.user, recipe=obj).exists()
-        return False
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
@@ -162,52 +180,158 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         instructions_data = validated_data.pop('instructions')
         diet_ids = validated_data.pop('diet_ids', [])
 
-        recipe = Recipe.objects.create(**validated_data)
-
-        # Add diets
-        if diet_ids:
-            recipe.diets.set(diet_ids)
-
-        # Create ingredients
-        for ingredient_data in ingredients_data:
-            Ingredient.objects.create(recipe=recipe, **ingredient_data)
-
-        # Create instructions
-        for instruction_data in instructions_data:
-            Instruction.objects.create(recipe=recipe, **instruction_data)
+        # One transaction and one INSERT per table, however many rows are nested
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+
+            # Add diets
+            if diet_ids:
+                recipe.diets.set(diet_ids)
+
+            # Create ingredients and instructions. bulk_create skips the Ingredient
+            # signals; the Recipe save above already scheduled the search vector
+            # update for commit time, so only the autocomplete index needs a call
+            Ingredient.objects.bulk_create([
+                Ingredient(recipe=recipe, name=data['name'], quantity=data['quantity'], unit=data.get('unit', ''))
+                for data in ingredients_data
+            ])
+            Instruction.objects.bulk_create(
+                [Instruction(recipe=recipe, **instruction_data) for instruction_data in instructions_data]
+            )
+            names = [ingredient_data['name'] for ingredient_data in ingredients_data]
+            transaction.on_commit(lambda: index_ingredients(names))
 
         return recipe
 
+    def validate_instructions(self, value):
+        # A PATCH leaves required fields of nested items optional
+        if any('step_number' not in instruction for instruction in value):
+            raise serializers.ValidationError('Each step needs a step_number.')
+        steps = [instruction['step_number'] for instruction in value]
+        if len(steps) != len(set(steps)):
+            raise serializers.ValidationError('Step numbers must be unique.')
+        return value
+
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients', None)
         instructions_data = validated_data.pop('instructions', None)
         diet_ids = validated_data.pop('diet_ids', None)
 
-        # Update basic fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        # Update diets
-        if diet_ids is not None:
-            instance.diets.set(diet_ids)
+        with transaction.atomic():
+            # Update basic fields. The save also schedules the search vector
+            # refresh, which runs at commit and sees the nested changes below
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
 
-        # Update ingredients
-        if ingredients_data is not None:
-            instance.ingredients.all().delete()
-            for ingredient_data in ingredients_data:
-                Ingredient.objects.create(recipe=instance, **ingredient_data)
+            # Update diets
+            if diet_ids is not None:
+                instance.diets.set(diet_ids)
 
-        # Update instructions
-        if instructions_data is not None:
-            instance.instructions.all().delete()
-            for instruction_data in instructions_data:
-                Instruction.objects.create(recipe=instance, **instruction_data)
+            if ingredients_data is not None:
+                self._sync_ingredients(instance, ingredients_data, self.partial)
+            if instructions_data is not None:
+                self._sync_instructions(instance, instructions_data)
 
         return instance
 
-
-class FavoriteSerializer(serializers.ModelSerializer):
+    @staticmethod
+    def _sync_ingredients(recipe, ingredients_data, partial=False):
+        """
+        Make the recipe's ingredients match the submitted list, touching only
+        rows that change. Items are matched by id, or else by name to a row the
+        request did not mention; unmatched items are inserted and unmatched
+        rows deleted. In a PATCH, fields an item leaves out keep the matched
+        row's values; new rows need a name and a quantity.
+        """
+        existing = {ingredient.pk: ingredient for ingredient in recipe.ingredients.all()}
+        by_name = {}
+        for ingredient in existing.values():
+            by_name.setdefault(ingredient.name.casefold(), []).append(ingredient)
+        claimed = {data['id'] for data in ingredients_data if 'id' in data}
+        unknown = claimed - existing.keys()
+        if unknown:
+            raise serializers.ValidationError(
+                {'ingredients': f'Unknown ingredient ids for this recipe: {sorted(unknown)}'}
+            )
+
+        created, changed, renamed = [], [], []
+        for data in ingredients_data:
+            if 'id' in data:
+                ingredient = existing[data['id']]
+            else:
+                if 'name' not in data:
+                    raise serializers.ValidationError(
+                        {'ingredients': 'Ingredients without an id need a name.'}
+                    )
+                candidates = [i for i in by_name.get(data['name'].casefold(), []) if i.pk not in claimed]
+                if not candidates:
+                    if 'quantity' not in data:
+                        raise serializers.ValidationError(
+                            {'ingredients': f"New ingredient {data['name']!r} needs a quantity."}
+                        )
+                    created.append(Ingredient(
+                        recipe=recipe, name=data['name'], quantity=data['quantity'], unit=data.get('unit', ''),
+                    ))
+                    continue
+                ingredient = candidates[0]
+                claimed.add(ingredient.pk)
+            fields = {
+                'name': data.get('name', ingredient.name),
+                'quantity': data.get('quantity', ingredient.quantity),
+                'unit': data.get('unit', ingredient.unit if partial else ''),
+            }
+            if any(getattr(ingredient, field) != value for field, value in fields.items()):
+                if ingredient.name != fields['name']:
+                    renamed.append((ingredient.name, fields['name']))
+                for field, value in fields.items():
+                    setattr(ingredient, field, value)
+                changed.append(ingredient)
+
+        removed = [ingredient for pk, ingredient in existing.items() if pk not in claimed]
+        if not (removed or changed or created):
+            return
+        # One DELETE without the per-row signals (nothing references ingredients);
+        # like the bulk writes, the recipe is then invalidated and reindexed once
+        doomed = Ingredient.objects.filter(pk__in=[ingredient.pk for ingredient in removed])
+        doomed._raw_delete(doomed.db)
+        Ingredient.objects.bulk_update(changed, ['name', 'quantity', 'unit'])
+        Ingredient.objects.bulk_create(created)
+        touch_recipes([recipe.pk])
+        bump_on_commit(recipe_version(recipe.pk))
+        schedule_search_vector_update(recipe.pk)
+        unindexed = [ingredient.name for ingredient in removed] + [old for old, _ in renamed]
+        indexed = [new for _, new in renamed] + [ingredient.name for ingredient in created]
+        transaction.on_commit(lambda: (unindex_ingredients(unindexed), index_ingredients(indexed)))
+
+    @staticmethod
+    def _sync_instructions(recipe, instructions_data):
+        """
+        Make the recipe's steps match the submitted list, keyed by step_number.
+        In a PATCH, a step without text keeps its current text.
+        """
+        existing = {instruction.step_number: instruction for instruction in recipe.instructions.all()}
+        submitted = {data['step_number']: data.get('text') for data in instructions_data}
+        changed, created = [], []
+        for step_number, text in submitted.items():
+            instruction = existing.get(step_number)
+            if text is None and instruction is not None:
+                continue
+            if text is None:
+                raise serializers.ValidationError({'instructions': f'New step {step_number} needs a text.'})
+            if instruction is None:
+                created.append(Instruction(recipe=recipe, step_number=step_number, text=text))
+            elif instruction.text != text:
+                instruction.text = text
+                changed.append(instruction)
+
+        # Step numbers never move between rows, so (recipe, step_number) stays unique throughout
+        Instruction.objects.filter(recipe=recipe, step_number__in=existing.keys() - submitted.keys()).delete()
+        Instruction.objects.bulk_update(changed, ['text'])
+        Instruction.objects.bulk_create(created)
+
+
+class FavoriteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     recipe = RecipeListSerializer(read_only=True)
     
     class Meta:
@@ -215,7 +339,7 @@ class FavoriteSerializer(serializers.ModelSerializer):
         fields = ['id', 'recipe', 'created_at']
 
 
-class ShoppingListItemSerializer(serializers.ModelSerializer):
+class ShoppingListItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     recipe = RecipeListSerializer(read_only=True)
     
     class Meta:
@@ -0,0 +1,237 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .conditional import touch_recipes
+from .models import Category, Cuisine, Diet, Favorite, Ingredient, Instruction, Rating, Recipe
+from .response_cache import recipe_version
+from .search import schedule_search_vector_update
+from .suggest import ingredient_key, recipe_key, update_index
+from .versions import bump_on_commit
+
+
+@receiver(post_save, sender=Rating)
+def update_rating_stats_on_save(sender, instance, created, using, **kwargs):
+    previous = getattr(instance, '_loaded_values', None)
+    # The stats move with update(), which leaves updated_at (and Last-Modified) alone
+    touch_recipes({instance.recipe_id, previous[0] if previous else instance.recipe_id}, using)
+    if created:
+        Recipe.objects.apply_rating_delta(instance.recipe_id, 1, instance.score)
+    elif previous is None:
+        # Saved without being loaded first, so the old score is unknown
+        Recipe.objects.filter(pk=instance.recipe_id).refresh_rating_stats()
+    else:
+        old_recipe_id, old_score = previous
+        if old_recipe_id != instance.recipe_id:
+            Recipe.objects.apply_rating_delta(old_recipe_id, -1, -old_score)
+            Recipe.objects.apply_rating_delta(instance.recipe_id, 1, instance.score)
+        elif old_score != instance.score:
+            Recipe.objects.apply_rating_delta(instance.recipe_id, 0, instance.score - old_score)
+    instance._loaded_values = (instance.recipe_id, instance.score)
+
+
+@receiver(post_delete, sender=Rating)
+def update_rating_stats_on_delete(sender, instance, using, **kwargs):
+    recipe_id, score = getattr(instance, '_loaded_values', (instance.recipe_id, instance.score))
+    Recipe.objects.apply_rating_delta(recipe_id, -1, -score)
+    touch_recipes([recipe_id], using)
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_vector_on_recipe_save(sender, instance, using, **kwargs):
+    schedule_search_vector_update(instance.pk, using)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def update_search_vector_on_ingredient_change(sender, instance, using, **kwargs):
+    schedule_search_vector_update(instance.recipe_id, using)
+
+
+# Autocomplete index: popularity is 1 + ratings + favorites for recipes and
+# the number of recipes using it for ingredients. The index is process memory,
+# not part of the transaction, so changes wait for the commit.
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, created, using, **kwargs):
+    if instance.external_source:
+        return
+    key, title, rating_count = recipe_key(instance.pk), instance.title, instance.rating_count
+
+    def apply(index):
+        entry = index.entries.get(key)
+        weight = entry.weight if entry else 1 + rating_count
+        index.set(key, 'recipe', title, weight)
+    transaction.on_commit(lambda: update_index(apply), using=using)
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, using, **kwargs):
+    key = recipe_key(instance.pk)
+    transaction.on_commit(lambda: update_index(lambda index: index.remove(key)), using=using)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_save, sender=Favorite)
+def increase_recipe_popularity(sender, instance, created, using, **kwargs):
+    if created:
+        key = recipe_key(instance.recipe_id)
+        transaction.on_commit(lambda: update_index(lambda index: index.adjust(key, 1)), using=using)
+
+
+@receiver(post_delete, sender=Rating)
+@receiver(post_delete, sender=Favorite)
+def decrease_recipe_popularity(sender, instance, using, **kwargs):
+    key = recipe_key(instance.recipe_id)
+    transaction.on_commit(lambda: update_index(lambda index: index.adjust(key, -1)), using=using)
+
+
+def index_ingredients(names):
+    """Count new ingredient rows in the index; bulk inserts call this themselves"""
+    def apply(index):
+        for name in names:
+            key = ingredient_key(name)
+            entry = index.entries.get(key)
+            if entry is None:
+                index.set(key, 'ingredient', name, 1)
+            else:
+                index.adjust(key, 1)
+    update_index(apply)
+
+
+_index_paused = threading.local()
+
+
+@contextmanager
+def ingredient_index_paused():
+    """Leave the index alone for ingredient rows saved or deleted in this block (mirrored recipes)"""
+    _index_paused.active = True
+    try:
+        yield
+    finally:
+        _index_paused.active = False
+
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient(sender, instance, created, using, **kwargs):
+    if created and not getattr(_index_paused, 'active', False):
+        name = instance.name
+        transaction.on_commit(lambda: index_ingredients([name]), using=using)
+
+
+@receiver(post_delete, sender=Ingredient)
+def unindex_ingredient(sender, instance, using, **kwargs):
+    if not getattr(_index_paused, 'active', False):
+        name = instance.name
+        transaction.on_commit(lambda: unindex_ingredients([name]), using=using)
+
+
+def unindex_ingredients(names):
+    """Uncount ingredient rows that were removed or renamed without signals"""
+    def apply(index):
+        for name in names:
+            key = ingredient_key(name)
+            entry = index.entries.get(key)
+            if entry is not None and entry.weight <= 1:
+                index.remove(key)
+            else:
+                index.adjust(key, -1)
+    update_index(apply)
+
+
+# Home feed: anything shown in a recipe list card invalidates the stored feed
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Cuisine)
+@receiver(post_delete, sender=Cuisine)
+def invalidate_home_feed(sender, instance, using, **kwargs):
+    if sender is Recipe and instance.external_source:
+        return
+    bump_on_commit('recipes', using)
+
+
+# Response cache: a recipe's detail response is keyed by its own counter and
+# by 'taxonomy' for the category, cuisine and diet names it shows
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_response(sender, instance, using, **kwargs):
+    if instance.external_source:
+        return
+    bump_on_commit(recipe_version(instance.pk), using)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Instruction)
+@receiver(post_delete, sender=Instruction)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def invalidate_parent_recipe_response(sender, instance, using, **kwargs):
+    bump_on_commit(recipe_version(instance.recipe_id), using)
+
+
+@receiver(m2m_changed, sender=Recipe.diets.through)
+def invalidate_recipe_diets_response(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if not action.startswith('post_'):
+        return
+    # Also changes which recipes the diets filter lists
+    bump_on_commit('recipes', using)
+    if not reverse:
+        bump_on_commit(recipe_version(instance.pk), using)
+    elif pk_set:
+        for pk in pk_set:
+            bump_on_commit(recipe_version(pk), using)
+    else:
+        # diet.recipe_set.clear(): the cleared recipes are no longer known
+        bump_on_commit('taxonomy', using)
+
+
+# Also reloads the per-process taxonomy snapshot (recipes.taxonomy)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Cuisine)
+@receiver(post_delete, sender=Cuisine)
+@receiver(post_save, sender=Diet)
+@receiver(post_delete, sender=Diet)
+def invalidate_taxonomy_responses(sender, instance, using, **kwargs):
+    bump_on_commit('taxonomy', using)
+
+
+# Conditional GETs: validators read the recipe row, so changes to the rows
+# shown with it move its updated_at (recipes.conditional)
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Instruction)
+@receiver(post_delete, sender=Instruction)
+def touch_parent_recipe(sender, instance, using, **kwargs):
+    touch_recipes([instance.recipe_id], using)
+
+
+@receiver(m2m_changed, sender=Recipe.diets.through)
+def touch_recipes_on_diets_change(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            touch_recipes([instance.pk], using)
+    elif action == 'pre_clear':
+        # diet.recipe_set.clear(): read the recipes while they are still linked
+        touch_recipes(instance.recipe_set.using(using).values_list('pk', flat=True), using)
+    elif action.startswith('post_') and pk_set:
+        touch_recipes(pk_set, using)
+
+
+@receiver(post_save, sender=Diet)
+@receiver(pre_delete, sender=Diet)
+def touch_recipes_on_diet_change(sender, instance, using, created=False, **kwargs):
+    # Diet names are shown on recipe detail; deleting a diet drops its links without m2m_changed
+    if not created:
+        touch_recipes(instance.recipe_set.using(using).values_list('pk', flat=True), using)
@@ -0,0 +1,115 @@
+"""
+Request coalescing for expensive calls.
+
+SingleFlight.do(key, fn) runs fn once for all concurrent callers that use the
+same key: the first caller (the leader) runs it and everyone who arrives
+while it is in flight waits for and shares its result or exception.
+
+With a cache alias the coalescing also spans processes: the leader of each
+process first takes a lock with cache.add() in that Django cache and
+publishes its result there, so leaders of other processes wait for it
+instead of calling the upstream themselves. A waiter that sees the lock
+released without a result (the leader failed) takes the lock itself, and
+whoever takes it reads the result again first, so a result published just
+before the release is shared too: a result stays shared for lock_timeout
+seconds. This needs a cache shared by all workers (Redis, Memcached,
+database); with the default local-memory cache it only coalesces within
+one process.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name='singleflight', cache_alias=None, lock_timeout=10.0, poll_interval=0.05):
+        self.name = name
+        self.cache_alias = cache_alias
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = self._run(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run(self, key, fn):
+        if self.cache_alias is None:
+            return fn()
+        shared = caches[self.cache_alias]
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        lock_key = f'{self.name}:lock:{digest}'
+        result_key = f'{self.name}:result:{digest}'
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            if shared.add(lock_key, 1, self.lock_timeout):
+                try:
+                    # A leader may have published and released since we last looked
+                    published = shared.get(result_key)
+                    if published is not None:
+                        self._count_coalesced()
+                        return published[0]
+                    value = fn()
+                    # Wrapped so that a None result can be told apart from a miss
+                    shared.set(result_key, (value,), self.lock_timeout)
+                    return value
+                finally:
+                    shared.delete(lock_key)
+            # Another process is fetching: wait for its result, or for the lock
+            # to be released without one (it failed) and try to take it
+            while time.monotonic() < deadline:
+                published = shared.get(result_key)
+                if published is not None:
+                    self._count_coalesced()
+                    return published[0]
+                if shared.get(lock_key) is None:
+                    break
+                time.sleep(self.poll_interval)
+        logger.info('%s: no shared result for %r, fetching directly', self.name, key)
+        return fn()
+
+    def _count_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+
+    def stats(self):
+        with self._lock:
+            return {'leaders': self.leaders, 'coalesced': self.coalesced}
@@ -0,0 +1,182 @@
+"""
+Spoonacular API calls used by the recipe views.
+
+Requests go through the pooled, retrying client in recipes.spoonacular_client
+after their points are taken from the shared budget in recipes.quota.
+
+Responses are kept in a bounded in-process TTLCache keyed by the normalized
+request parameters, with one TTL per endpoint (SPOONACULAR_CACHE_TTLS),
+stale-while-revalidate, and negative caching of 404s. Concurrent misses for
+the same request share one upstream call; setting SPOONACULAR_SINGLEFLIGHT_CACHE
+to a shared Django cache alias extends that across worker processes.
+
+Views start a call with fetch_in_background() before running their own
+queries and collect it with wait_for(), which gives up once
+SPOONACULAR_DEADLINE seconds have passed since the request started.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+
+from . import quota
+from .cache import TTLCache
+from .singleflight import SingleFlight
+from .spoonacular_client import SpoonacularError, get_client  # noqa: F401 (re-exported)
+
+logger = logging.getLogger(__name__)
+
+# Seconds an entry is fresh, and how long after that it may still be served stale
+DEFAULT_CACHE_TTLS = {
+    'search': (600, 3600),
+    'random': (300, 900),
+    'information': (86400, 604800),
+}
+DEFAULT_NEGATIVE_TTL = 3600
+
+cache = TTLCache(
+    maxsize=getattr(settings, 'SPOONACULAR_CACHE_SIZE', 1024),
+    name='spoonacular',
+    flight=SingleFlight(
+        name='spoonacular',
+        cache_alias=getattr(settings, 'SPOONACULAR_SINGLEFLIGHT_CACHE', None),
+        lock_timeout=getattr(settings, 'SPOONACULAR_TIMEOUT', 5) * 2,
+    ),
+)
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'SPOONACULAR_WORKERS', 8), thread_name_prefix='spoonacular'
+)
+
+
+def _ttls(endpoint):
+    ttls = {**DEFAULT_CACHE_TTLS, **getattr(settings, 'SPOONACULAR_CACHE_TTLS', {})}
+    return ttls[endpoint]
+
+
+def _cached(endpoint, key, fetch):
+    ttl, stale_ttl = _ttls(endpoint)
+    negative_ttl = getattr(settings, 'SPOONACULAR_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL)
+    return cache.get_or_fetch((endpoint,) + key, fetch, ttl, stale_ttl, negative_ttl)
+
+
+def _get(path, params, priority=None):
+    """GET a Spoonacular endpoint: JSON on 200, None on 404, SpoonacularError otherwise"""
+    quota.acquire(path, params, priority)
+    return get_client().get_json(path, params)
+
+
+def normalize_query(query):
+    return ' '.join(query.casefold().split())
+
+
+def summarize(r):
+    """Shape used when Spoonacular recipes are listed next to local ones"""
+    return {
+        'id': f"spoonacular_{r.get('id')}",
+        'title': r.get('title'),
+        'image': r.get('image'),
+        'ingredients': [i['original'] for i in r.get('extendedIngredients') or []],
+        'instructions': r.get('instructions'),
+        'source': 'spoonacular',
+    }
+
+
+def detail(r):
+    """Shape returned by the Spoonacular recipe detail endpoint"""
+    nutrition = {}
+    if 'nutrition' in r and 'nutrients' in r['nutrition']:
+        for n in r['nutrition']['nutrients']:
+            # Common nutrients: Calories, Protein, Fat, Carbohydrates
+            if n['name'] in ['Calories', 'Protein', 'Fat', 'Carbohydrates']:
+                nutrition[n['name'].lower()] = {
+                    'amount': n['amount'],
+                    'unit': n['unit']
+                }
+    return {
+        **summarize(r),
+        'summary': r.get('summary'),
+        'readyInMinutes': r.get('readyInMinutes'),
+        'servings': r.get('servings'),
+        'sourceUrl': r.get('sourceUrl'),
+        'nutrition': nutrition,
+    }
+
+
+def search_recipes(query, number=5):
+    query = normalize_query(query)
+
+    def fetch():
+        data = _get('/recipes/complexSearch', {
+            'query': query,
+            'number': number,
+            'addRecipeInformation': True,
+        })
+        return [summarize(r) for r in (data or {}).get('results', [])]
+
+    return _cached('search', (query, number), fetch)
+
+
+def random_recipes(number=5):
+    def fetch():
+        data = _get('/recipes/random', {'number': number})
+        return [summarize(r) for r in (data or {}).get('recipes', [])]
+
+    return _cached('random', (number,), fetch)
+
+
+def recipe_information(spoonacular_id):
+    """Detail dict for one recipe, or None if Spoonacular does not know the id"""
+    def fetch():
+        data = _get(f'/recipes/{spoonacular_id}/information', {'includeNutrition': False})
+        return detail(data) if data is not None else None
+
+    return _cached('information', (int(spoonacular_id),), fetch)
+
+
+# Uncached, low-priority calls used by the mirror sync (recipes.mirror), which
+# stores the results itself
+
+def search_ids(query, number=100, offset=0):
+    data = _get('/recipes/complexSearch', {
+        'query': normalize_query(query),
+        'number': number,
+        'offset': offset,
+    }, priority='low')
+    return [r['id'] for r in (data or {}).get('results', [])]
+
+
+def random_information(number=100):
+    data = _get('/recipes/random', {'number': number}, priority='low')
+    return (data or {}).get('recipes', [])
+
+
+def information_bulk(ids):
+    """Full information for many recipes in a single call"""
+    if not ids:
+        return []
+    return _get('/recipes/informationBulk', {'ids': ','.join(str(i) for i in ids)}, priority='low') or []
+
+
+def fetch_in_background(fn, *args):
+    """Run a Spoonacular call on the shared worker pool and return its future"""
+    return _executor.submit(fn, *args)
+
+
+def wait_for(future, started_at):
+    """
+    Return (results, partial) for a future from fetch_in_background().
+
+    partial is True when the call failed or did not finish within
+    SPOONACULAR_DEADLINE seconds of started_at; a late call keeps running
+    and still fills the cache for the next request.
+    """
+    deadline = getattr(settings, 'SPOONACULAR_DEADLINE', 1.5)
+    try:
+        return future.result(timeout=max(started_at + deadline - time.monotonic(), 0)), False
+    except FutureTimeout:
+        logger.info('Spoonacular call missed the %.2fs deadline', deadline)
+    except Exception as e:
+        logger.warning('Spoonacular error: %s', e)
+    return [], True
@@ -0,0 +1,168 @@
+"""
+Shared HTTP client for the Spoonacular API.
+
+One requests.Session per process keeps TCP/TLS connections alive in a
+bounded pool. Every call has a timeout, idempotent GETs are retried with
+exponential backoff on connection errors, 5xx and 429 responses (honouring
+Retry-After), and a circuit breaker fails fast for
+SPOONACULAR_BREAKER_COOLDOWN seconds after SPOONACULAR_BREAKER_THRESHOLD
+consecutive failures. SPOONACULAR_BASE_URL
+can point the client at a local stub server.
+"""
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = 'https://api.spoonacular.com'
+
+
+class SpoonacularError(Exception):
+    def __init__(self, status_code, message=''):
+        super().__init__(message or f'Spoonacular returned HTTP {status_code}')
+        self.status_code = status_code
+
+
+class CircuitOpenError(SpoonacularError):
+    def __init__(self, retry_in):
+        super().__init__(503, f'Spoonacular circuit is open, retrying in {retry_in:.0f}s')
+
+
+class CircuitBreaker:
+    """
+    Closed: calls pass through and consecutive failures are counted.
+    Open: calls fail immediately until the cooldown has passed.
+    Half-open: one trial call is let through; success closes the circuit,
+    failure opens it again for another cooldown.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half-open'
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return
+            remaining = max(self.cooldown - (time.monotonic() - (self.opened_at or 0)), 0)
+            raise CircuitOpenError(remaining)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning('Spoonacular circuit opened after %d failures', self.failures)
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class SpoonacularClient:
+    def __init__(self, api_key=None, base_url=DEFAULT_BASE_URL, timeout=5.0, retries=2,
+                 backoff=0.3, pool_size=8, breaker=None, on_response=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        # Called with every response, e.g. to read quota headers
+        self.on_response = on_response
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get_json(self, path, params=None):
+        """GET path: parsed JSON on 200, None on 404, SpoonacularError otherwise"""
+        self.breaker.before_call()
+        try:
+            response = self.session.get(
+                f'{self.base_url}{path}',
+                params={**(params or {}), 'apiKey': self.api_key},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise SpoonacularError(502, f'Spoonacular request failed: {e}') from e
+        logger.debug('Spoonacular %s status: %s', path, response.status_code)
+        if self.on_response is not None:
+            self.on_response(response)
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure()
+            raise SpoonacularError(response.status_code)
+        self.breaker.record_success()
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 404:
+            return None
+        raise SpoonacularError(response.status_code)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide client, configured from settings on first use"""
+    global _client
+    if _client is None:
+        from .quota import observe
+        with _client_lock:
+            if _client is None:
+                _client = SpoonacularClient(
+                    api_key=getattr(settings, 'SPOONACULAR_API_KEY', None),
+                    base_url=getattr(settings, 'SPOONACULAR_BASE_URL', DEFAULT_BASE_URL),
+                    timeout=getattr(settings, 'SPOONACULAR_TIMEOUT', 5),
+                    retries=getattr(settings, 'SPOONACULAR_RETRIES', 2),
+                    pool_size=getattr(settings, 'SPOONACULAR_WORKERS', 8),
+                    breaker=CircuitBreaker(
+                        threshold=getattr(settings, 'SPOONACULAR_BREAKER_THRESHOLD', 5),
+                        cooldown=getattr(settings, 'SPOONACULAR_BREAKER_COOLDOWN', 30),
+                    ),
+                    on_response=observe,
+                )
+    return _client
+
+
+def reset_client():
+    """Drop the shared client so the next call picks up changed settings"""
+    global _client
+    with _client_lock:
+        _client = None
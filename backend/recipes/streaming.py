@@ -0,0 +1,63 @@
+"""
+Streaming JSON for recipe lists requested in full (?stream=1).
+
+The queryset is read with iterator(), so rows are fetched in chunks (a
+server-side cursor on PostgreSQL) and each one is serialized and written out
+before the next chunk is loaded. Memory stays flat however large the
+catalog is. Spoonacular items are appended after the local rows, so the
+external call has the whole stream to finish.
+"""
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import spoonacular
+from .serializers import RecipeListSerializer
+
+CHUNK_SIZE = 500
+# Rows joined into a single write
+ROWS_PER_WRITE = 100
+
+
+def wants_stream(request):
+    return request.query_params.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def stream_recipes(request, queryset, results_key='results', external=(), future=None, started_at=None,
+                   serializer=None):
+    """
+    Stream {results_key: [...], "partial": bool} for every recipe in queryset.
+
+    external items are appended as they are; a future from
+    spoonacular.fetch_in_background() is collected with wait_for() once the
+    local rows have been written. serializer (a RecipeListSerializer by
+    default) turns each recipe into a dict.
+    """
+    if serializer is None:
+        serializer = RecipeListSerializer(context={'request': request})
+    return StreamingHttpResponse(
+        _generate(serializer, queryset, results_key, external, future, started_at),
+        content_type='application/json',
+    )
+
+
+def _generate(serializer, queryset, results_key, external, future, started_at):
+    # Same output as DRF's JSONRenderer defaults
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    yield '{' + encoder.encode(results_key) + ':['
+    first = True
+    rows = []
+    for recipe in queryset.iterator(chunk_size=CHUNK_SIZE):
+        rows.append(encoder.encode(serializer.to_representation(recipe)))
+        if len(rows) == ROWS_PER_WRITE:
+            yield ('' if first else ',') + ','.join(rows)
+            first, rows = False, []
+
+    partial = False
+    external = list(external)
+    if future is not None:
+        fetched, partial = spoonacular.wait_for(future, started_at)
+        external.extend(fetched)
+    rows.extend(encoder.encode(item) for item in external)
+    if rows:
+        yield ('' if first else ',') + ','.join(rows)
+    yield '],"partial":' + encoder.encode(partial) + '}'
@@ -0,0 +1,228 @@
+"""
+In-memory prefix index for the search box autocomplete.
+
+The index is a trie over recipe titles (every word start, so "cur" finds
+"Chicken curry") and distinct ingredient names. Every node caches its best
+MAX_RESULTS entries by popularity, so a lookup is a walk down the trie and a
+slice, with no database access. Signals keep the index of the current
+process up to date as their transactions commit; a full rebuild runs in the
+background once the index is older than SUGGEST_INDEX_MAX_AGE seconds to pick
+up changes made by other workers.
+"""
+import re
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count, Min
+from django.db.models.functions import Lower
+
+MAX_RESULTS = 20
+# Deeper prefixes are answered by filtering the entries stored at this depth
+MAX_DEPTH = 24
+
+Entry = namedtuple('Entry', ['key', 'kind', 'label', 'weight', 'phrases'])
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def _phrases(kind, text):
+    text = normalize(text)
+    if kind == 'ingredient':
+        return {text} if text else set()
+    # Index the title from every word start
+    return {text[match.start():] for match in re.finditer(r'\b\w', text)}
+
+
+def _rank(entry):
+    return (-entry.weight, entry.label)
+
+
+class _Node:
+    __slots__ = ('children', 'top', 'terminal')
+
+    def __init__(self):
+        self.children = {}
+        self.top = []
+        # Entries whose phrase ends at this node (or passes MAX_DEPTH here)
+        self.terminal = set()
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.root = _Node()
+        self.entries = {}
+        self.lock = threading.RLock()
+        self.built_at = time.monotonic()
+
+    def set(self, key, kind, label, weight):
+        """Insert an entry or replace its label/weight"""
+        with self.lock:
+            old = self.entries.get(key)
+            entry = Entry(key, kind, label, weight, _phrases(kind, label))
+            if old is not None:
+                self._remove(old, keep=entry.phrases if entry.weight >= old.weight else None)
+            self.entries[key] = entry
+            for phrase in entry.phrases:
+                for node in self._path(phrase, create=True):
+                    self._offer(node, entry)
+                self._path(phrase)[-1].terminal.add(key)
+
+    def adjust(self, key, delta):
+        """Change the popularity of an existing entry"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.set(key, entry.kind, entry.label, max(entry.weight + delta, 0))
+
+    def remove(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self._remove(entry)
+
+    def search(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_RESULTS)
+        with self.lock:
+            node = self.root
+            for char in prefix[:MAX_DEPTH]:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            if len(prefix) <= MAX_DEPTH:
+                return node.top[:limit]
+            matches = [
+                self.entries[key] for key in node.terminal
+                if any(phrase.startswith(prefix) for phrase in self.entries[key].phrases)
+            ]
+            return sorted(matches, key=_rank)[:limit]
+
+    def _path(self, phrase, create=False):
+        node = self.root
+        nodes = [node]
+        for char in phrase[:MAX_DEPTH]:
+            child = node.children.get(char)
+            if child is None:
+                if not create:
+                    break
+                child = node.children[char] = _Node()
+            node = child
+            nodes.append(node)
+        return nodes
+
+    def _offer(self, node, entry):
+        top = [item for item in node.top if item.key != entry.key]
+        top.append(entry)
+        top.sort(key=_rank)
+        node.top = top[:MAX_RESULTS]
+
+    def _remove(self, entry, keep=None):
+        # When the entry only gains weight on the same phrases, set() will
+        # re-offer it everywhere and no node needs rebuilding
+        if keep is not None and keep == entry.phrases:
+            return
+        for phrase in entry.phrases:
+            nodes = self._path(phrase)
+            nodes[-1].terminal.discard(entry.key)
+            # Rebuild cached tops bottom-up from the children's tops
+            for node in reversed(nodes):
+                if all(item.key != entry.key for item in node.top):
+                    continue
+                candidates = [self.entries[key] for key in node.terminal if key != entry.key]
+                for child in node.children.values():
+                    candidates.extend(item for item in child.top if item.key != entry.key)
+                unique = {item.key: item for item in candidates}
+                node.top = sorted(unique.values(), key=_rank)[:MAX_RESULTS]
+        self._prune(entry)
+
+    def _prune(self, entry):
+        for phrase in entry.phrases:
+            nodes = self._path(phrase)
+            chars = phrase[:len(nodes) - 1]
+            for depth in range(len(nodes) - 1, 0, -1):
+                node = nodes[depth]
+                if node.children or node.terminal:
+                    break
+                del nodes[depth - 1].children[chars[depth - 1]]
+
+
+def recipe_key(recipe_id):
+    return ('recipe', recipe_id)
+
+
+def ingredient_key(name):
+    return ('ingredient', normalize(name))
+
+
+def build_index():
+    """Build a fresh index from the database (two aggregate queries)"""
+    from .models import Ingredient, Recipe
+
+    index = PrefixIndex()
+    recipes = Recipe.objects.local().order_by().values('id', 'title', 'rating_count').annotate(
+        favorites=Count('favorite')
+    )
+    for row in recipes.iterator():
+        index.set(recipe_key(row['id']), 'recipe', row['title'],
+                  1 + row['rating_count'] + row['favorites'])
+    # Lower() only narrows the rows; names that differ in case folding or
+    # spacing still share an ingredient_key and are summed here
+    ingredients = (
+        Ingredient.objects.filter(recipe__external_source='')
+        .annotate(lowered=Lower('name'))
+        .values('lowered')
+        .annotate(name=Min('name'), uses=Count('id'))
+        .order_by()
+    )
+    grouped = {}
+    for row in ingredients.iterator():
+        key = ingredient_key(row['name'])
+        name, uses = grouped.get(key, (row['name'], 0))
+        grouped[key] = (min(name, row['name']), uses + row['uses'])
+    for key, (name, uses) in grouped.items():
+        index.set(key, 'ingredient', name, uses)
+    return index
+
+
+_index = None
+_rebuild_lock = threading.Lock()
+
+
+def get_index():
+    """Return the process-wide index, building it on first use"""
+    global _index
+    if _index is None:
+        with _rebuild_lock:
+            if _index is None:
+                _index = build_index()
+    elif time.monotonic() - _index.built_at > getattr(settings, 'SUGGEST_INDEX_MAX_AGE', 300):
+        _refresh_in_background()
+    return _index
+
+
+def _refresh_in_background():
+    if not _rebuild_lock.acquire(blocking=False):
+        return
+
+    def rebuild():
+        global _index
+        from django.db import connection
+        try:
+            _index = build_index()
+        finally:
+            connection.close()
+            _rebuild_lock.release()
+
+    threading.Thread(target=rebuild, name='suggest-index-rebuild', daemon=True).start()
+
+
+def update_index(callback):
+    """Apply an incremental change if this process has already built its index"""
+    if _index is not None:
+        callback(_index)
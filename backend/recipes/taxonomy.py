@@ -0,0 +1,116 @@
+"""
+Per-process cache of the categories, cuisines and diets.
+
+The three tables are small and change rarely, yet the recipe form, the
+filter sidebar and every filtered recipe list read them. get_taxonomy()
+keeps one snapshot of all three per process, tagged with the 'taxonomy'
+version (recipes.versions) that signals bump when a row is saved or
+deleted. Each call compares the tag with the current version, one lookup
+in the default cache, and reloads the tables only when they changed.
+
+The snapshot holds the serialized rows and their ETag for /api/taxonomy/,
+and the model instances by id, which RecipeFilter validates its choices
+against instead of querying each table.
+"""
+import threading
+from collections import namedtuple
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django_filters import rest_framework as django_filters
+
+from . import conditional, versions
+from .serializers import CategorySerializer, CuisineSerializer, DietSerializer
+
+VERSION_NAME = 'taxonomy'
+SERIALIZERS = {'categories': CategorySerializer, 'cuisines': CuisineSerializer, 'diets': DietSerializer}
+
+# data: {kind: [serialized rows]}; rows: {kind: {id: instance}}; etag: of data,
+# so it is the same in every process
+Taxonomy = namedtuple('Taxonomy', ['version', 'data', 'rows', 'etag'])
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def build_taxonomy(version):
+    data, rows = {}, {}
+    for kind, serializer_class in SERIALIZERS.items():
+        instances = list(serializer_class.Meta.model.objects.all())
+        rows[kind] = {instance.pk: instance for instance in instances}
+        data[kind] = [dict(item) for item in serializer_class(instances, many=True).data]
+    return Taxonomy(version, data, rows, conditional.make_etag('taxonomy', data))
+
+
+def get_taxonomy():
+    """The process-wide snapshot, reloaded when the taxonomy version has moved"""
+    global _snapshot
+    version = versions.get_version(VERSION_NAME)
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        with _lock:
+            snapshot = _snapshot
+            if snapshot is None or snapshot.version != version:
+                # Read the version before the rows: a change committed in
+                # between costs one extra reload, never a stale snapshot
+                snapshot = _snapshot = build_taxonomy(version)
+    return snapshot
+
+
+class TaxonomyChoiceField(forms.Field):
+    """ModelChoiceField over one taxonomy table, checked against the snapshot"""
+    default_error_messages = {
+        'invalid_choice': 'Select a valid choice. That choice is not one of the available choices.',
+    }
+
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        super().__init__(**kwargs)
+
+    def lookup(self, value):
+        try:
+            return get_taxonomy().rows[self.kind][int(value)]
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        instance = self.lookup(value)
+        if instance is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return instance
+
+
+class TaxonomyMultipleChoiceField(TaxonomyChoiceField):
+    """ModelMultipleChoiceField over one taxonomy table, checked against the snapshot"""
+    widget = forms.SelectMultiple
+    default_error_messages = {
+        'list': 'Enter a list of values.',
+        'invalid_choice': 'Select a valid choice. %(value)s is not one of the available choices.',
+    }
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return []
+        if not isinstance(value, (list, tuple)):
+            raise ValidationError(self.error_messages['list'], code='list')
+        instances = []
+        for item in value:
+            instance = self.lookup(item)
+            if instance is None:
+                raise ValidationError(
+                    self.error_messages['invalid_choice'], code='invalid_choice', params={'value': item},
+                )
+            instances.append(instance)
+        return instances
+
+
+class TaxonomyFilter(django_filters.Filter):
+    """ModelChoiceFilter whose choices come from the snapshot; pass kind='categories' etc."""
+    field_class = TaxonomyChoiceField
+
+
+class TaxonomyMultipleFilter(django_filters.MultipleChoiceFilter):
+    """ModelMultipleChoiceFilter whose choices come from the snapshot"""
+    field_class = TaxonomyMultipleChoiceField
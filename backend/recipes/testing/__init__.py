@@ -0,0 +1,7 @@
+"""
+Test and benchmark tooling: query budgets and the endpoint benchmarks.
+
+These modules use Django's and DRF's test utilities, so only tests and the
+benchmark management commands import this package; nothing the web app
+serves does.
+"""
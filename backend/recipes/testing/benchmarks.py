@@ -0,0 +1,320 @@
+"""
+Endpoint benchmarks with a stored baseline.
+
+Each Scenario is one request against the URL conf, made with DRF's test
+client against whatever database is configured (SQLite or a local Postgres,
+usually filled with generate_dataset). run() times every scenario over a
+number of iterations and reports p50/p95 latency, the number of queries and
+the memory allocated by one request (tracemalloc, measured in a separate pass
+so it does not slow the timed runs). Spoonacular is replaced by canned
+responses, so results only depend on this code and the database.
+
+Everything runs in one transaction that is rolled back: the benchmark user,
+their favorites and shopping list, and anything the write endpoints create.
+
+Requests bypass the anonymous response cache and the stored home feed, so
+every scenario measures the work behind the response; inside the
+transaction the on-commit invalidations would never fire anyway. The
+taxonomy scenario reloads the per-process snapshot each time. Scenarios
+marked cached=True measure the cached path instead, starting from a stored
+entry.
+
+compare() checks results against a baseline from an earlier run. More
+queries than the baseline (or than the endpoint's query_budget) is always a
+regression; latency and memory are allowed a relative tolerance, plus a
+small absolute floor so sub-millisecond noise does not fail a run.
+
+list_serialization() is a microbenchmark of RecipeListSerializer against the
+recipes.fastlist row builder and renderer, in rows per second.
+"""
+import json
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .. import feed, response_cache, spoonacular, taxonomy
+from ..models import Category, Favorite, Recipe, ShoppingListItem
+from .query_budget import ENDPOINT_BUDGETS
+
+BENCH_USERNAME = '__benchmark__'
+BENCH_PASSWORD = 'benchmark-password'
+# Absolute slack on top of the relative tolerances
+LATENCY_FLOOR_MS = 2.0
+MEMORY_FLOOR_KB = 64
+
+
+@dataclass
+class Scenario:
+    name: str
+    url_name: str
+    args: tuple = ()
+    params: dict = field(default_factory=dict)
+    method: str = 'get'
+    # Request body for iteration i
+    data: Optional[Callable[[int], dict]] = None
+    authenticated: bool = True
+    expected_status: int = 200
+    # Serve from the response cache and the stored home feed
+    cached: bool = False
+    # Called before each request, e.g. to drop a per-process cache
+    reset: Optional[Callable[[], None]] = None
+
+    def path(self):
+        return reverse(self.url_name, args=self.args)
+
+
+def _stub_recipe(spoonacular_id):
+    return {
+        'id': spoonacular_id,
+        'title': f'Stub recipe {spoonacular_id}',
+        'image': f'https://img.spoonacular.com/recipes/{spoonacular_id}-556x370.jpg',
+        'extendedIngredients': [{'original': '1 cup rice'}, {'original': '2 eggs'}],
+        'instructions': 'Cook the rice. Fry the eggs.',
+        'summary': 'A stub.',
+        'readyInMinutes': 20,
+        'servings': 2,
+        'sourceUrl': 'https://example.com/stub',
+    }
+
+
+def _stub_get(path, params, priority=None):
+    number = int(params.get('number', 5))
+    if path == '/recipes/complexSearch':
+        return {'results': [_stub_recipe(1000 + i) for i in range(number)]}
+    if path == '/recipes/random':
+        return {'recipes': [_stub_recipe(2000 + i) for i in range(number)]}
+    if path == '/recipes/informationBulk':
+        return [_stub_recipe(int(i)) for i in params['ids'].split(',')]
+    if path.endswith('/information'):
+        return _stub_recipe(int(path.split('/')[2]))
+    return None
+
+
+@contextmanager
+def stub_spoonacular():
+    """Answer Spoonacular calls with canned data, starting from an empty response cache"""
+    spoonacular.cache.clear()
+    with mock.patch.object(spoonacular, '_get', _stub_get):
+        yield
+    spoonacular.cache.clear()
+
+
+def _drop_taxonomy_snapshot():
+    taxonomy._snapshot = None
+
+
+@contextmanager
+def _uncached():
+    """Build the response without the response cache or the stored home feed"""
+    with mock.patch.object(response_cache, 'cacheable', lambda request: False), \
+            mock.patch.object(feed, 'get_home_feed', feed.build_home_feed):
+        yield
+
+
+def _prepare_user():
+    """A user with a typical number of favorites and shopping list items"""
+    user = get_user_model().objects.create_user(BENCH_USERNAME, password=BENCH_PASSWORD)
+    recipes = list(Recipe.objects.local().order_by('-rating_count').values_list('id', flat=True)[:40])
+    Favorite.objects.bulk_create([Favorite(user=user, recipe_id=recipe_id) for recipe_id in recipes[:25]])
+    ShoppingListItem.objects.bulk_create([
+        ShoppingListItem(user=user, recipe_id=recipe_id, ingredient_name=f'Item {i}', quantity='1')
+        for i, recipe_id in enumerate(recipes)
+    ])
+    return user
+
+
+def default_scenarios():
+    """The read paths of the recipe and auth APIs, plus login/register/logout"""
+    recipe = Recipe.objects.local().order_by('-rating_count').first()
+    category = Category.objects.order_by('id').first()
+    if recipe is None or category is None:
+        raise RuntimeError('The database has no recipes; run generate_dataset first')
+    return [
+        Scenario('recipes', 'recipe-list', authenticated=False),
+        Scenario('recipes (cached)', 'recipe-list', authenticated=False, cached=True),
+        Scenario('recipes (signed in)', 'recipe-list'),
+        Scenario('recipes ?category', 'recipe-list', params={'category': category.pk}),
+        Scenario('recipes ?filters', 'recipe-list',
+                 params={'difficulty': 'easy', 'prep_time_max': 30, 'rating_min': 3}),
+        Scenario('recipes ?search', 'recipe-list', params={'search': 'chicken'}),
+        Scenario('recipes ?ordering', 'recipe-list', params={'ordering': '-rating_avg'}),
+        Scenario('recipe detail', 'recipe-detail', args=(recipe.pk,)),
+        Scenario('recipe detail (cached)', 'recipe-detail', args=(recipe.pk,), authenticated=False, cached=True),
+        Scenario('merged (home feed)', 'merged_recipes', authenticated=False),
+        Scenario('merged (feed cached)', 'merged_recipes', authenticated=False, cached=True),
+        Scenario('merged ?ordering', 'merged_recipes', params={'ordering': '-rating_count'}),
+        Scenario('taxonomy', 'taxonomy', authenticated=False, reset=_drop_taxonomy_snapshot),
+        Scenario('taxonomy (snapshot)', 'taxonomy', authenticated=False, cached=True),
+        Scenario('favorites', 'favorite-list'),
+        Scenario('shopping list', 'shoppinglist-list'),
+        Scenario('profile', 'profile'),
+        Scenario('login', 'login', method='post', authenticated=False,
+                 data=lambda i: {'username': BENCH_USERNAME, 'password': BENCH_PASSWORD}),
+        Scenario('register', 'register', method='post', authenticated=False, expected_status=201,
+                 data=lambda i: {'username': f'{BENCH_USERNAME}{i}', 'password': BENCH_PASSWORD}),
+        Scenario('logout', 'logout', method='post'),
+    ]
+
+
+class _Runner:
+    def __init__(self, user):
+        self.user = user
+        # Test client requests come from "testserver", which ALLOWED_HOSTS does not list
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.counter = 0
+
+    def request(self, scenario, queries=None):
+        """Send one request and return its duration; queries (a list) collects its SQL"""
+        self.counter += 1
+        extra = {}
+        if scenario.authenticated:
+            # logout deletes the token, so look it up again for every request
+            token, _ = Token.objects.get_or_create(user=self.user)
+            extra['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        data = scenario.data(self.counter) if scenario.data else scenario.params
+        send = getattr(self.client, scenario.method)
+        if scenario.reset:
+            scenario.reset()
+        with nullcontext() if scenario.cached else _uncached(), \
+                CaptureQueriesContext(connection) if queries is not None else nullcontext() as captured:
+            started = time.perf_counter()
+            response = send(scenario.path(), data, format='json' if scenario.method != 'get' else None, **extra)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        if captured is not None:
+            queries.extend(captured.captured_queries)
+        if response.status_code != scenario.expected_status:
+            raise RuntimeError(f'{scenario.name}: HTTP {response.status_code}, expected {scenario.expected_status}')
+        return elapsed
+
+    def measure(self, scenario, iterations, warmup):
+        for _ in range(warmup):
+            self.request(scenario)
+        queries = []
+        self.request(scenario, queries)
+        timings = [self.request(scenario) for _ in range(iterations)]
+        tracemalloc.start()
+        try:
+            self.request(scenario)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        timings.sort()
+        return {
+            'p50_ms': round(statistics.median(timings) * 1000, 2),
+            'p95_ms': round(timings[min(int(len(timings) * 0.95), len(timings) - 1)] * 1000, 2),
+            'queries': len(queries),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+
+def run(scenarios=None, iterations=30, warmup=3, log=None):
+    """Benchmark the scenarios and return {scenario name: measurements}"""
+    results = {}
+    with stub_spoonacular(), transaction.atomic():
+        user = _prepare_user()
+        runner = _Runner(user)
+        for scenario in scenarios or default_scenarios():
+            results[scenario.name] = {'url_name': scenario.url_name,
+                                      **runner.measure(scenario, iterations, warmup)}
+            if log:
+                log(scenario.name, results[scenario.name])
+        transaction.set_rollback(True)
+    return results
+
+
+def compare(results, baseline, latency_tolerance=0.25, memory_tolerance=0.25):
+    """List of regressions of results against a baseline from an earlier run()"""
+    regressions = []
+    for name, result in results.items():
+        budget = ENDPOINT_BUDGETS.get(result['url_name'])
+        if budget is not None and result['queries'] > budget:
+            regressions.append(f'{name}: {result["queries"]} queries, query budget is {budget}')
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            regressions.append(f'{name}: {result["queries"]} queries, baseline {before["queries"]}')
+        limit = before['p95_ms'] * (1 + latency_tolerance) + LATENCY_FLOOR_MS
+        if result['p95_ms'] > limit:
+            regressions.append(f'{name}: p95 {result["p95_ms"]}ms, baseline {before["p95_ms"]}ms')
+        limit = before['peak_kb'] * (1 + memory_tolerance) + MEMORY_FLOOR_KB
+        if result['peak_kb'] > limit:
+            regressions.append(f'{name}: {result["peak_kb"]}KB allocated, baseline {before["peak_kb"]}KB')
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def save_baseline(path, results, **meta):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({**meta, 'results': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def list_serialization(limit=2000, repeat=5):
+    """
+    Rows per second of RecipeListSerializer against the fastlist row builder,
+    for building the dicts and for rendering them to JSON, on the newest
+    `limit` recipes. Raises AssertionError if the two outputs differ.
+    """
+    from django.test.utils import override_settings
+    from rest_framework.renderers import JSONRenderer
+
+    from .. import fastlist
+    from ..serializers import RecipeListSerializer
+
+    queryset = Recipe.objects.local().with_list_data(None).order_by('-created_at', '-id')[:limit]
+    instances = list(queryset)
+    builder = fastlist.RecipeRows()
+    rows = list(builder.values(queryset))
+    count = len(instances)
+    if not count:
+        raise RuntimeError('The database has no recipes; run generate_dataset first')
+
+    def rate(fn):
+        best = min(_timed(fn) for _ in range(repeat))
+        return round(count / best) if best else None
+
+    slow = RecipeListSerializer(instances, many=True).data
+    fast = builder.build(rows)
+    with override_settings(FAST_LIST_SERIALIZATION=True):
+        slow_json = JSONRenderer().render(slow)
+        fast_json = fastlist.FastJSONRenderer().render(fast)
+        if slow_json != fast_json:
+            raise AssertionError('fastlist output differs from RecipeListSerializer')
+        return {
+            'rows': count,
+            'orjson': fastlist.orjson is not None,
+            'serializer rows/s': rate(lambda: RecipeListSerializer(instances, many=True).data),
+            'fastlist rows/s': rate(lambda: builder.build(rows)),
+            'JSONRenderer rows/s': rate(lambda: JSONRenderer().render(slow)),
+            'FastJSONRenderer rows/s': rate(lambda: fastlist.FastJSONRenderer().render(fast)),
+            'serializer + JSONRenderer rows/s': rate(
+                lambda: JSONRenderer().render(RecipeListSerializer(instances, many=True).data)
+            ),
+            'fastlist + FastJSONRenderer rows/s': rate(
+                lambda: fastlist.FastJSONRenderer().render(builder.build(rows))
+            ),
+        }
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
@@ -0,0 +1,49 @@
+"""
+Query budgets for the read endpoints.
+
+Every list endpoint must run a fixed number of SQL queries no matter how many
+rows it renders. ENDPOINT_BUDGETS declares that number per URL name and
+assert_query_budget() fails (raises QueryBudgetExceeded) when a request goes
+over it, so a regression such as a per-row lookup breaks the build.
+"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+# Maximum queries per request, including authentication (token or session lookup).
+ENDPOINT_BUDGETS = {
+    'recipe-list': 3,
+    'recipe-detail': 8,
+    'merged_recipes': 3,
+    'favorite-list': 4,
+    'shoppinglist-list': 4,
+    # Three table reads when the taxonomy snapshot is (re)loaded, else only authentication
+    'taxonomy': 3,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries, label='block', using=DEFAULT_DB_ALIAS):
+    """Fail if the wrapped block runs more than max_queries queries"""
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    if len(context) > max_queries:
+        statements = '\n'.join(query['sql'] for query in context.captured_queries)
+        raise QueryBudgetExceeded(
+            f"{label} ran {len(context)} queries, budget is {max_queries}:\n{statements}"
+        )
+
+
+def assert_query_budget(client, url_name, *args, query_params=None, **extra):
+    """GET the named endpoint with a test client and check it against ENDPOINT_BUDGETS"""
+    path = reverse(url_name, args=args)
+    with query_budget(ENDPOINT_BUDGETS[url_name], label=f"GET {path}"):
+        response = client.get(path, query_params or {}, **extra)
+    return response
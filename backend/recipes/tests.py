@@ -0,0 +1,1530 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib.util import find_spec
+from io import StringIO
+from unittest import mock, skipIf, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import fastlist, feed, mirror, quota, response_cache, spoonacular, streaming, suggest, taxonomy
+from .cache import TTLCache
+from .exporting import iter_export_records
+from .importing import Checkpoint, RecipeBatchWriter, iter_json_records
+from .singleflight import SingleFlight
+from .spoonacular_client import CircuitBreaker, CircuitOpenError, SpoonacularClient, SpoonacularError
+from .models import Category, Cuisine, Diet, Favorite, Ingredient, Instruction, Rating, Recipe, ShoppingListItem
+from .taxonomy import get_taxonomy
+from .testing import benchmarks
+from .testing.benchmarks import stub_spoonacular
+from .testing.query_budget import ENDPOINT_BUDGETS, assert_query_budget
+
+
+class RecipeAPITestCase(TestCase):
+    """A catalog larger than one page, a signed-in user and Spoonacular stubbed out"""
+    recipe_count = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook', password='password')
+        cls.other = User.objects.create_user('taster', password='password')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.category = Category.objects.create(name='Dinner')
+        cls.cuisine = Cuisine.objects.create(name='Italian')
+        cls.diet = Diet.objects.create(name='Vegetarian')
+        cls.recipes = []
+        for i in range(cls.recipe_count):
+            recipe = Recipe.objects.create(
+                title=f'Recipe {i}', description='Tasty', author=cls.user, category=cls.category,
+                cuisine=cls.cuisine, prep_time=10, cook_time=20 + i, protein=12.5, carbs=30.1, fat=7.25,
+            )
+            recipe.diets.add(cls.diet)
+            Ingredient.objects.create(recipe=recipe, name='Rice', quantity='1', unit='cup')
+            Ingredient.objects.create(recipe=recipe, name='Salt', quantity='1', unit='pinch')
+            Instruction.objects.create(recipe=recipe, step_number=1, text='Cook the rice.')
+            Instruction.objects.create(recipe=recipe, step_number=2, text='Season.')
+            Rating.objects.create(recipe=recipe, user=cls.other, score=1 + i % 5)
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingListItem.objects.create(user=cls.user, recipe=recipe, ingredient_name='Rice', quantity='1')
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        # Response caches and version counters live in the default cache
+        cache.clear()
+        stub = stub_spoonacular()
+        stub.__enter__()
+        self.addCleanup(stub.__exit__, None, None, None)
+        # ALLOWED_HOSTS does not list "testserver"
+        self.client = APIClient(SERVER_NAME='localhost')
+
+    def sign_in(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+
+class QueryBudgetTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        # Filters read the taxonomy snapshot, which each process loads once per change
+        get_taxonomy()
+
+    def endpoints(self):
+        recipe = self.recipes[0]
+        return [
+            ('recipe-list', (), None),
+            ('recipe-list', (), {'ordering': '-rating_avg', 'category': self.category.pk}),
+            ('recipe-detail', (recipe.pk,), None),
+            ('merged_recipes', (), None),
+            ('merged_recipes', (), {'ordering': '-rating_count'}),
+            ('taxonomy', (), None),
+        ]
+
+    def test_every_budget_is_exercised(self):
+        covered = {url_name for url_name, _, _ in self.endpoints()} | {'favorite-list', 'shoppinglist-list'}
+        self.assertEqual(covered, set(ENDPOINT_BUDGETS))
+
+    def test_anonymous_endpoints_within_budget(self):
+        for url_name, args, params in self.endpoints():
+            with self.subTest(url_name=url_name, params=params):
+                response = assert_query_budget(self.client, url_name, *args, query_params=params)
+                self.assertEqual(response.status_code, 200)
+
+    def test_authenticated_endpoints_within_budget(self):
+        self.sign_in()
+        endpoints = self.endpoints() + [('favorite-list', (), None), ('shoppinglist-list', (), None)]
+        for url_name, args, params in endpoints:
+            with self.subTest(url_name=url_name, params=params):
+                response = assert_query_budget(self.client, url_name, *args, query_params=params)
+                self.assertEqual(response.status_code, 200)
+
+
+class AutocompleteCountTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        suggest._index = suggest.build_index()
+        self.addCleanup(setattr, suggest, '_index', None)
+
+    def weight(self, name):
+        entry = suggest.get_index().entries.get(suggest.ingredient_key(name))
+        return entry and entry.weight
+
+    def test_mirror_resync_leaves_counts_alone(self):
+        payload = {'id': 7, 'title': 'Mirrored', 'extendedIngredients': [{'name': 'Rice'}, {'name': 'Saffron'}]}
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                mirror.upsert([payload])
+        self.assertEqual(self.weight('Rice'), self.recipe_count)
+        self.assertIsNone(self.weight('Saffron'))
+        self.assertEqual(suggest.build_index().entries[suggest.ingredient_key('Rice')].weight, self.recipe_count)
+
+    def test_import_upsert_counts_rewritten_ingredients(self):
+        writer = RecipeBatchWriter(self.user)
+        record = {
+            'key': 'imported-1', 'title': 'Imported', 'description': '', 'category': 'Dinner',
+            'ingredients': [{'name': 'Rice', 'quantity': '1'}], 'instructions': ['Cook.'],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            writer.upsert([record])
+        with self.captureOnCommitCallbacks(execute=True):
+            writer.upsert([{**record, 'description': 'Changed'}])
+        self.assertEqual(self.weight('Rice'), self.recipe_count + 1)
+        self.assertEqual(suggest.build_index().entries[suggest.ingredient_key('Rice')].weight, self.recipe_count + 1)
+
+
+    def test_rolled_back_save_stays_out_of_the_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    recipe = Recipe.objects.create(
+                        title='Phantom stew', author=self.user, category=self.category, prep_time=5, cook_time=5,
+                    )
+                    Ingredient.objects.create(recipe=recipe, name='Saffron')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(suggest.get_index().search('phantom', 5), [])
+        self.assertIsNone(self.weight('Saffron'))
+
+    def test_build_sums_names_that_normalize_alike(self):
+        Ingredient.objects.create(recipe=self.recipes[0], name='Olive oil')
+        Ingredient.objects.create(recipe=self.recipes[1], name='olive  oil')
+        Ingredient.objects.create(recipe=self.recipes[2], name=' OLIVE OIL')
+        self.assertEqual(suggest.build_index().entries[suggest.ingredient_key('olive oil')].weight, 3)
+
+    def test_suggest_endpoint(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                title='Rice pudding', author=self.user, category=self.category, prep_time=5, cook_time=30,
+            )
+        response = self.client.get(reverse('recipe-suggest'), {'q': 'ric', 'limit': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['query'], 'ric')
+        self.assertEqual(response.data['suggestions'], [
+            {'type': 'ingredient', 'text': 'Rice'},
+            {'type': 'recipe', 'text': 'Rice pudding', 'id': recipe.pk},
+        ])
+
+class RebuildHomeFeedCommandTests(RecipeAPITestCase):
+    def test_refuses_local_memory_cache(self):
+        with self.assertRaisesMessage(CommandError, 'local-memory cache'):
+            call_command('rebuild_home_feed', stdout=StringIO())
+
+    def test_rebuilds_into_shared_cache(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        caches = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'feed': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name},
+        }
+        out = StringIO()
+        with override_settings(CACHES=caches, HOME_FEED_CACHE='feed'):
+            call_command('rebuild_home_feed', stdout=out)
+        self.assertIn('Rebuilt home feed', out.getvalue())
+
+
+class ImportRecipesCommandTests(RecipeAPITestCase):
+    def test_progress_goes_to_command_output(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'recipes.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([
+                {'key': f'imported-{i}', 'title': f'Imported {i}', 'description': '', 'category': 'Dinner',
+                 'ingredients': [{'name': 'Rice', 'quantity': '1'}], 'instructions': ['Cook.']}
+                for i in range(3)
+            ], f)
+        out = StringIO()
+        call_command('import_recipes', path, '--upsert', '--batch-size', '2', '--author', 'cook', stdout=out)
+        self.assertIn('2 records read: 2 created', out.getvalue())
+        self.assertIn('Imported 3 recipes', out.getvalue())
+        self.assertEqual(Recipe.objects.filter(title__startswith='Imported').count(), 3)
+
+    def write_file(self, records, lines=False):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'recipes.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            if lines:
+                f.write('\n'.join(json.dumps(record) for record in records))
+            else:
+                json.dump(records, f)
+        return path
+
+    def record(self, i, **changes):
+        return {
+            'title': f'Imported {i}', 'description': 'Bulk', 'category': 'dinner', 'cuisine': 'Thai',
+            'diets': ['Vegetarian', 'vegetarian'], 'prep_time': 5, 'cook_time': i,
+            'ingredients': [{'name': 'Rice', 'quantity': '1', 'unit': 'cup'}, {'name': 'Lime', 'quantity': '2'}],
+            'instructions': ['Cook.', 'Squeeze.'], **changes,
+        }
+
+    def test_batches_create_recipes_with_their_children(self):
+        path = self.write_file([self.record(i) for i in range(5)], lines=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_recipes', path, '--batch-size', '2', '--author', 'cook', stdout=StringIO())
+        imported = Recipe.objects.filter(title__startswith='Imported').order_by('cook_time')
+        self.assertEqual(imported.count(), 5)
+        recipe = imported.last()
+        self.assertEqual((recipe.category, recipe.cuisine.name), (self.category, 'Thai'))
+        self.assertEqual(list(recipe.diets.all()), [self.diet])
+        self.assertEqual(list(recipe.ingredients.values_list('name', 'unit')), [('Rice', 'cup'), ('Lime', '')])
+        self.assertEqual(list(recipe.instructions.values_list('step_number', 'text')), [(1, 'Cook.'), (2, 'Squeeze.')])
+        self.assertEqual(Cuisine.objects.filter(name='Thai').count(), 1)
+
+    def test_unknown_author(self):
+        path = self.write_file([self.record(1)])
+        with self.assertRaisesMessage(CommandError, "User 'nobody' does not exist."):
+            call_command('import_recipes', path, '--author', 'nobody', stdout=StringIO())
+
+
+    def test_upsert_rerun_skips_unchanged_and_rewrites_changed(self):
+        records = [self.record(i, key=f'k{i}') for i in range(4)]
+        call_command('import_recipes', self.write_file(records), '--upsert', '--author', 'cook', stdout=StringIO())
+        ids = dict(Recipe.objects.filter(import_key__startswith='k').values_list('import_key', 'id'))
+        records[1] = self.record(1, key='k1', title='Renamed', ingredients=[{'name': 'Tofu', 'quantity': '1'}])
+        out = StringIO()
+        call_command('import_recipes', self.write_file(records), '--upsert', '--author', 'cook', stdout=out)
+        self.assertIn('Imported 0 recipes, updated 1, skipped 3 unchanged', out.getvalue())
+        renamed = Recipe.objects.get(import_key='k1')
+        self.assertEqual((renamed.pk, renamed.title), (ids['k1'], 'Renamed'))
+        self.assertEqual(list(renamed.ingredients.values_list('name', flat=True)), ['Tofu'])
+        self.assertEqual(Recipe.objects.filter(import_key__startswith='k').count(), 4)
+
+    def test_interrupted_import_resumes_from_its_checkpoint(self):
+        path = self.write_file([self.record(i, key=f'k{i}') for i in range(6)])
+        upsert = RecipeBatchWriter.upsert
+        batches = []
+
+        def fail_on_third_batch(writer, records):
+            batches.append(len(records))
+            if len(batches) == 3:
+                raise RuntimeError('interrupted')
+            return upsert(writer, records)
+        with mock.patch.object(RecipeBatchWriter, 'upsert', fail_on_third_batch), \
+                self.assertRaisesMessage(RuntimeError, 'interrupted'):
+            call_command('import_recipes', path, '--upsert', '--batch-size', '2', '--author', 'cook',
+                         stdout=StringIO())
+        self.assertEqual(Checkpoint(f'{path}.checkpoint', path).load(), 4)
+        out = StringIO()
+        call_command('import_recipes', path, '--upsert', '--batch-size', '2', '--author', 'cook', stdout=out)
+        self.assertIn('Resuming after record 4', out.getvalue())
+        self.assertIn('Imported 2 recipes, updated 0, skipped 0 unchanged', out.getvalue())
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+        self.assertEqual(Recipe.objects.filter(import_key__startswith='k').count(), 6)
+
+    def test_checkpoint_of_another_file_is_ignored(self):
+        path = self.write_file([self.record(i, key=f'k{i}') for i in range(3)])
+        Checkpoint(f'{path}.checkpoint', path).save(2)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('\n')
+        out = StringIO()
+        call_command('import_recipes', path, '--upsert', '--author', 'cook', stdout=out)
+        self.assertNotIn('Resuming', out.getvalue())
+        self.assertIn('Imported 3 recipes', out.getvalue())
+
+    def test_restart_ignores_the_checkpoint(self):
+        path = self.write_file([self.record(i, key=f'k{i}') for i in range(3)])
+        Checkpoint(f'{path}.checkpoint', path).save(2)
+        out = StringIO()
+        call_command('import_recipes', path, '--upsert', '--restart', '--author', 'cook', stdout=out)
+        self.assertIn('Imported 3 recipes', out.getvalue())
+
+
+class IterJsonRecordsTests(SimpleTestCase):
+    records = [{'n': i, 'text': 'x' * i, 'value': 10 ** i} for i in range(12)]
+
+    def test_array_read_in_small_chunks(self):
+        for read_size in (1, 3, 7, 64):
+            with self.subTest(read_size=read_size):
+                stream = StringIO(json.dumps(self.records, indent=1))
+                self.assertEqual(list(iter_json_records(stream, read_size)), self.records)
+
+    def test_concatenated_objects(self):
+        stream = StringIO('\n'.join(json.dumps(record) for record in self.records) + '\n')
+        self.assertEqual(list(iter_json_records(stream, 5)), self.records)
+
+    def test_number_split_across_chunks(self):
+        self.assertEqual(list(iter_json_records(StringIO('[12345, 678]'), 3)), [12345, 678])
+
+    def test_truncated_input(self):
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_records(StringIO('[{"n": 1}, {"n": '), 4))
+
+
+class NestedCreateTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.sign_in()
+        suggest._index = suggest.build_index()
+        self.addCleanup(setattr, suggest, '_index', None)
+
+    def payload(self, size, **changes):
+        return {
+            'title': 'Big batch', 'description': 'Many parts', 'category': self.category.pk,
+            'diet_ids': [self.diet.pk], 'prep_time': 5, 'cook_time': 10, 'servings': 4, 'difficulty': 'easy',
+            'ingredients': [{'name': f'Part {i}', 'quantity': str(i), 'unit': 'g'} for i in range(size)],
+            'instructions': [{'step_number': i + 1, 'text': f'Step {i + 1}'} for i in range(size)],
+            **changes,
+        }
+
+    def create(self, data):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(reverse('recipe-list'), data, format='json')
+        return response, callbacks
+
+    def test_query_count_does_not_grow_with_nested_rows(self):
+        counts = []
+        for size in (2, 40):
+            with CaptureQueriesContext(connection) as queries:
+                response, _ = self.create(self.payload(size))
+            self.assertEqual(response.status_code, 201, response.data)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        recipe = Recipe.objects.latest('pk')
+        self.assertEqual(recipe.ingredients.count(), 40)
+        self.assertEqual(list(recipe.instructions.values_list('step_number', flat=True)), list(range(1, 41)))
+        self.assertEqual(list(recipe.diets.all()), [self.diet])
+
+    def test_new_ingredients_reach_the_index_after_commit(self):
+        response, _ = self.create(self.payload(3))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(suggest.get_index().entries[suggest.ingredient_key('Part 2')].weight, 1)
+
+    def test_invalid_nested_data_writes_nothing(self):
+        steps = [{'step_number': 1, 'text': 'One'}, {'step_number': 1, 'text': 'Again'}]
+        response, callbacks = self.create(self.payload(3, instructions=steps))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('instructions', response.data)
+        self.assertFalse(Recipe.objects.filter(title='Big batch').exists())
+        self.assertEqual(callbacks, [])
+
+    def test_failed_insert_rolls_back_the_recipe(self):
+        with mock.patch.object(Instruction.objects, 'bulk_create', side_effect=DatabaseError('disk full')), \
+                self.assertRaises(DatabaseError):
+            self.create(self.payload(3))
+        self.assertFalse(Recipe.objects.filter(title='Big batch').exists())
+        self.assertFalse(Ingredient.objects.filter(name='Part 0').exists())
+        self.assertIsNone(suggest.get_index().entries.get(suggest.ingredient_key('Part 0')))
+
+
+class NestedPartialUpdateTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.sign_in()
+        self.recipe = self.recipes[0]
+        self.url = reverse('recipe-detail', args=[self.recipe.pk])
+
+    def patch(self, data):
+        return self.client.patch(self.url, data, format='json')
+
+    def test_ingredient_item_keeps_fields_it_leaves_out(self):
+        rice = self.recipe.ingredients.get(name='Rice')
+        response = self.patch({'ingredients': [{'id': rice.pk, 'quantity': '2'}, {'name': 'Salt'}]})
+        self.assertEqual(response.status_code, 200, response.content)
+        rice.refresh_from_db()
+        self.assertEqual((rice.name, rice.quantity, rice.unit), ('Rice', '2', 'cup'))
+        self.assertEqual(self.recipe.ingredients.get(name='Salt').unit, 'pinch')
+
+    def test_removed_ingredients_are_deleted_at_once(self):
+        suggest._index = suggest.build_index()
+        self.addCleanup(setattr, suggest, '_index', None)
+        Ingredient.objects.bulk_create(
+            [Ingredient(recipe=self.recipe, name=f'Extra {i}', quantity='1') for i in range(10)]
+        )
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.patch({'ingredients': [{'name': 'Rice'}]})
+        self.assertEqual(response.status_code, 200, response.content)
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE FROM "recipes_ingredient"')]
+        self.assertEqual(len(deletes), 1)
+        self.assertLess(len(callbacks), 10)
+        self.assertEqual(list(self.recipe.ingredients.values_list('name', flat=True)), ['Rice'])
+        self.assertEqual(suggest.get_index().entries[suggest.ingredient_key('Salt')].weight, self.recipe_count - 1)
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_new_ingredient_needs_a_quantity(self):
+        response = self.patch({'ingredients': [{'name': 'Pepper'}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.json())
+        self.assertEqual(self.recipe.ingredients.count(), 2)
+
+    def test_ingredient_without_id_needs_a_name(self):
+        response = self.patch({'ingredients': [{'quantity': '3'}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.json())
+
+    def test_step_without_step_number_is_rejected(self):
+        step = self.recipe.instructions.get(step_number=1)
+        response = self.patch({'instructions': [{'id': step.pk, 'description': 'x'}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('instructions', response.json())
+
+    def test_step_without_text_keeps_its_text(self):
+        response = self.patch({'instructions': [{'step_number': 1}, {'step_number': 2, 'text': 'Salt it.'}]})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            list(self.recipe.instructions.values_list('text', flat=True)), ['Cook the rice.', 'Salt it.'],
+        )
+
+    def test_new_step_needs_text(self):
+        response = self.patch({'instructions': [{'step_number': 3}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.recipe.instructions.count(), 2)
+
+
+class FastListTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        # A half-star average on the first page, next to the float macros
+        Rating.objects.create(recipe=self.recipes[-1], user=self.user, score=2)
+
+    def get_both(self, url_name, orjson_renders=True):
+        """The response bodies of url_name through the serializers and through the fast path"""
+        bodies = []
+        for fast in (False, True):
+            cache.clear()
+            # Count the renders that go through orjson rather than the fallback
+            with override_settings(FAST_LIST_SERIALIZATION=fast), \
+                    mock.patch.object(fastlist.orjson, 'dumps', wraps=fastlist.orjson.dumps) as dumps:
+                response = self.client.get(reverse(url_name))
+            self.assertEqual(dumps.called, fast and orjson_renders)
+            self.assertEqual(response.status_code, 200)
+            bodies.append(response.content)
+        return bodies
+
+    def test_fast_path_renders_the_same_bytes(self):
+        self.assertIsNotNone(fastlist.orjson)
+        for url_name in ('recipe-list', 'merged_recipes'):
+            with self.subTest(url_name=url_name):
+                slow, fast = self.get_both(url_name)
+                self.assertIn(b'12.5', slow)
+                self.assertIn(b'"average_rating":3.5', slow)
+                self.assertEqual(fast, slow)
+
+    def test_fast_path_renders_the_same_bytes_for_favorites(self):
+        self.sign_in()
+        slow, fast = self.get_both('favorite-list')
+        self.assertEqual(fast, slow)
+
+    def test_floats_in_exponent_form_render_the_same_bytes(self):
+        Recipe.objects.filter(pk=self.recipes[-1].pk).update(protein=1e16, carbs=2.5e-5, fat=-3e20)
+        slow, fast = self.get_both('recipe-list', orjson_renders=False)
+        self.assertIn(b'"protein":1e+16,"carbs":2.5e-05,"fat":-3e+20', slow)
+        self.assertEqual(fast, slow)
+
+    def test_non_finite_floats_are_refused_either_way(self):
+        for fast in (False, True):
+            with self.subTest(fast=fast), override_settings(FAST_LIST_SERIALIZATION=fast):
+                for value in (float('nan'), float('inf')):
+                    with self.assertRaisesMessage(ValueError, 'Out of range float values are not JSON compliant'):
+                        fastlist.FastJSONRenderer().render({'results': [{'protein': value}]})
+
+
+class RecipeDetailValidatorTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[0]
+        self.url = reverse('recipe-detail', args=[self.recipe.pk])
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.etag = response['ETag']
+
+    def assertChanged(self, change):
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], self.etag)
+
+    def test_new_ingredient(self):
+        self.assertChanged(lambda: Ingredient.objects.create(recipe=self.recipe, name='Pepper', quantity='1'))
+
+    def test_deleted_ingredient(self):
+        self.assertChanged(lambda: self.recipe.ingredients.get(name='Salt').delete())
+
+    def test_edited_instruction(self):
+        def change():
+            step = self.recipe.instructions.get(step_number=2)
+            step.text = 'Season well.'
+            step.save()
+        self.assertChanged(change)
+
+    def test_added_diet(self):
+        diet = Diet.objects.create(name='Vegan')
+        self.etag = self.client.get(self.url)['ETag']
+        self.assertChanged(lambda: self.recipe.diets.add(diet))
+
+    def test_diet_removed_from_its_side(self):
+        self.assertChanged(lambda: self.diet.recipe_set.clear())
+
+    def test_renamed_diet(self):
+        def change():
+            self.diet.name = 'Veggie'
+            self.diet.save()
+        self.assertChanged(change)
+
+    def test_edited_rating_score(self):
+        def change():
+            rating = self.recipe.ratings.get()
+            rating.score = 5
+            rating.save()
+        self.assertChanged(change)
+
+    def test_edited_rating_comment(self):
+        def change():
+            rating = self.recipe.ratings.get()
+            rating.comment = 'Lovely'
+            rating.save()
+        self.assertChanged(change)
+
+    def test_deleted_rating(self):
+        self.assertChanged(lambda: self.recipe.ratings.get().delete())
+
+
+class LastModifiedTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[0]
+        # Last-Modified has whole seconds: date the rows well before the changes
+        yesterday = timezone.now() - timedelta(days=1)
+        Recipe.objects.filter(pk=self.recipe.pk).update(updated_at=yesterday)
+        Rating.objects.filter(recipe=self.recipe).update(created_at=yesterday)
+        self.url = reverse('recipe-detail', args=[self.recipe.pk])
+        self.last_modified = self.client.get(self.url)['Last-Modified']
+
+    def assertChanged(self, change):
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=self.last_modified).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=self.last_modified).status_code, 200)
+
+    def test_edited_rating_score(self):
+        def change():
+            rating = self.recipe.ratings.get()
+            rating.score = 5
+            rating.save()
+        self.assertChanged(change)
+
+    def test_deleted_rating(self):
+        self.assertChanged(lambda: self.recipe.ratings.get().delete())
+
+    def test_list_pages_are_validated_by_etag_only(self):
+        url = reverse('recipe-list')
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=self.last_modified).status_code, 200)
+
+        # A row leaving the page moves no remaining row's timestamp
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.get(pk=response.json()['results'][-1]['id']).delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_page_follows_ratings(self):
+        url = reverse('recipe-list')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.filter(recipe=self.recipes[-1]).update(score=1)
+            rating = self.recipes[-1].ratings.get()
+            rating.score = 3
+            rating.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SparseFieldsetTests(RecipeAPITestCase):
+    def test_nested_object_fields_on_list(self):
+        response = self.client.get(reverse('recipe-list'), {'fields': 'title,category.name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0], {'title': 'Recipe 24', 'category': {'name': 'Dinner'}})
+
+    def test_nested_list_fields_on_detail(self):
+        recipe = self.recipes[0]
+        response = self.client.get(
+            reverse('recipe-detail', args=[recipe.pk]), {'fields': 'ingredients.name,ratings.score,author.username'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'author': {'username': 'cook'},
+            'ingredients': [{'name': 'Rice'}, {'name': 'Salt'}],
+            'ratings': [{'score': 1}],
+        })
+
+    def test_nested_fields_through_favorites(self):
+        self.sign_in()
+        response = self.client.get(reverse('favorite-list'), {'fields': 'recipe.cuisine.name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0], {'recipe': {'cuisine': {'name': 'Italian'}}})
+
+    def test_field_errors(self):
+        recipe = self.recipes[0]
+        cases = [
+            (reverse('recipe-list'), {'fields': 'title,nope'}, 'fields', 'nope'),
+            (reverse('recipe-list'), {'expand': 'nope'}, 'expand', 'nope'),
+            (reverse('recipe-detail', args=[recipe.pk]), {'fields': 'category.nope'}, 'fields', 'category.nope'),
+            (reverse('recipe-list'), {'fields': 'title.length'}, 'fields', 'without nested fields: title'),
+        ]
+        for url, params, param, message in cases:
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, response.json()[param])
+
+
+class ResponseCacheTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[-1]
+        self.detail_url = reverse('recipe-detail', args=[self.recipe.pk])
+        self.list_url = reverse('recipe-list')
+
+    def hits(self):
+        return response_cache.stats()['hits']
+
+    def assertCached(self, url):
+        """GET url twice, the second time from the cache, and return the body"""
+        first = self.client.get(url)
+        hits = self.hits()
+        second = self.client.get(url)
+        self.assertEqual(self.hits(), hits + 1)
+        self.assertEqual(second.content, first.content)
+        return second.json()
+
+    def change(self, change):
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+
+    def test_ingredient_change_refreshes_detail(self):
+        self.assertCached(self.detail_url)
+        self.change(lambda: Ingredient.objects.create(recipe=self.recipe, name='Pepper', quantity='1'))
+        names = [ingredient['name'] for ingredient in self.assertCached(self.detail_url)['ingredients']]
+        self.assertIn('Pepper', names)
+
+    def test_diet_change_refreshes_detail(self):
+        self.assertCached(self.detail_url)
+        self.change(lambda: self.recipe.diets.clear())
+        self.assertEqual(self.assertCached(self.detail_url)['diets'], [])
+
+    def test_rating_refreshes_list(self):
+        self.assertCached(self.list_url)
+        self.change(lambda: Rating.objects.create(recipe=self.recipe, user=self.user, score=2))
+        self.assertEqual(self.assertCached(self.list_url)['results'][0]['average_rating'], 3.5)
+
+    def test_category_rename_refreshes_list_and_detail(self):
+        self.assertCached(self.list_url)
+        self.assertCached(self.detail_url)
+
+        def rename():
+            self.category.name = 'Supper'
+            self.category.save()
+        self.change(rename)
+        self.assertEqual(self.assertCached(self.list_url)['results'][0]['category']['name'], 'Supper')
+        self.assertEqual(self.assertCached(self.detail_url)['category']['name'], 'Supper')
+
+    def test_cached_detail_answers_if_modified_since(self):
+        last_modified = self.client.get(self.detail_url)['Last-Modified']
+        hits = self.hits()
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(self.hits(), hits + 1)
+        self.assertEqual(response.status_code, 304)
+
+    def test_signed_in_requests_are_not_cached(self):
+        self.sign_in()
+        hits = self.hits()
+        self.client.get(self.detail_url)
+        self.client.get(self.detail_url)
+        self.assertEqual(self.hits(), hits)
+
+
+class BenchmarkTests(RecipeAPITestCase):
+    def test_anonymous_scenarios_measure_the_uncached_path(self):
+        scenarios = [s for s in benchmarks.default_scenarios() if not s.authenticated and s.method == 'get']
+        results = benchmarks.run(scenarios, iterations=2, warmup=1)
+        for name in ('recipes', 'merged (home feed)', 'taxonomy'):
+            with self.subTest(name=name):
+                self.assertGreater(results[name]['queries'], 0)
+        for name in ('recipes (cached)', 'recipe detail (cached)', 'merged (feed cached)', 'taxonomy (snapshot)'):
+            with self.subTest(name=name):
+                self.assertEqual(results[name]['queries'], 0)
+        self.assertEqual(benchmarks.compare(results, {}), [])
+
+
+class StubSpoonacular:
+    """
+    Local HTTP server answering with the scripted (status, body, delay)
+    responses in turn, repeating the last one; records the request paths.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.paths = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.paths.append(self.path)
+                status, body, delay = stub.responses[min(len(stub.paths), len(stub.responses)) - 1]
+                time.sleep(delay)
+                content = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+                except OSError:
+                    # The client gave up (timeout)
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SpoonacularClientTests(SimpleTestCase):
+    def stub(self, *responses):
+        stub = StubSpoonacular(*responses)
+        self.addCleanup(stub.close)
+        return stub
+
+    def make_client(self, stub, **kwargs):
+        kwargs.setdefault('backoff', 0)
+        return SpoonacularClient(api_key='key', base_url=stub.url, **kwargs)
+
+    def test_retries_server_errors(self):
+        stub = self.stub((503, {}, 0), (500, {}, 0), (200, {'ok': True}, 0))
+        self.assertEqual(self.make_client(stub, retries=2).get_json('/recipes/random'), {'ok': True})
+        self.assertEqual(len(stub.paths), 3)
+        self.assertIn('apiKey=key', stub.paths[0])
+
+    def test_retries_rate_limits(self):
+        stub = self.stub((429, {}, 0), (200, {'ok': True}, 0))
+        self.assertEqual(self.make_client(stub, retries=2).get_json('/recipes/random'), {'ok': True})
+        self.assertEqual(len(stub.paths), 2)
+
+    def test_gives_up_after_retries(self):
+        stub = self.stub((500, {}, 0))
+        client = self.make_client(stub, retries=2)
+        with self.assertRaises(SpoonacularError) as raised:
+            client.get_json('/recipes/random')
+        self.assertEqual(raised.exception.status_code, 500)
+        self.assertEqual(len(stub.paths), 3)
+        self.assertEqual(client.breaker.failures, 1)
+
+    def test_not_found_and_client_errors(self):
+        stub = self.stub((404, {}, 0), (402, {}, 0))
+        client = self.make_client(stub, retries=2)
+        self.assertIsNone(client.get_json('/recipes/1/information'))
+        with self.assertRaises(SpoonacularError) as raised:
+            client.get_json('/recipes/1/information')
+        self.assertEqual(raised.exception.status_code, 402)
+        self.assertEqual(len(stub.paths), 2)
+        self.assertEqual(client.breaker.failures, 0)
+
+    def test_timeout(self):
+        stub = self.stub((200, {}, 0.5))
+        client = self.make_client(stub, retries=0, timeout=0.1)
+        with self.assertRaises(SpoonacularError) as raised:
+            client.get_json('/recipes/random')
+        self.assertEqual(raised.exception.status_code, 502)
+        self.assertEqual(client.breaker.failures, 1)
+
+    def test_breaker_opens_and_fails_fast(self):
+        stub = self.stub((500, {}, 0))
+        client = self.make_client(stub, retries=0, breaker=CircuitBreaker(threshold=2, cooldown=60))
+        for _ in range(2):
+            with self.assertRaises(SpoonacularError):
+                client.get_json('/recipes/random')
+        self.assertEqual(client.breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            client.get_json('/recipes/random')
+        self.assertEqual(len(stub.paths), 2)
+
+    def test_half_open_trial_success_closes(self):
+        stub = self.stub((500, {}, 0), (200, {'ok': True}, 0))
+        client = self.make_client(stub, retries=0, breaker=CircuitBreaker(threshold=1, cooldown=0.05))
+        with self.assertRaises(SpoonacularError):
+            client.get_json('/recipes/random')
+        self.assertEqual(client.breaker.state, 'open')
+        time.sleep(0.06)
+        self.assertEqual(client.breaker.state, 'half-open')
+        self.assertEqual(client.get_json('/recipes/random'), {'ok': True})
+        self.assertEqual(client.breaker.state, 'closed')
+
+    def test_half_open_trial_failure_reopens(self):
+        stub = self.stub((500, {}, 0))
+        client = self.make_client(stub, retries=0, breaker=CircuitBreaker(threshold=1, cooldown=0.05))
+        with self.assertRaises(SpoonacularError):
+            client.get_json('/recipes/random')
+        time.sleep(0.06)
+        with self.assertRaises(SpoonacularError) as raised:
+            client.get_json('/recipes/random')
+        self.assertNotIsInstance(raised.exception, CircuitOpenError)
+        self.assertEqual(client.breaker.state, 'open')
+        self.assertEqual(len(stub.paths), 2)
+
+    def test_half_open_lets_one_trial_through(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def upstream(self, result='value', delay=0.1, error=None):
+        calls = []
+        lock = threading.Lock()
+
+        def fn():
+            with lock:
+                calls.append(1)
+            time.sleep(delay)
+            if error is not None:
+                raise error
+            return result
+        return fn, calls
+
+    def run_concurrently(self, targets):
+        results = [None] * len(targets)
+        barrier = threading.Barrier(len(targets))
+
+        def run(i, target):
+            barrier.wait()
+            try:
+                results[i] = target()
+            except Exception as e:
+                results[i] = e
+        threads = [threading.Thread(target=run, args=(i, target)) for i, target in enumerate(targets)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        fn, calls = self.upstream()
+        results = self.run_concurrently([lambda: flight.do('key', fn)] * 10)
+        self.assertEqual(results, ['value'] * 10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats(), {'leaders': 1, 'coalesced': 9})
+
+    def test_callers_share_the_error(self):
+        flight = SingleFlight()
+        fn, calls = self.upstream(error=ValueError('down'))
+        results = self.run_concurrently([lambda: flight.do('key', fn)] * 5)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(len(calls), 1)
+
+    def test_processes_share_one_call_through_the_cache(self):
+        # Two flights on one cache stand for two worker processes
+        flights = [SingleFlight(name='test', cache_alias='default', poll_interval=0.01) for _ in range(2)]
+        fn, calls = self.upstream()
+        results = self.run_concurrently([lambda flight=flight: flight.do('key', fn) for flight in flights * 4])
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sum(flight.stats()['coalesced'] for flight in flights), 7)
+
+    def test_result_published_before_release_is_shared(self):
+        first, second = (SingleFlight(name='test', cache_alias='default') for _ in range(2))
+        fn, calls = self.upstream(delay=0)
+        self.assertEqual(first.do('key', fn), 'value')
+        self.assertEqual(second.do('key', fn), 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_waiter_takes_over_when_the_leader_fails(self):
+        leader, waiter = (SingleFlight(name='test', cache_alias='default', poll_interval=0.01) for _ in range(2))
+        failing, failed_calls = self.upstream(error=ValueError('down'), delay=0.2)
+        fn, calls = self.upstream(delay=0)
+
+        def wait_then_call():
+            time.sleep(0.05)
+            return waiter.do('key', fn)
+        results = self.run_concurrently([lambda: leader.do('key', failing), wait_then_call])
+        self.assertIsInstance(results[0], ValueError)
+        self.assertEqual(results[1], 'value')
+        self.assertEqual((len(failed_calls), len(calls)), (1, 1))
+
+
+class RatingAggregateTests(RecipeAPITestCase):
+    def assertStats(self, recipe, count, total):
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.rating_count, recipe.rating_sum), (count, total))
+        self.assertAlmostEqual(recipe.rating_avg, total / count if count else 0.0)
+
+    def test_follows_rating_writes(self):
+        first, second = self.recipes[0], self.recipes[1]
+        rating = Rating.objects.create(recipe=first, user=self.user, score=5)
+        self.assertStats(first, 2, 6)
+        rating = Rating.objects.get(pk=rating.pk)
+        rating.score = 2
+        rating.save()
+        self.assertStats(first, 2, 3)
+        rating.recipe = second
+        rating.save()
+        self.assertStats(first, 1, 1)
+        self.assertStats(second, 2, 4)
+        rating.delete()
+        self.assertStats(second, 1, 2)
+        Rating.objects.filter(recipe=first).delete()
+        self.assertStats(first, 0, 0)
+
+    def test_rebuild_command_repairs_drift(self):
+        Recipe.objects.filter(pk=self.recipes[3].pk).update(rating_count=9, rating_sum=40)
+        with self.assertRaisesMessage(CommandError, '1 recipes have stale rating aggregates'):
+            call_command('rebuild_rating_stats', '--check', stdout=StringIO())
+        call_command('rebuild_rating_stats', '--batch-size', '10', stdout=StringIO())
+        self.assertStats(self.recipes[3], 1, 4)
+        call_command('rebuild_rating_stats', '--check', stdout=StringIO())
+
+
+class CursorPaginationTests(RecipeAPITestCase):
+    def walk(self, url, params=None, results_key='results', direction='next'):
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            pages.append(body[results_key])
+            if body[direction] is None:
+                return pages, body
+            response = self.client.get(body[direction])
+
+    def ids(self, page):
+        return [item['id'] for item in page]
+
+    def test_ties_are_broken_by_id_in_both_directions(self):
+        # Every recipe has the same prep_time
+        pages, last = self.walk(reverse('recipe-list'), {'ordering': 'prep_time', 'page_size': 7})
+        self.assertEqual([len(page) for page in pages], [7, 7, 7, 4])
+        self.assertEqual(sum(map(self.ids, pages), []), sorted(recipe.pk for recipe in self.recipes))
+        back = [last['results']]
+        response = self.client.get(last['previous'])
+        while True:
+            body = response.json()
+            back.insert(0, body['results'])
+            if body['previous'] is None:
+                break
+            response = self.client.get(body['previous'])
+        self.assertEqual(list(map(self.ids, back)), list(map(self.ids, pages)))
+
+    def test_new_rows_do_not_shift_later_pages(self):
+        url = reverse('recipe-list')
+        first = self.client.get(url, {'page_size': 10}).json()
+        expected = self.client.get(first['next']).json()['results']
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(title='Newest', author=self.user, category=self.category, prep_time=1, cook_time=1)
+        self.assertEqual(self.ids(self.client.get(first['next']).json()['results']), self.ids(expected))
+
+    def test_descending_ordering_with_ties(self):
+        pages, _ = self.walk(reverse('recipe-list'), {'ordering': '-rating_avg', 'page_size': 6})
+        seen = [(item['average_rating'], item['id']) for item in sum(pages, [])]
+        self.assertEqual(len(seen), self.recipe_count)
+        self.assertEqual(seen, sorted(seen, key=lambda row: (-row[0], -row[1])))
+
+    def test_merged_pages_keep_their_size_and_show_each_row_once(self):
+        pages, _ = self.walk(reverse('merged_recipes'), {'page_size': 8}, results_key='recipes')
+        self.assertTrue(all(len(page) == 8 for page in pages[:-1]))
+        local = [item['id'] for item in sum(pages, []) if not str(item['id']).startswith('spoonacular_')]
+        self.assertEqual(sorted(local), sorted(recipe.pk for recipe in self.recipes))
+        self.assertEqual(len(sum(pages, [])) - len(local), 5)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('recipe-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class TTLCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch('recipes.cache.time')
+        clock.start().monotonic.side_effect = lambda: self.now
+        self.addCleanup(clock.stop)
+        self.calls = []
+
+    def fetch(self, value='value', error=None):
+        def fn():
+            self.calls.append(value)
+            if error is not None:
+                raise error
+            return value
+        return fn
+
+    def wait_for_refresh(self, ttl_cache, key):
+        for _ in range(200):
+            with ttl_cache._lock:
+                if key not in ttl_cache._refreshing:
+                    return
+            time.sleep(0.01)
+        self.fail('background refresh did not finish')
+
+    def test_fresh_entries_are_served_until_they_expire(self):
+        ttl_cache = TTLCache()
+        self.assertEqual(ttl_cache.get_or_fetch('key', self.fetch('one'), ttl=10), 'one')
+        self.now += 9
+        self.assertEqual(ttl_cache.get_or_fetch('key', self.fetch('two'), ttl=10), 'one')
+        self.now += 2
+        self.assertEqual(ttl_cache.get_or_fetch('key', self.fetch('two'), ttl=10), 'two')
+        self.assertEqual(self.calls, ['one', 'two'])
+        self.assertEqual(ttl_cache.stats()['hits'], 1)
+
+    def test_stale_entry_is_served_while_one_refresh_runs(self):
+        ttl_cache = TTLCache()
+        ttl_cache.get_or_fetch('key', self.fetch('old'), ttl=10, stale_ttl=60)
+        self.now += 30
+        release = threading.Event()
+
+        def slow():
+            release.wait(5)
+            return self.fetch('new')()
+        self.assertEqual(ttl_cache.get_or_fetch('key', slow, ttl=10, stale_ttl=60), 'old')
+        self.assertEqual(ttl_cache.get_or_fetch('key', slow, ttl=10, stale_ttl=60), 'old')
+        release.set()
+        self.wait_for_refresh(ttl_cache, 'key')
+        self.assertEqual(ttl_cache.get_or_fetch('key', self.fetch('other'), ttl=10), 'new')
+        self.assertEqual(self.calls, ['old', 'new'])
+        self.assertEqual(ttl_cache.stats()['stale_hits'], 2)
+
+    def test_failed_refresh_keeps_the_stale_value(self):
+        ttl_cache = TTLCache()
+        ttl_cache.get_or_fetch('key', self.fetch('old'), ttl=10, stale_ttl=60)
+        self.now += 30
+        with self.assertLogs('recipes.cache', 'WARNING'):
+            failing = self.fetch(error=ValueError('down'))
+            self.assertEqual(ttl_cache.get_or_fetch('key', failing, ttl=10, stale_ttl=60), 'old')
+            self.wait_for_refresh(ttl_cache, 'key')
+        self.assertEqual(ttl_cache.get_or_fetch('key', self.fetch('other'), ttl=10, stale_ttl=60), 'old')
+        self.assertEqual(ttl_cache.stats()['refresh_errors'], 1)
+
+    def test_entries_past_the_stale_window_are_fetched_again(self):
+        ttl_cache = TTLCache()
+        ttl_cache.get_or_fetch('key', self.fetch('old'), ttl=10, stale_ttl=60)
+        self.now += 71
+        self.assertEqual(ttl_cache.get_or_fetch('key', self.fetch('new'), ttl=10, stale_ttl=60), 'new')
+
+    def test_missing_items_are_cached_for_the_negative_ttl(self):
+        ttl_cache = TTLCache()
+        for _ in range(3):
+            self.assertIsNone(ttl_cache.get_or_fetch('key', self.fetch(None), ttl=10, negative_ttl=5))
+        self.now += 6
+        self.assertEqual(ttl_cache.get_or_fetch('key', self.fetch('found'), ttl=10, negative_ttl=5), 'found')
+        self.assertEqual(self.calls, [None, 'found'])
+        self.assertEqual(ttl_cache.stats()['negative_hits'], 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        ttl_cache = TTLCache(maxsize=2)
+        ttl_cache.get_or_fetch('a', self.fetch('a'), ttl=10)
+        ttl_cache.get_or_fetch('b', self.fetch('b'), ttl=10)
+        ttl_cache.get_or_fetch('a', self.fetch('a'), ttl=10)
+        ttl_cache.get_or_fetch('c', self.fetch('c'), ttl=10)
+        self.assertEqual(list(ttl_cache._entries), ['a', 'c'])
+
+
+class ExternalFanOutTests(RecipeAPITestCase):
+    def search(self):
+        started_at = time.monotonic()
+        response = self.client.get(reverse('recipe-list'), {'search': 'Recipe 1', 'page_size': 10})
+        self.assertEqual(response.status_code, 200)
+        return response.json(), time.monotonic() - started_at
+
+    def test_external_results_are_merged(self):
+        body, _ = self.search()
+        sources = [item.get('source') for item in body['results']]
+        self.assertIn('spoonacular', sources)
+        self.assertIn(None, sources)
+        self.assertNotIn('partial', body)
+
+    @override_settings(SPOONACULAR_DEADLINE=0.1)
+    def test_slow_upstream_is_left_out_after_the_deadline(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow_get(path, params, priority=None):
+            release.wait(5)
+            return None
+        with mock.patch.object(spoonacular, '_get', slow_get):
+            body, elapsed = self.search()
+        self.assertTrue(body['partial'])
+        self.assertLess(elapsed, 2)
+        self.assertTrue(body['results'])
+        self.assertFalse(any(item.get('source') == 'spoonacular' for item in body['results']))
+
+    def test_upstream_error_returns_the_local_page(self):
+        def failing_get(path, params, priority=None):
+            raise SpoonacularError(503)
+        with mock.patch.object(spoonacular, '_get', failing_get), self.assertLogs('recipes.spoonacular', 'WARNING'):
+            body, _ = self.search()
+        self.assertTrue(body['partial'])
+        self.assertTrue(body['results'])
+
+    def test_wait_for_counts_the_time_already_spent(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        future = spoonacular.fetch_in_background(release.wait, 5)
+        with override_settings(SPOONACULAR_DEADLINE=1.0):
+            started_at = time.monotonic()
+            self.assertEqual(spoonacular.wait_for(future, started_at - 1.0), ([], True))
+            self.assertLess(time.monotonic() - started_at, 0.5)
+
+
+class MirrorTests(RecipeAPITestCase):
+    def payload(self, spoonacular_id=7, **changes):
+        return {
+            'id': spoonacular_id, 'title': 'Mirrored paella', 'summary': 'From Spain', 'readyInMinutes': 45,
+            'servings': 4, 'dishTypes': ['main course'], 'cuisines': ['Spanish'], 'diets': ['gluten free'],
+            'extendedIngredients': [{'name': 'Rice', 'amount': 2, 'unit': 'cups'}, {'name': 'Saffron'}],
+            'analyzedInstructions': [{'steps': [{'step': 'Toast the rice.'}, {'step': 'Simmer.'}]}],
+            **changes,
+        }
+
+    def test_upsert_creates_then_refreshes_in_place(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mirror.upsert([self.payload()]), (1, 0))
+        recipe = Recipe.objects.mirrored(mirror.SOURCE).get(external_id='7')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mirror.upsert([self.payload(
+                title='Seafood paella', extendedIngredients=[{'name': 'Prawns', 'amount': 0.5}],
+            )]), (0, 1))
+        refreshed = Recipe.objects.mirrored(mirror.SOURCE).get()
+        self.assertEqual(refreshed.pk, recipe.pk)
+        self.assertEqual(refreshed.title, 'Seafood paella')
+        self.assertEqual((refreshed.category.name, refreshed.cook_time), ('Dinner', 45))
+        self.assertEqual(list(refreshed.ingredients.values_list('name', 'quantity')), [('Prawns', '0.5')])
+        self.assertEqual(list(refreshed.instructions.values_list('step_number', flat=True)), [1, 2])
+        self.assertEqual(list(refreshed.diets.values_list('name', flat=True)), ['Gluten Free'])
+
+    def test_mirrored_recipes_stay_out_of_the_local_catalog(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            mirror.upsert([self.payload()])
+        ids = [item['id'] for item in self.client.get(reverse('recipe-list'), {'page_size': 100}).json()['results']]
+        self.assertEqual(len(ids), self.recipe_count)
+
+    def test_detail_is_served_from_the_mirror(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            mirror.upsert([self.payload()])
+        with mock.patch.object(spoonacular, '_get') as upstream:
+            response = self.client.get(reverse('spoonacular_recipe_detail', args=['7']))
+        upstream.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], 'spoonacular_7')
+        self.assertEqual(response.data['ingredients'], ['2 cups Rice', 'Saffron'])
+        self.assertEqual(response.data['instructions'], 'Toast the rice.\nSimmer.')
+
+    def test_sync_fetches_new_and_stale_recipes_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            mirror.upsert([self.payload(7), self.payload(8)])
+        Recipe.objects.mirrored(mirror.SOURCE).filter(external_id='8').update(
+            synced_at=timezone.now() - timedelta(days=2)
+        )
+        fetched = []
+
+        def information_bulk(ids):
+            fetched.append(ids)
+            return [self.payload(i) for i in ids]
+        with mock.patch.object(spoonacular, 'information_bulk', information_bulk), \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command('sync_spoonacular', '--ids', '7', '9', stdout=StringIO())
+        self.assertEqual(fetched, [[8, 9]])
+        self.assertEqual(Recipe.objects.mirrored(mirror.SOURCE).count(), 3)
+
+
+class QuotaTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = 1_000_000.0
+        clock = mock.patch('recipes.quota.time')
+        fake = clock.start()
+        fake.time.side_effect = lambda: self.now
+        fake.monotonic.side_effect = time.monotonic
+        fake.sleep.side_effect = time.sleep
+        self.addCleanup(clock.stop)
+        self.addCleanup(setattr, quota, '_bucket', None)
+        quota._bucket = None
+
+    def bucket(self, capacity=10):
+        return quota.TokenBucket(capacity, refill_per_second=capacity / 86400)
+
+    def response(self, status_code=200, **headers):
+        return mock.Mock(status_code=status_code, headers=headers)
+
+    def test_estimated_costs(self):
+        self.assertAlmostEqual(quota.estimate_cost('/recipes/complexSearch', {'number': 10}), 1.1)
+        self.assertAlmostEqual(
+            quota.estimate_cost('/recipes/complexSearch', {'number': 10, 'addRecipeInformation': True}), 1.35
+        )
+        self.assertAlmostEqual(quota.estimate_cost('/recipes/random', {'number': 100}), 2)
+        self.assertAlmostEqual(quota.estimate_cost('/recipes/informationBulk', {'ids': '1,2,3'}), 2)
+        self.assertAlmostEqual(quota.estimate_cost('/recipes/7/information', {}), 1)
+
+    def test_priorities_keep_their_reserves(self):
+        bucket = self.bucket()
+        taken = {}
+        for priority in ('low', 'normal', 'high'):
+            taken[priority] = 0
+            while bucket.try_take(1, priority)[0]:
+                taken[priority] += 1
+        self.assertEqual(taken, {'low': 5, 'normal': 3, 'high': 2})
+        self.assertEqual(bucket.stats()['refused'], {'high': 1, 'normal': 1, 'low': 1})
+
+    def test_bucket_refills_over_the_day(self):
+        bucket = self.bucket()
+        self.assertTrue(bucket.try_take(10, 'high')[0])
+        self.assertFalse(bucket.try_take(1, 'high')[0])
+        self.now += 86400 / 4
+        self.assertAlmostEqual(bucket.remaining(), 2.5)
+        self.now += 86400
+        self.assertAlmostEqual(bucket.remaining(), 10)
+
+    @override_settings(SPOONACULAR_DAILY_POINTS=10)
+    def test_headers_clamp_the_bucket_down_only(self):
+        with self.assertLogs('recipes.quota', 'WARNING'):
+            bucket = quota.get_bucket()
+        quota.observe(self.response(**{'X-API-Quota-Left': '4.5'}))
+        self.assertAlmostEqual(bucket.remaining(), 4.5)
+        quota.observe(self.response(**{'X-API-Quota-Left': '9'}))
+        quota.observe(self.response(**{'X-API-Quota-Left': 'unknown'}))
+        self.assertAlmostEqual(bucket.remaining(), 4.5)
+        self.assertEqual(bucket.stats()['upstream_left'], 9)
+        quota.observe(self.response(status_code=402))
+        self.assertEqual(bucket.remaining(), 0)
+
+    @override_settings(SPOONACULAR_DAILY_POINTS=2.5)
+    def test_acquire_raises_when_the_reserve_is_reached(self):
+        with self.assertLogs('recipes.quota', 'WARNING'):
+            quota.acquire('/recipes/complexSearch', {'number': 5})
+        with self.assertRaises(quota.QuotaExceeded) as raised:
+            quota.acquire('/recipes/complexSearch', {'number': 5})
+        self.assertEqual(raised.exception.status_code, 429)
+        quota.acquire('/recipes/7/information', {})
+
+    @override_settings(SPOONACULAR_DAILY_POINTS=None)
+    def test_no_budget_when_disabled(self):
+        self.assertIsNone(quota.get_bucket())
+        for _ in range(100):
+            quota.acquire('/recipes/random', {'number': 100})
+        self.assertIsNone(quota.stats())
+
+
+class StreamingListTests(RecipeAPITestCase):
+    def stream(self, url_name, params):
+        response = self.client.get(reverse(url_name), {'stream': '1', **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        return chunks, json.loads(''.join(chunks))
+
+    @mock.patch.object(streaming, 'ROWS_PER_WRITE', 10)
+    def test_streams_every_row_in_batches(self):
+        chunks, body = self.stream('recipe-list', {'ordering': 'cook_time'})
+        # Opening, three batches of rows, closing
+        self.assertEqual(len(chunks), 5)
+        self.assertFalse(body['partial'])
+        page = self.client.get(reverse('recipe-list'), {'ordering': 'cook_time', 'page_size': 100}).json()
+        self.assertEqual(body['results'], page['results'])
+
+    def test_filters_apply_to_the_stream(self):
+        _, body = self.stream('recipe-list', {'cook_time_max': 24})
+        self.assertEqual(sorted(item['cook_time'] for item in body['results']), [20, 21, 22, 23, 24])
+
+    def test_external_items_follow_the_local_rows(self):
+        _, body = self.stream('merged_recipes', {})
+        items = body['recipes']
+        self.assertEqual(len(items), self.recipe_count + 5)
+        self.assertTrue(all(item.get('source') == 'spoonacular' for item in items[self.recipe_count:]))
+        self.assertFalse(body['partial'])
+
+    def test_empty_stream_is_valid_json(self):
+        _, body = self.stream('recipe-list', {'title': 'nothing like this'})
+        self.assertEqual(body, {'results': [], 'partial': False})
+
+
+class HomeFeedTests(RecipeAPITestCase):
+    def get(self):
+        response = self.client.get(reverse('merged_recipes'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_stored_feed_is_served_without_queries(self):
+        first = self.get()
+        with self.assertNumQueries(0):
+            second = self.get()
+        self.assertEqual(second, first)
+        self.assertEqual(len(first['recipes']), 20)
+
+    def test_matches_the_live_first_page(self):
+        stored = self.get()
+        live = self.client.get(reverse('merged_recipes'), {'page_size': 20}).json()
+        self.assertEqual([item['id'] for item in stored['recipes']], [item['id'] for item in live['recipes']])
+        self.assertTrue(stored['next'].startswith('http://localhost/api/merged-recipes/?cursor='))
+        self.assertEqual(self.client.get(stored['next']).status_code, 200)
+
+    def test_rebuilt_after_a_change(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                title='Fresh', author=self.user, category=self.category, prep_time=1, cook_time=1,
+            )
+        self.assertEqual(self.get()['recipes'][0]['id'], recipe.pk)
+
+    def test_favorites_are_per_visitor(self):
+        self.assertFalse(any(item.get('is_favorited') for item in self.get()['recipes']))
+        self.sign_in()
+        # The token, then the favorites on the page
+        with self.assertNumQueries(2):
+            local = [item for item in self.get()['recipes'] if item.get('source') != 'spoonacular']
+        self.assertTrue(all(item['is_favorited'] for item in local))
+
+    def test_partial_feed_is_kept_briefly(self):
+        def failing_get(path, params, priority=None):
+            raise SpoonacularError(503)
+        with mock.patch.object(spoonacular, '_get', failing_get), self.assertLogs('recipes.spoonacular', 'WARNING'), \
+                mock.patch.object(feed, 'PARTIAL_TTL', 0):
+            body = self.get()
+        self.assertTrue(body['partial'])
+        self.assertFalse(self.get().get('partial', False))
+
+
+class ExportRecipesCommandTests(RecipeAPITestCase):
+    def export(self, name, *args):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, name)
+        err = StringIO()
+        call_command('export_recipes', path, *args, stdout=StringIO(), stderr=err)
+        self.assertIn(f'Exported {self.recipe_count} recipes', err.getvalue())
+        return path
+
+    def test_records_carry_their_children(self):
+        with self.assertNumQueries(1 + 3 * 3):
+            records = list(iter_export_records(chunk_size=10))
+        self.assertEqual([record['id'] for record in records], sorted(recipe.pk for recipe in self.recipes))
+        record = records[0]
+        self.assertEqual(record['key'], str(record['id']))
+        self.assertEqual((record['category'], record['cuisine'], record['author']), ('Dinner', 'Italian', 'cook'))
+        self.assertEqual(record['diets'], ['Vegetarian'])
+        self.assertEqual(record['ingredients'], [
+            {'name': 'Rice', 'quantity': '1', 'unit': 'cup'}, {'name': 'Salt', 'quantity': '1', 'unit': 'pinch'},
+        ])
+        self.assertEqual(record['instructions'], ['Cook the rice.', 'Season.'])
+
+    def test_ndjson_gzip(self):
+        with gzip.open(self.export('recipes.ndjson.gz'), 'rt', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), self.recipe_count)
+        self.assertEqual(records[0]['protein'], 12.5)
+        self.assertEqual(records[0]['ingredients'][0]['name'], 'Rice')
+
+    def test_csv_encodes_nested_columns_as_json(self):
+        with open(self.export('recipes.csv'), encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), self.recipe_count)
+        self.assertEqual(rows[0]['title'], 'Recipe 0')
+        self.assertEqual(json.loads(rows[0]['instructions']), ['Cook the rice.', 'Season.'])
+        self.assertEqual(json.loads(rows[0]['diets']), ['Vegetarian'])
+
+    @skipUnless(find_spec('pyarrow'), 'needs pyarrow')
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+        table = pq.read_table(self.export('recipes.parquet', '--chunk-size', '10'))
+        self.assertEqual(table.num_rows, self.recipe_count)
+        self.assertEqual(table.column('ingredients')[0].as_py()[1]['unit'], 'pinch')
+
+    @skipIf(find_spec('pyarrow'), 'pyarrow is installed')
+    def test_parquet_without_pyarrow(self):
+        with self.assertRaisesMessage(CommandError, 'Parquet export needs pyarrow'):
+            self.export('recipes.parquet')
+
+    def test_mirrored_recipes_only_on_request(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            mirror.upsert([{'id': 7, 'title': 'Mirrored'}])
+        err = StringIO()
+        path = self.export('recipes.ndjson')
+        call_command('export_recipes', path, '--include-mirrored', stdout=StringIO(), stderr=err)
+        self.assertIn(f'Exported {self.recipe_count + 1} recipes', err.getvalue())
+
+    def test_export_reimports_idempotently(self):
+        path = self.export('recipes.ndjson')
+        out = StringIO()
+        call_command('import_recipes', path, '--upsert', '--author', 'cook', stdout=out)
+        self.assertIn(f'Imported {self.recipe_count} recipes', out.getvalue())
+        out = StringIO()
+        call_command('import_recipes', path, '--upsert', '--author', 'cook', stdout=out)
+        self.assertIn(f'Imported 0 recipes, updated 0, skipped {self.recipe_count} unchanged', out.getvalue())
+
+
+class GenerateDatasetCommandTests(RecipeAPITestCase):
+    def generate(self, *args):
+        out = StringIO()
+        call_command('generate_dataset', '--recipes', '30', '--users', '12', '--batch-size', '8', *args, stdout=out)
+        return out.getvalue()
+
+    def snapshot(self):
+        recipes = Recipe.objects.filter(author__username__startswith='gen_').order_by('id')
+        return {
+            'recipes': list(recipes.values_list(
+                'title', 'description', 'author__username', 'category__name', 'cuisine__name', 'prep_time',
+                'cook_time', 'servings', 'difficulty', 'calories_per_serving', 'rating_count', 'rating_sum',
+            )),
+            'ingredients': list(Ingredient.objects.filter(recipe__in=recipes).order_by('recipe_id', 'id')
+                                .values_list('name', 'quantity', 'unit')),
+            'instructions': list(Instruction.objects.filter(recipe__in=recipes).order_by('recipe_id', 'step_number')
+                                 .values_list('step_number', 'text')),
+            'diets': list(Recipe.diets.through.objects.filter(recipe__in=recipes).order_by('recipe_id', 'diet__name')
+                          .values_list('diet__name', flat=True)),
+            'ratings': list(Rating.objects.filter(recipe__in=recipes).order_by('recipe_id', 'user__username')
+                            .values_list('user__username', 'score')),
+            'favorites': Favorite.objects.filter(recipe__in=recipes).count(),
+            'shopping': list(ShoppingListItem.objects.filter(user__username__startswith='gen_').order_by('id')
+                             .values_list('user__username', 'ingredient_name', 'quantity', 'unit', 'is_purchased')),
+        }
+
+    def test_same_seed_gives_the_same_data(self):
+        self.generate('--seed', '7')
+        first = self.snapshot()
+        self.assertEqual(len(first['recipes']), 30)
+        self.generate('--seed', '7', '--clear')
+        self.assertEqual(self.snapshot(), first)
+        self.generate('--seed', '8', '--clear')
+        self.assertNotEqual(self.snapshot()['recipes'], first['recipes'])
+
+    def test_stored_rating_stats_match_the_ratings(self):
+        self.generate()
+        self.assertFalse(Recipe.objects.filter(author__username__startswith='gen_').with_rating_drift().exists())
+
+    def test_refuses_to_add_to_an_existing_dataset(self):
+        self.generate()
+        with self.assertRaisesMessage(CommandError, 'Users named gen_* already exist'):
+            self.generate()
+
+
+class TaxonomyTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(setattr, taxonomy, '_snapshot', None)
+        taxonomy._snapshot = None
+
+    def test_endpoint_lists_all_three_tables(self):
+        response = self.client.get(reverse('taxonomy'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'categories', 'cuisines', 'diets'})
+        self.assertEqual([item['name'] for item in response.data['categories']], ['Dinner'])
+        self.assertEqual(response.data['diets'][0]['id'], self.diet.pk)
+
+    def test_snapshot_is_reused_until_a_change(self):
+        self.client.get(reverse('taxonomy'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('taxonomy'))
+        self.assertEqual(response.status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            Cuisine.objects.create(name='Thai')
+        names = [item['name'] for item in self.client.get(reverse('taxonomy')).data['cuisines']]
+        self.assertEqual(sorted(names), ['Italian', 'Thai'])
+
+    def test_etag_answers_conditional_requests(self):
+        etag = self.client.get(reverse('taxonomy'))['ETag']
+        response = self.client.get(reverse('taxonomy'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.diet.name = 'Veggie'
+            self.diet.save()
+        response = self.client.get(reverse('taxonomy'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_filters_validate_against_the_snapshot(self):
+        get_taxonomy()
+        url = reverse('recipe-list')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'category': self.category.pk, 'diets': self.diet.pk, 'page_size': 5})
+        self.assertEqual(len(response.json()['results']), 5)
+        response = self.client.get(url, {'category': self.category.pk + 100})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('category', response.data)
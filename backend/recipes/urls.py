@@ -23,4 +23,6 @@ urlpatterns = [
     path('recipes/<int:recipe_id>/unfavorite/', views.remove_favorite, name='remove_favorite'),
     path('recipes/<int:recipe_id>/is_favorite/', views.is_favorite, name='is_favorite'),
     path('api/merged-recipes/', merged_recipes, name='merged_recipes'),
+    path('api/taxonomy/', views.taxonomy, name='taxonomy'),
+    path('api/spoonacular/stats/', views.spoonacular_stats, name='spoonacular_stats'),
 ]
\ No newline at end of file
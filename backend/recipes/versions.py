@@ -0,0 +1,51 @@
+"""
+Version counters for cached documents derived from the database.
+
+A cached document's key includes the current version of the data it was
+built from (home_feed:<version>). Changing the data bumps the version, which
+makes every old key unreachable at once without deleting anything; the old
+entries simply expire. Counters live in the Django cache, so with a shared
+backend every worker sees a bump immediately.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'version:'
+
+
+def _initial():
+    # Start from the clock so a counter lost to eviction never reuses a version
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    key = KEY_PREFIX + name
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial(), None)
+        version = cache.get(key, _initial())
+    return version
+
+
+def get_versions(names):
+    """Current versions of several counters with one cache round trip when all exist"""
+    keys = [KEY_PREFIX + name for name in names]
+    found = cache.get_many(keys)
+    return [found[key] if key in found else get_version(name) for key, name in zip(keys, names)]
+
+
+def bump(name):
+    key = KEY_PREFIX + name
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial()
+        cache.set(key, version, None)
+        return version
+
+
+def bump_on_commit(name, using='default'):
+    """Bump once the current transaction commits, so rebuilds see the new data"""
+    transaction.on_commit(lambda: bump(name), using=using)
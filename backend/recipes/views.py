@@ -1,13 +1,14 @@
 
-import os
-import requests
+import logging
+import time
 from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.db.models import Q, Avg
 from rest_framework import viewsets, status, filters
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny, IsAdminUser
+from rest_framework.renderers import BrowsableAPIRenderer
 from django_filters.rest_framework import DjangoFilterBackend
 from django_filters import rest_framework as django_filters
 
@@ -19,92 +20,93 @@ from .serializers import (
     CategorySerializer, CuisineSerializer, DietSerializer, RatingSerializer,
     FavoriteSerializer, ShoppingListItemSerializer
 )
+from .fastlist import FastJSONRenderer, RecipeRows, favorite_rows
+from .pagination import RecipeCursorPagination
+from .search import RecipeSearchFilter, RelevanceOrderingFilter
+from .streaming import stream_recipes, wants_stream
+from .suggest import get_index as get_suggest_index
+from .taxonomy import TaxonomyFilter, TaxonomyMultipleFilter, get_taxonomy
+from . import conditional, fastlist, feed, fieldsets, mirror, quota, response_cache, spoonacular
 
-SPOONACULAR_API_KEY = os.environ.get('SPOONACULAR_API_KEY')
+logger = logging.getLogger(__name__)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def spoonacular_recipe_detail(request, recipe_id):
-    # Extract numeric ID from spoonacular_xxx
-    if recipe_id.startswith('spoonacular_'):
-        sid = recipe_id.replace('spoonacular_', '')
-        try:
-            response = requests.get(
-                f'https://api.spoonacular.com/recipes/{sid}/information',
-                params={
-                    'apiKey': SPOONACULAR_API_KEY,
-                    'includeNutrition': False
-                }
-            )
-            print("Spoonacular detail status:", response.status_code)
-            print("Spoonacular detail response:", response.text)
-            if response.status_code == 200:
-                r = response.json()
-                nutrition = {}
-                if 'nutrition' in r and 'nutrients' in r['nutrition']:
-                    for n in r['nutrition']['nutrients']:
-                        # Common nutrients: Calories, Protein, Fat, Carbohydrates
-                        if n['name'] in ['Calories', 'Protein', 'Fat', 'Carbohydrates']:
-                            nutrition[n['name'].lower()] = {
-                                'amount': n['amount'],
-                                'unit': n['unit']
-                            }
-                data = {
-                    'id': f"spoonacular_{r.get('id')}",
-                    'title': r.get('title'),
-                    'image': r.get('image'),
-                    'ingredients': [i['original'] for i in r.get('extendedIngredients', [])] if r.get('extendedIngredients') else [],
-                    'instructions': r.get('instructions'),
-                    'source': 'spoonacular',
-                    'summary': r.get('summary'),
-                    'readyInMinutes': r.get('readyInMinutes'),
-                    'servings': r.get('servings'),
-                    'sourceUrl': r.get('sourceUrl'),
-                    'nutrition': nutrition,
-                }
-                return Response(data)
-            else:
-                return Response({'error': 'Recipe not found'}, status=response.status_code)
-        except Exception as e:
-            print("Spoonacular detail error:", e)
-            return Response({'error': str(e)}, status=500)
-    return Response({'error': 'Invalid Spoonacular ID'}, status=400)
+    # The URL pattern captures the part after "spoonacular_"; accept the full id too
+    sid = recipe_id.replace('spoonacular_', '')
+    if not sid.isdigit():
+        return Response({'error': 'Invalid Spoonacular ID'}, status=400)
+    try:
+        # Synced recipes are served from the local mirror without calling the API
+        data = mirror.lookup(sid) or spoonacular.recipe_information(sid)
+    except quota.QuotaExceeded:
+        return Response({'error': 'Spoonacular quota exhausted, try again later'}, status=429)
+    except spoonacular.SpoonacularError as e:
+        return Response({'error': 'Recipe not found'}, status=e.status_code)
+    except Exception as e:
+        logger.warning("Spoonacular detail error: %s", e)
+        return Response({'error': str(e)}, status=500)
+    if data is None:
+        return Response({'error': 'Recipe not found'}, status=404)
+    return Response(data)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def spoonacular_stats(request):
+    """Remaining Spoonacular points and response cache counters"""
+    return Response({
+        'quota': quota.stats(),
+        'cache': spoonacular.cache.stats(),
+        'responses': response_cache.stats(),
+    })
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+def taxonomy(request):
+    """Categories, cuisines and diets in one response, from the per-process snapshot"""
+    snapshot = get_taxonomy()
+    response = conditional.not_modified(request, snapshot.etag)
+    if response is not None:
+        return response
+    return conditional.set_validators(Response(snapshot.data), snapshot.etag)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
 def merged_recipes(request):
-    # Fetch recipes from Django DB
-    django_recipes = RecipeListSerializer(Recipe.objects.all(), many=True, context={'request': request}).data
+    # The plain first page is precomputed; cursors, page sizes and streams are served live
+    if not request.query_params:
+        return Response(feed.render(request))
 
-    # Try to fetch recipes from Spoonacular
-    spoonacular_recipes = []
-    try:
-        response = requests.get(
-            'https://api.spoonacular.com/recipes/random',
-            params={'number': 5, 'apiKey': SPOONACULAR_API_KEY}
-        )
-        print("Spoonacular status:", response.status_code)
-        print("Spoonacular response:", response.text)
-        if response.status_code == 200:
-            data = response.json()
-            for r in data.get('recipes', []):
-                spoonacular_recipes.append({
-                    'id': f"spoonacular_{r.get('id')}",
-                    'title': r.get('title'),
-                    'image': r.get('image'),
-                    'ingredients': [i['original'] for i in r.get('extendedIngredients', [])],
-                    'instructions': r.get('instructions'),
-                    'source': 'spoonacular',
-                    # Add more fields as needed to match your frontend
-                })
-    except Exception as e:
-        print("Spoonacular error:", e)
+    started_at = time.monotonic()
+    # Ask Spoonacular while the local page is queried and serialized
+    future = spoonacular.fetch_in_background(spoonacular.random_recipes, 5)
+    queryset = Recipe.objects.local().with_list_data(request.user)
+    if wants_stream(request):
+        return stream_recipes(request, queryset, 'recipes', future=future, started_at=started_at)
 
-    # Combine both sources
-    all_recipes = list(django_recipes) + spoonacular_recipes
-    return Response({'recipes': all_recipes})
+    # Fetch one page of recipes from Django DB
+    paginator = RecipeCursorPagination()
+    if fastlist.enabled():
+        rows = RecipeRows(request)
+        ordering = paginator.get_ordering(request, queryset, None)
+        page = paginator.paginate_queryset(rows.values(queryset, *[f.lstrip('-') for f in ordering]), request)
+        django_recipes = rows.build(page)
+    else:
+        page = paginator.paginate_queryset(queryset, request)
+        django_recipes = RecipeListSerializer(page, many=True, context={'request': request}).data
+
+    spoonacular_recipes, partial = spoonacular.wait_for(future, started_at)
+
+    # Combine both sources without changing the page size
+    all_recipes = paginator.merge_external(django_recipes, spoonacular_recipes)
+    response = paginator.get_paginated_response(all_recipes, results_key='recipes')
+    if partial:
+        response.data['partial'] = True
+    return response
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Avg
+from django.db.models import Q, Avg, Prefetch
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
@@ -125,20 +127,24 @@ from .serializers import (
 class RecipeFilter(django_filters.FilterSet):
     title = django_filters.CharFilter(lookup_expr='icontains')
     difficulty = django_filters.ChoiceFilter(choices=Recipe.DIFFICULTY_CHOICES)
-    category = django_filters.ModelChoiceFilter(queryset=Category.objects.all())
-    cuisine = django_filters.ModelChoiceFilter(queryset=Cuisine.objects.all())
-    diets = django_filters.ModelMultipleChoiceFilter(queryset=Diet.objects.all())
+    # Validated against the taxonomy snapshot, without querying the tables
+    category = TaxonomyFilter(kind='categories')
+    cuisine = TaxonomyFilter(kind='cuisines')
+    diets = TaxonomyMultipleFilter(kind='diets')
     prep_time_max = django_filters.NumberFilter(field_name='prep_time', lookup_expr='lte')
     cook_time_max = django_filters.NumberFilter(field_name='cook_time', lookup_expr='lte')
     calories_max = django_filters.NumberFilter(field_name='calories_per_serving', lookup_expr='lte')
+    rating_min = django_filters.NumberFilter(field_name='rating_avg', lookup_expr='gte')
+    rating_count_min = django_filters.NumberFilter(field_name='rating_count', lookup_expr='gte')
     
     class Meta:
         model = Recipe
         fields = ['title', 'difficulty', 'category', 'cuisine', 'diets', 
-                 'prep_time_max', 'cook_time_max', 'calories_max']
+                 'prep_time_max', 'cook_time_max', 'calories_max',
+                 'rating_min', 'rating_count_min']
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(fieldsets.SparseFieldsetMixin, viewsets.ModelViewSet):
     from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
     parser_classes = [MultiPartParser, FormParser, JSONParser]
     def create(self, request, *args, **kwargs):
@@ -149,13 +155,33 @@ class RecipeViewSet(viewsets.ModelViewSet):
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.local()
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, RecipeSearchFilter, RelevanceOrderingFilter]
     filterset_class = RecipeFilter
     search_fields = ['title', 'description', 'ingredients__name']
-    ordering_fields = ['created_at', 'prep_time', 'cook_time', 'difficulty']
+    ordering_fields = ['created_at', 'prep_time', 'cook_time', 'difficulty', 'rating_avg', 'rating_count']
     ordering = ['-created_at']
+    pagination_class = RecipeCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        queryset = queryset.with_list_data(self.request.user)
+        fields = self.get_selected_fields()
+        if fields is not None:
+            # The validators, and on lists the cursor, read these whatever is shown
+            keep = list(conditional.RECIPE_SOURCES)
+            if self.action == 'list':
+                keep += [field.lstrip('-') for field in self.paginator.get_ordering(self.request, queryset, self)]
+            elif 'ratings' not in fields:
+                queryset = queryset.annotate(latest_rating=conditional.latest_rating())
+            return fieldsets.recipe_queryset(queryset, fields, keep)
+        if self.action == 'retrieve':
+            return queryset.prefetch_related('diets', 'ingredients', 'instructions', 'ratings__user')
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -167,74 +193,131 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=False, methods=['get'], authentication_classes=[], permission_classes=[AllowAny])
+    def suggest(self, request):
+        """Autocomplete recipe titles and ingredient names from the in-memory prefix index"""
+        query = request.query_params.get('q', '')
+        try:
+            limit = max(int(request.query_params.get('limit', 8)), 1)
+        except ValueError:
+            limit = 8
+        suggestions = []
+        for entry in get_suggest_index().search(query, limit):
+            suggestion = {'type': entry.kind, 'text': entry.label}
+            if entry.kind == 'recipe':
+                suggestion['id'] = entry.key[1]
+            suggestions.append(suggestion)
+        return Response({'query': query, 'suggestions': suggestions})
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        cache_key = None
+        if response_cache.cacheable(request):
+            cache_key, response = response_cache.lookup(request, response_cache.detail_versions(pk))
+            if response is not None:
+                return response
+        if conditional.is_conditional(request):
+            queryset = Recipe.objects.local().with_list_data(request.user)
+            validators = conditional.recipe_validators(queryset, pk)
+            response = validators and conditional.not_modified(request, *validators)
+            if response is not None:
+                return response
+        instance = self.get_object()
+        response = Response(self.get_serializer(instance).data)
+        conditional.set_validators(response, *conditional.recipe_validators_for(instance))
+        return response_cache.store(response, cache_key)
+
     def list(self, request, *args, **kwargs):
-        # ...existing code...
-        queryset = self.filter_queryset(self.get_queryset())
+        started_at = time.monotonic()
         search_query = request.query_params.get('search')
-        # Get Django recipes
-        page = self.paginate_queryset(queryset)
-        django_recipes = RecipeListSerializer(page if page is not None else queryset, many=True, context={'request': request}).data
-
-        # If search query, also fetch from Spoonacular
-        spoonacular_recipes = []
+        # Search results include Spoonacular recipes, which the validators cannot see
+        cacheable = not search_query and not wants_stream(request)
+        # If search query, use mirrored Spoonacular recipes, or fetch from
+        # Spoonacular while the local query runs when the mirror has none
+        future = None
+        spoonacular_recipes, partial = [], False
         if search_query:
-            try:
-                response = requests.get(
-                    'https://api.spoonacular.com/recipes/complexSearch',
-                    params={
-                        'query': search_query,
-                        'number': 5,
-                        'apiKey': SPOONACULAR_API_KEY,
-                        'addRecipeInformation': True
-                    }
-                )
-                print("Spoonacular search status:", response.status_code)
-                print("Spoonacular search response:", response.text)
-                if response.status_code == 200:
-                    data = response.json()
-                    for r in data.get('results', []):
-                        spoonacular_recipes.append({
-                            'id': f"spoonacular_{r.get('id')}",
-                            'title': r.get('title'),
-                            'image': r.get('image'),
-                            'ingredients': [i['original'] for i in r.get('extendedIngredients', [])] if r.get('extendedIngredients') else [],
-                            'instructions': r.get('instructions'),
-                            'source': 'spoonacular',
-                            # Add more fields as needed
-                        })
-            except Exception as e:
-                print("Spoonacular search error:", e)
-
-        # Merge results
-        all_recipes = list(django_recipes) + spoonacular_recipes
-        if page is not None:
-            return self.get_paginated_response(all_recipes)
-        return Response(all_recipes)
+            spoonacular_recipes = mirror.search(search_query, 5)
+            if not spoonacular_recipes:
+                future = spoonacular.fetch_in_background(spoonacular.search_recipes, search_query, 5)
+
+        cache_key = None
+        if cacheable and response_cache.cacheable(request):
+            cache_key, response = response_cache.lookup(request, response_cache.list_versions())
+            if response is not None:
+                return response
+
+        # Get one page of Django recipes
+        queryset = self.filter_queryset(self.get_queryset())
+        if cacheable and conditional.is_conditional(request):
+            response = conditional.not_modified(request, *conditional.page_validators(queryset, request, self))
+            if response is not None:
+                return response
+        if wants_stream(request):
+            return stream_recipes(request, queryset, external=spoonacular_recipes,
+                                  future=future, started_at=started_at, serializer=self.get_serializer())
+        # The fast path builds whole rows; sparse and expanded pages go through the serializer
+        if fastlist.enabled() and self.get_selection() is None:
+            rows = RecipeRows(request)
+            ordering = self.paginator.get_ordering(request, queryset, self)
+            page = self.paginate_queryset(
+                rows.values(queryset, *[f.lstrip('-') for f in ordering], *conditional.RECIPE_FIELDS)
+            )
+            django_recipes = rows.build(page)
+        else:
+            page = self.paginate_queryset(queryset)
+            django_recipes = self.get_serializer(page, many=True).data
+
+        if future is not None:
+            spoonacular_recipes, partial = spoonacular.wait_for(future, started_at)
+
+        # Merge results, interleaving Spoonacular recipes within the page size
+        all_recipes = self.paginator.merge_external(django_recipes, spoonacular_recipes)
+        response = self.get_paginated_response(all_recipes)
+        if partial:
+            response.data['partial'] = True
+        if cacheable:
+            conditional.set_validators(response, *conditional.page_validators_for(
+                self.paginator.page, self.paginator.has_more_local
+            ))
+        return response_cache.store(response, cache_key)
 
     # ...existing code...
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(conditional.ConditionalListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
 
-class CuisineViewSet(viewsets.ReadOnlyModelViewSet):
+class CuisineViewSet(conditional.ConditionalListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Cuisine.objects.all()
     serializer_class = CuisineSerializer
 
 
-class DietViewSet(viewsets.ReadOnlyModelViewSet):
+class DietViewSet(conditional.ConditionalListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Diet.objects.all()
     serializer_class = DietSerializer
 
 
-class FavoriteViewSet(viewsets.ModelViewSet):
+class FavoriteViewSet(fieldsets.SparseFieldsetMixin, viewsets.ModelViewSet):
     serializer_class = FavoriteSerializer
     permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
     
     def get_queryset(self):
-        return Favorite.objects.filter(user=self.request.user)
+        queryset = Favorite.objects.filter(user=self.request.user).order_by('id')
+        recipes = Recipe.objects.with_list_data(self.request.user)
+        fields = self.get_selected_fields()
+        if fields is not None:
+            return fieldsets.with_recipe(queryset, fields, recipes)
+        return queryset.prefetch_related(Prefetch('recipe', queryset=recipes))
+
+    def list(self, request, *args, **kwargs):
+        if not fastlist.enabled() or self.get_selection() is not None:
+            return super().list(request, *args, **kwargs)
+        # Every recipe in the user's own favorites list is favorited
+        return Response(favorite_rows(Favorite.objects.filter(user=request.user).order_by('id'), request))
     
     def perform_create(self, serializer):
         recipe_id = self.request.data.get('recipe_id')
@@ -242,12 +325,17 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user, recipe=recipe)
 
 
-class ShoppingListViewSet(viewsets.ModelViewSet):
+class ShoppingListViewSet(fieldsets.SparseFieldsetMixin, viewsets.ModelViewSet):
     serializer_class = ShoppingListItemSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return ShoppingListItem.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = ShoppingListItem.objects.filter(user=self.request.user).order_by('-created_at')
+        recipes = Recipe.objects.with_list_data(self.request.user)
+        fields = self.get_selected_fields()
+        if fields is not None:
+            return fieldsets.with_recipe(queryset, fields, recipes)
+        return queryset.prefetch_related(Prefetch('recipe', queryset=recipes))
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
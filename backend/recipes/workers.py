@@ -0,0 +1,64 @@
+"""
+Process pools for management commands.
+
+run_pool(fn, jobs, write) runs fn(job) for every job in a pool of worker
+processes started the platform's default way: fork on Linux, spawn on
+Windows and macOS. A spawned worker begins in a fresh interpreter, so each
+one sets Django up before taking a job, and this module imports nothing
+that needs the app registry. fn must be a module-level function.
+
+Workers report progress with log(line). The lines travel back over a queue
+and the parent passes them to write, typically a command's
+self.stdout.write, so progress shows wherever the command's output goes.
+"""
+import multiprocessing
+import queue
+
+import django
+from django.db import connections
+
+_log_queue = None
+
+
+def _init_worker(log_queue):
+    global _log_queue
+    django.setup()
+    _log_queue = log_queue
+
+
+def _run(task):
+    fn, job = task
+    try:
+        return fn(job)
+    finally:
+        connections.close_all()
+        # Tells the parent that every line of this job has been sent
+        _log_queue.put(None)
+
+
+def log(line):
+    """Send a progress line from a worker to the parent's output"""
+    _log_queue.put(line)
+
+
+def run_pool(fn, jobs, write):
+    """fn(job) for each job, one process per job, in order; write gets the workers' log lines"""
+    context = multiprocessing.get_context()
+    log_queue = context.Queue()
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+    with context.Pool(len(jobs), initializer=_init_worker, initargs=(log_queue,)) as pool:
+        pending = pool.map_async(_run, [(fn, job) for job in jobs])
+        finished = 0
+        while finished < len(jobs):
+            try:
+                line = log_queue.get(timeout=0.5)
+            except queue.Empty:
+                if pending.ready() and not pending.successful():
+                    break
+                continue
+            if line is None:
+                finished += 1
+            else:
+                write(line)
+        return pending.get()
@@ -2,7 +2,7 @@
 import React, { useState, useEffect } from 'react';
 
 
-import { createRecipe, updateRecipe } from '../services/api';
+import { createRecipe, getTaxonomy, updateRecipe } from '../services/api';
 
 const AddRecipeForm = ({ onRecipeAdded, recipe, onRecipeUpdated, onClose }) => {
     // Utility to ensure value is always an array of numbers
@@ -75,17 +75,13 @@ const AddRecipeForm = ({ onRecipeAdded, recipe, onRecipeUpdated, onClose }) => {
     const [categories, setCategories] = useState([]);
     const [cuisines, setCuisines] = useState([]);
     const [diets, setDiets] = useState([]);
-    // Fetch categories on mount
+    // Fetch categories, cuisines and diets on mount
     useEffect(() => {
-    fetch(`${process.env.REACT_APP_API_URL}/categories/`)
-            .then(res => res.json())
-            .then(data => setCategories(data));
-    fetch(`${process.env.REACT_APP_API_URL}/cuisines/`)
-            .then(res => res.json())
-            .then(data => setCuisines(data));
-    fetch(`${process.env.REACT_APP_API_URL}/diets/`)
-            .then(res => res.json())
-            .then(data => setDiets(data));
+        getTaxonomy().then(({ categories, cuisines, diets }) => {
+            setCategories(categories);
+            setCuisines(cuisines);
+            setDiets(diets);
+        });
     }, []);
     const [error, setError] = useState(null);
     const [addedRecipes, setAddedRecipes] = useState([]);
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from "react";
 import { addSearchToHistory } from "../utils/helpers";
-import { getCuisines, getDiets, getMealTypes } from "../services/api";
+import { getTaxonomy } from "../services/api";
 
 
 function RecipeFilter({ onFilterChange, onSearch, isLoading = false }) {
@@ -17,18 +17,11 @@ function RecipeFilter({ onFilterChange, onSearch, isLoading = false }) {
 
     useEffect(() => {
         async function fetchOptions() {
-            try {
-                const { cuisines } = await getCuisines();
-                setCuisines(cuisines);
-            } catch (e) { setCuisines([]); }
-            try {
-                const { diets } = await getDiets();
-                setDiets(diets);
-            } catch (e) { setDiets([]); }
-            try {
-                const { mealTypes } = await getMealTypes();
-                setMealTypes(mealTypes);
-            } catch (e) { setMealTypes([]); }
+            // One request for all three lists; meal types are the category names
+            const { categories, cuisines, diets } = await getTaxonomy();
+            setCuisines(cuisines);
+            setDiets(diets);
+            setMealTypes(categories.map(cat => cat.name.toLowerCase()));
         }
         fetchOptions();
     }, []);
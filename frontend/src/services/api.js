@@ -401,34 +401,49 @@ export const toggleShoppingListItem = async (itemId) => {
 };
 
 // Utility functions for getting data from backend
-export const getCategories = async () => {
+
+// Categories, cuisines and diets come from one request, shared by every caller
+// for TAXONOMY_TTL_MS and then fetched again. /api/taxonomy/ is sent with an
+// ETag and Cache-Control: no-cache, so the browser revalidates the refetch and
+// an unchanged taxonomy costs a 304.
+const TAXONOMY_TTL_MS = 5 * 60 * 1000;
+let taxonomyRequest = null;
+let taxonomyRequestedAt = 0;
+
+export const getTaxonomy = async () => {
+    if (!taxonomyRequest || Date.now() - taxonomyRequestedAt > TAXONOMY_TTL_MS) {
+        const request = apiRequest('/taxonomy/').catch((error) => {
+            // Let the next caller try again, unless a newer request replaced this one
+            if (taxonomyRequest === request) {
+                taxonomyRequest = null;
+            }
+            throw error;
+        });
+        taxonomyRequest = request;
+        taxonomyRequestedAt = Date.now();
+    }
     try {
-        const data = await apiRequest('/categories/');
-        return { categories: data };
+        const data = await taxonomyRequest;
+        return { categories: data.categories, cuisines: data.cuisines, diets: data.diets };
     } catch (error) {
-        console.error('Get categories error:', error);
-        return { categories: [] };
+        console.error('Get taxonomy error:', error);
+        return { categories: [], cuisines: [], diets: [] };
     }
 };
 
+export const getCategories = async () => {
+    const { categories } = await getTaxonomy();
+    return { categories };
+};
+
 export const getCuisines = async () => {
-    try {
-        const data = await apiRequest('/cuisines/');
-        return { cuisines: data };
-    } catch (error) {
-        console.error('Get cuisines error:', error);
-        return { cuisines: [] };
-    }
+    const { cuisines } = await getTaxonomy();
+    return { cuisines };
 };
 
 export const getDiets = async () => {
-    try {
-        const data = await apiRequest('/diets/');
-        return { diets: data };
-    } catch (error) {
-        console.error('Get diets error:', error);
-        return { diets: [] };
-    }
+    const { diets } = await getTaxonomy();
+    return { diets };
 };
 
 // Get user's own recipes